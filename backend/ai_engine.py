@@ -1,31 +1,11 @@
-import json
-from decision_logic import assess_severity, pesticide_optimization
+from decision_logic import pesticide_optimization
+from knowledge_base import DEFAULT_KB_ID, DEFAULT_TREATMENT, KnowledgeBaseIndex
+from risk_engine import SEVERITY_RISK_MAP, assess_risk
 
 # ---------- LOAD KNOWLEDGE BASE ----------
-with open("disease_knowledge_base.json") as f:
-    DB = json.load(f)
-
-SEVERITY_RISK_MAP = {
-    "Low": 0.2,
-    "Medium": 0.5,
-    "High": 0.8
-}
-
-DEFAULT_TREATMENT = {
-    "chemical": "Consult local agriculture expert before chemical use",
-    "organic": "Neem oil or bio-fungicide spray",
-    "prevention": "Regular monitoring and field hygiene"
-}
-
-# ---------- PARSE CNN LABEL ----------
-def parse_crop_and_disease(label):
-    if not label or "___" not in label:
-        return "Unknown Crop", label
-
-    crop, disease = label.split("___", 1)
-    crop = crop.replace("_", " ").replace("(including sour)", "").title()
-    disease = disease.replace("_", " ").title()
-    return crop, disease
+# Compiled once per model label; the server calls KB.watch() to pick up
+# edits to disease_knowledge_base.json without a restart
+KB = KnowledgeBaseIndex()
 
 
 # =====================================================
@@ -35,7 +15,7 @@ def analyze_with_image(image_features):
     disease_label = image_features.get("disease", "Uncertain")
     confidence = image_features.get("confidence", "N/A")
 
-    crop, disease = parse_crop_and_disease(disease_label)
+    entry = KB.current().lookup(disease_label, image_features.get("class_id"))
 
     reasoning_clues = [
         "Crop automatically detected from image",
@@ -50,18 +30,16 @@ def analyze_with_image(image_features):
 
     risk_score = SEVERITY_RISK_MAP.get(severity, 0.5)
 
-    if crop in DB and disease in DB[crop]:
-        treatment = DB[crop][disease]["treatment"]
+    if entry.matched:
         decision_reason = "Disease matched with knowledge base"
     else:
-        treatment = DEFAULT_TREATMENT
         decision_reason = "Generic advisory applied (unknown crop/disease)"
         reasoning_clues.append("No exact match found in knowledge base")
 
     return {
         "status": "SUCCESS",
-        "crop_type": crop,
-        "disease_detected": disease,
+        "crop_type": entry.crop,
+        "disease_detected": entry.disease,
         "severity": severity,
         "risk_score": risk_score,
         "confidence": confidence,
@@ -69,11 +47,7 @@ def analyze_with_image(image_features):
         "model_source": "cnn",
         "decision_reason": decision_reason,
         "reasoning_clues": reasoning_clues,
-        "advisory": {
-            "treatment": treatment,
-            "pesticide_strategy": pesticide_optimization(severity),
-            "yield_impact": "Early detection improves yield and reduces losses"
-        }
+        "advisory": dict(entry.advisories[severity])
     }
 
 
@@ -84,15 +58,16 @@ def analyze_without_image(crop_type, environment):
     humidity = environment.get("humidity", 0)
     temperature = environment.get("temperature", 0)
 
-    severity = assess_severity(humidity, temperature)
-    risk_score = SEVERITY_RISK_MAP.get(severity, 0.5)
+    risk = assess_risk(humidity, temperature, crop_type)
+    severity, risk_score = str(risk["severity"]), float(risk["risk_score"])
 
     reasoning_clues = [
         "No image uploaded",
         "Environmental conditions analyzed"
     ]
 
-    if crop_type not in DB:
+    kb = KB.current()
+    if crop_type not in kb.db:
         reasoning_clues.append("Crop not present in knowledge base")
 
         return {
@@ -106,13 +81,14 @@ def analyze_without_image(crop_type, environment):
             "decision_reason": "Generic advisory applied",
             "reasoning_clues": reasoning_clues,
             "advisory": {
+                "kb_id": DEFAULT_KB_ID,
                 "treatment": DEFAULT_TREATMENT,
                 "pesticide_strategy": pesticide_optimization(severity),
                 "yield_impact": "Preventive care reduces risk"
             }
         }
 
-    diseases = [d for d in DB[crop_type] if d != "Healthy"]
+    diseases = [d for d in kb.db[crop_type] if d != "Healthy"]
 
     if severity == "High" and diseases:
         disease = diseases[0]
@@ -121,7 +97,7 @@ def analyze_without_image(crop_type, environment):
     else:
         disease = "Healthy"
 
-    treatment = DB[crop_type].get(disease, {}).get("treatment", DEFAULT_TREATMENT)
+    treatment_id, treatment = kb.treatment(crop_type, disease)
 
     return {
         "status": "SUCCESS",
@@ -134,6 +110,7 @@ def analyze_without_image(crop_type, environment):
         "decision_reason": "Rule-based crop and environment analysis",
         "reasoning_clues": reasoning_clues,
         "advisory": {
+            "kb_id": treatment_id,
             "treatment": treatment,
             "pesticide_strategy": pesticide_optimization(severity),
             "yield_impact": "Early intervention improves yield"
@@ -3,14 +3,54 @@ import os
 import traceback
 import json
 import uuid
-import sqlite3
-from flask import Flask, send_from_directory
+import zipfile
+import zlib
+import cv2
+from collections import Counter
+import time
+from datetime import datetime, timezone
+from flask import Flask, send_from_directory, Response, stream_with_context, g
 
 from voice_summary import generate_voice_summary
-from cnn_model import extract_image_features, generate_explainability
-from ai_engine import analyze_with_image, analyze_without_image
+from cnn_model import (
+    extract_image_features, extract_batch_features, explain_batch_features,
+    predict_and_explain, save_explainability, inference_batcher,
+    explain_batcher, inference_pool, MODEL_VERSION, MODEL_INPUT_SIZE
+)
+from gradcam_utils import load_heatmap, render_overlay
+from metrics import (
+    stage, register_collector, render_prometheus, server_timing_header,
+    REQUEST_SECONDS, REQUESTS_IN_FLIGHT
+)
+from result_cache import (
+    ResultCache, cached_result, content_hash, perceptual_hash
+)
+from image_preprocessing import (
+    prepare_image, prepare_image_file, prepared_from_tensor,
+    preprocess_image_batch
+)
+from ai_engine import KB, analyze_with_image, analyze_without_image
+from weather_service import (
+    WEATHER_FORECAST_TTL, ForecastProvider, OpenWeatherProvider, WeatherClient,
+    normalize_city
+)
+from stage_graph import StageGraph
+from artifact_jobs import ArtifactQueue
+from chunked_uploads import ChunkedUploads, UploadError
+from storage import WriteBehind, get_connection, migrate, transaction
+from report_queries import get_report, list_reports, report_stats
+from feedback_store import (
+    FEEDBACK_INSERT_SQL, feedback_row, import_legacy_json, iter_feedback
+)
+from risk_engine import SEVERITIES, assess_risk, padded_matrix, pressure_windows
+from risk_alerts import (
+    ALERT_INTERVAL, RiskAlertScheduler, mark_sent, pending_alerts, register_farms
+)
+from response_format import (
+    compress_response, dumps_json, encoded_response, negotiated_response,
+    shape_result
+)
 
-import requests
 from dotenv import load_dotenv
 
 # =========================================================
@@ -31,71 +71,441 @@ UPLOAD_DIR = "uploads"
 FEEDBACK_DIR = "feedback"
 FEEDBACK_FILE = os.path.join(FEEDBACK_DIR, "feedback_data.json")
 
+RETAIN_UPLOADS = os.getenv("RETAIN_UPLOADS", "0").lower() in ("1", "true", "yes")
+# Advertised to clients, which downscale images to this bound before upload
+UPLOAD_MAX_SIDE = int(os.getenv("UPLOAD_MAX_SIDE", 256))
+UPLOAD_JPEG_QUALITY = int(os.getenv("UPLOAD_JPEG_QUALITY", 85))
+# Per-stage deadlines (seconds from the start of /analyze processing)
+WEATHER_DEADLINE = float(os.getenv("WEATHER_DEADLINE", 3))
+INFERENCE_DEADLINE = float(os.getenv("INFERENCE_DEADLINE", 60))
+GRADCAM_DEADLINE = float(os.getenv("GRADCAM_DEADLINE", 10))
+VOICE_DEADLINE = float(os.getenv("VOICE_DEADLINE", 8))
+
+BATCH_MAX_IMAGES = int(os.getenv("BATCH_MAX_IMAGES", 500))
+# Uncompressed bytes per image and per request (zip sizes are checked
+# against the archive directory before anything is extracted)
+BATCH_MAX_IMAGE_BYTES = int(os.getenv("BATCH_MAX_IMAGE_BYTES", 20 * 1024 * 1024))
+BATCH_MAX_TOTAL_BYTES = int(os.getenv("BATCH_MAX_TOTAL_BYTES", 512 * 1024 * 1024))
+# Report rows per transaction while a batch is analyzed
+BATCH_DB_CHUNK = int(os.getenv("BATCH_DB_CHUNK", 64))
+# Bulk offline sync: records per chunk and decompressed chunk size
+SYNC_MAX_RECORDS = int(os.getenv("SYNC_MAX_RECORDS", 500))
+SYNC_MAX_BYTES = int(os.getenv("SYNC_MAX_BYTES", 8 * 1024 * 1024))
+# /risk/batch: fields per request and time steps per field
+RISK_MAX_FIELDS = int(os.getenv("RISK_MAX_FIELDS", 10000))
+RISK_MAX_STEPS = int(os.getenv("RISK_MAX_STEPS", 24 * 16))
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# "inline": /analyze waits for Grad-CAM and voice; "deferred": they are
+# queued with the PDF and polled via /reports/<id>/artifacts
+ARTIFACT_MODE = os.getenv("ARTIFACT_MODE", "inline")
+REPORT_PDF_DIR = "static/reports"
+ARTIFACT_STREAM_TIMEOUT = float(os.getenv("ARTIFACT_STREAM_TIMEOUT", 120))
+
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(FEEDBACK_DIR, exist_ok=True)
+os.makedirs(REPORT_PDF_DIR, exist_ok=True)
+
+result_cache = ResultCache()
+
+register_collector("inference", inference_batcher.stats)
+register_collector("explain", explain_batcher.stats)
+register_collector("result_cache", result_cache.stats)
+if inference_pool:
+    register_collector("pool", inference_pool.stats)
 
 # =========================================================
 # ===================== SQLITE SETUP ======================
 # =========================================================
-DB_PATH = "cropguard.db"
-conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-cursor = conn.cursor()
+# WAL, per-thread connections and schema migrations live in storage.py
+migrate()
 
 # ===================== STATIC FILES =======================
 @app.route("/icons/<filename>")
 def serve_icons(filename):
     return send_from_directory("static/icons", filename)
 
-# ---------- CREATE TABLE (RUNS ONCE) ----------
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS crop_reports (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    report_id TEXT UNIQUE,
-    crop TEXT,
-    disease TEXT,
-    severity TEXT,
-    confidence REAL,
-    advisory TEXT,
-    expert_enabled INTEGER,
-    voice_summary TEXT,
-    explainability_image TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-)
-""")
-conn.commit()
+# ===================== REQUEST METRICS ====================
+@app.before_request
+def start_request_metrics():
+    g.metrics_path = request.url_rule.rule if request.url_rule else "unmatched"
+    g.request_start = time.perf_counter()
+    REQUESTS_IN_FLIGHT.inc(path=g.metrics_path)
+
+
+# Registered first so it runs last, after the timing breakdown is added
+@app.after_request
+def compress(response):
+    return compress_response(request, response)
+
 
-# ---------- INIT FEEDBACK STORAGE ----------
-if not os.path.exists(FEEDBACK_FILE):
-    with open(FEEDBACK_FILE, "w") as f:
-        json.dump([], f)
+@app.after_request
+def attach_server_timing(response):
+    timings = g.get("stage_timings")
+    if not timings:
+        return response
+
+    response.headers["Server-Timing"] = server_timing_header(timings)
+
+    # Opt-in JSON copy of the breakdown for clients that log it
+    wants_timing = (
+        request.args.get("timing") == "1"
+        or request.headers.get("X-Server-Timing") == "1"
+    )
+    if wants_timing and response.is_json and not response.is_streamed:
+        body = response.get_json(silent=True)
+        if isinstance(body, dict):
+            body["server_timing"] = {
+                name: round(elapsed * 1000, 1) for name, elapsed in timings
+            }
+            response.set_data(json.dumps(body))
+    return response
+
+
+@app.teardown_request
+def finish_request_metrics(exc=None):
+    if "request_start" in g:
+        REQUESTS_IN_FLIGHT.dec(path=g.metrics_path)
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - g.request_start, path=g.metrics_path
+        )
+
+# ---------- IMPORT LEGACY FEEDBACK FILE (once) ----------
+# Feedback now lives in the feedback table; the old JSON file is imported
+# and renamed so later starts skip it.
+if os.path.exists(FEEDBACK_FILE):
+    imported = import_legacy_json(get_connection(), FEEDBACK_FILE)
+    os.replace(FEEDBACK_FILE, FEEDBACK_FILE + ".imported")
+    print(f"Imported {imported} feedback items from {FEEDBACK_FILE}")
 
 # =========================================================
 # ===================== WEATHER API =======================
+# =========================================================
+weather_client = (
+    WeatherClient(OpenWeatherProvider(WEATHER_API_KEY)) if WEATHER_API_KEY else None
+)
+if weather_client:
+    register_collector("weather", weather_client.stats)
+
+
 def get_weather(city):
-    if not city or not WEATHER_API_KEY:
+    if not city or not weather_client:
         return None
+    return weather_client.get(city)
+
+
+@app.route("/weather")
+def weather():
+    data = get_weather(request.args.get("city"))
+    if not data:
+        return jsonify({"error": "Weather data unavailable"}), 404
+    return jsonify(dict(data, condition=data["weather"]))
+
+# =========================================================
+# ==================== KNOWLEDGE BASE =====================
+# =========================================================
+# Compiled per model label at startup and swapped in whole when
+# disease_knowledge_base.json changes on disk
+print(KB.current().report())
+KB.watch()
+register_collector("knowledge_base", KB.stats)
+
+
+# Treatment text keyed by the kb_id that results carry in their advisory.
+# Clients cache it under its version and request /analyze?advisory=ref.
+@app.route("/knowledge-base")
+def knowledge_base():
+    kb = KB.current()
+    response = encoded_response(request, {
+        "version": kb.version,
+        "entries": kb.treatments
+    })
+    response.set_etag(kb.version)
+    response.cache_control.public = True
+    response.cache_control.max_age = 86400
+    return response.make_conditional(request)
+
+# =========================================================
+# ================== RESULT HELPERS =======================
+# =========================================================
+REPORT_INSERT_SQL = """
+INSERT INTO crop_reports
+(report_id, crop, disease, severity, confidence, advisory,
+ expert_enabled, voice_summary, explainability_image, offline_mode,
+ weather_data)
+VALUES (?,?,?,?,?,?,?,?,?,?,?)
+"""
+
+# Batches report and feedback inserts when DB_WRITE_BATCH_SIZE > 1
+report_writer = WriteBehind(REPORT_INSERT_SQL, name="report-writer")
+register_collector("report_writer", report_writer.stats)
+feedback_writer = WriteBehind(FEEDBACK_INSERT_SQL, name="feedback-writer")
+register_collector("feedback_writer", feedback_writer.stats)
+
+
+def finalize_result(result):
+    # ============ CONFIDENCE NORMALIZATION ============
+    raw_confidence = result.get("confidence", 0)
+
+    if isinstance(raw_confidence, (int, float)):
+        confidence_value = float(raw_confidence)
+    else:
+        confidence_value = 50.0
+        result["confidence_type"] = str(raw_confidence)
+
+    result["confidence"] = confidence_value
+
+    # ================= EXPERT CONNECT =================
+    result["expert_connect"] = {
+        "enabled": confidence_value < 60,
+        "reason": "Low AI confidence",
+        "whatsapp": f"https://wa.me/{EXPERTS['whatsapp']}",
+        "helpline": EXPERTS["helpline"]
+    }
+
+    return confidence_value
+
+
+def report_row(report_id, result):
+    return (
+        report_id,
+        result.get("crop_type"),
+        result.get("disease_detected"),
+        result.get("severity"),
+        result.get("confidence"),
+        json.dumps(result.get("advisory", {})),
+        int(result.get("expert_connect", {}).get("enabled", False)),
+        result.get("voice_summary"),
+        result.get("explainability_image"),
+        int(bool(result.get("offline_mode"))),
+        json.dumps(result["weather_data"]) if result.get("weather_data") else None
+    )
+
+# ---------- UPLOAD RETENTION (opt-in, content-addressed) ----------
+def retain_upload(data, filename, image_hash=None):
+    if not RETAIN_UPLOADS:
+        return None
+
+    ext = os.path.splitext(filename)[1].lower() or ".jpg"
+    image_path = os.path.join(
+        UPLOAD_DIR, f"{image_hash or content_hash(data)}{ext}"
+    )
+    if not os.path.exists(image_path):
+        with open(image_path, "wb") as f:
+            f.write(data)
+    return image_path
+
+
+# ---------- ORIGINALS (resumable chunked upload, retention only) ----------
+def finalize_original(session, part_path):
+    ext = os.path.splitext(session["filename"] or "")[1].lower() or ".jpg"
+    path = os.path.join(UPLOAD_DIR, f"{session['sha256']}{ext}")
+    os.replace(part_path, path)
+    return path
+
+
+original_uploads = ChunkedUploads(UPLOAD_DIR, finalize_original)
+register_collector("uploads", original_uploads.stats)
+
+
+def explain_image_path():
+    return os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex}_gradcam.jpg")
+
+
+# Stored heatmaps are rendered on demand through /explain/<name>
+def explain_image_ref(path, host_url):
+    if path.endswith(".npz"):
+        return f"{host_url}/explain/{os.path.basename(path)}"
+    return os.path.abspath(path).replace("\\", "/")
+
+# ---------- ANALYZE STAGES ----------
+def infer_image(data, filename, explain=True):
+    # A knowledge-base reload changes the advisory, so it starts new entries
+    cache_key = (content_hash(data), MODEL_VERSION, KB.current().version)
+    retain_upload(data, filename, cache_key[0])
+
+    # Entries cached by deferred requests may still lack a Grad-CAM
+    reusable = lambda entry: entry is not None and (entry["explain_image"] or not explain)
+
+    cache_entry = result_cache.get(cache_key)
+    if reusable(cache_entry):
+        return cache_entry, None, None
+
+    # Decode once; one fused pass yields prediction and Grad-CAM
+    with stage("decode"):
+        prepared = prepare_image(data)
+        phash = perceptual_hash(prepared.bgr)
+
+    if cache_entry is None:
+        similar = result_cache.get_similar(phash)
+        if similar is not None:
+            # A near-duplicate lends its prediction (and the voice built from
+            # it) only; the Grad-CAM is redrawn on this image
+            cache_entry = {
+                "result": similar["result"],
+                "explain_image": None,
+                "voice": dict(similar["voice"])
+            }
+            result_cache.put(cache_key, cache_entry, phash)
+            if reusable(cache_entry):
+                return cache_entry, None, None
 
     try:
-        url = (
-            "https://api.openweathermap.org/data/2.5/weather"
-            f"?q={city}&appid={WEATHER_API_KEY}&units=metric"
+        if explain:
+            image_features, heatmap = predict_and_explain(prepared)
+        else:
+            image_features, heatmap = extract_image_features(prepared.tensor), None
+    except:
+        traceback.print_exc()
+        image_features, heatmap = extract_image_features(prepared.tensor), None
+
+    if cache_entry is None:
+        cache_entry = {
+            "result": analyze_with_image(image_features),
+            "explain_image": None,
+            "voice": {}
+        }
+        result_cache.put(cache_key, cache_entry, phash)
+    return cache_entry, prepared, heatmap
+
+
+def render_gradcam(inference):
+    cache_entry, prepared, heatmap = inference
+    if heatmap is not None and not cache_entry["explain_image"]:
+        cache_entry["explain_image"] = save_explainability(
+            prepared, heatmap, explain_image_path()
         )
+    return cache_entry["explain_image"]
 
-        response = requests.get(url, timeout=10)
-        data = response.json()
 
-        if response.status_code != 200:
-            return None
+def voice_for(result, language, cache_entry=None):
+    voice_path = cache_entry["voice"].get(language) if cache_entry else None
+    if voice_path is None:
+        voice_path = generate_voice_summary(result, language)
+        if cache_entry and voice_path:
+            cache_entry["voice"][language] = voice_path
+    return voice_path
 
-        return {
-            "temperature": data["main"]["temp"],
-            "humidity": data["main"]["humidity"],
-            "weather": data["weather"][0]["description"],
-            "wind_speed": data["wind"]["speed"]
-        }
+# =========================================================
+# ================= DEFERRED ARTIFACTS ====================
+# =========================================================
+def gradcam_job(report_id, payload):
+    prepared = prepare_image_file(payload["input"])
+    _, heatmap = predict_and_explain(prepared)
+    explain_image = save_explainability(prepared, heatmap, explain_image_path())
+    os.remove(payload["input"])
+    return explain_image_ref(explain_image, payload["host_url"])
+
+
+def voice_job(report_id, payload):
+    voice_path = generate_voice_summary(payload["result"], payload["language"])
+    return payload["host_url"] + voice_path if voice_path else None
+
+
+# reportlab / qrcode are only needed here, so the server still starts (and
+# the job fails on its own) without them
+def pdf_job(report_id, payload):
+    from report_pdf import build_report_pdf
+
+    pdf_path = os.path.join(REPORT_PDF_DIR, f"{report_id}.pdf")
+    with open(pdf_path, "wb") as f:
+        f.write(build_report_pdf(payload["result"], payload["language"]))
+    return f"{payload['host_url']}/{pdf_path}"
+
+
+artifact_queue = ArtifactQueue(
+    handlers={"gradcam": gradcam_job, "voice": voice_job, "pdf": pdf_job},
+    columns={
+        "gradcam": "explainability_image",
+        "voice": "voice_summary",
+        "pdf": "pdf_report"
+    }
+)
+artifact_queue.start()
+register_collector("artifacts", artifact_queue.stats)
 
-    except Exception:
-        return None
+
+def artifact_jobs_for(report_id, result, language, host_url, data=None, inference=None):
+    summary = {
+        key: result.get(key)
+        for key in ("crop_type", "disease_detected", "severity", "confidence", "advisory")
+    }
+    jobs = {"pdf": {"result": summary, "language": language, "host_url": host_url}}
+
+    if not result.get("voice_summary"):
+        jobs["voice"] = {"result": summary, "language": language, "host_url": host_url}
+
+    # Only the model-sized thumbnail is kept for the Grad-CAM job
+    if data is not None and not result.get("explainability_image"):
+        prepared = (inference and inference[1]) or prepare_image(data)
+        input_path = os.path.join(UPLOAD_DIR, f"{report_id}_input.png")
+        cv2.imwrite(input_path, prepared.bgr)
+        jobs["gradcam"] = {"input": input_path, "host_url": host_url}
+
+    return jobs
+
+# =========================================================
+# ================= CLIENT UPLOAD CONFIG ==================
+# =========================================================
+@app.route("/analyze/config")
+def analyze_config():
+    height, width = MODEL_INPUT_SIZE
+    response = jsonify({
+        "model_input": [width, height],
+        # Grad-CAM overlays are drawn on the model-sized thumbnail
+        "gradcam_input": [width, height],
+        "min_side": max(width, height),
+        "max_side": max(UPLOAD_MAX_SIDE, width, height),
+        "jpeg_quality": UPLOAD_JPEG_QUALITY,
+        "retain_uploads": RETAIN_UPLOADS,
+        "chunk_size": original_uploads.chunk_size,
+        "max_upload_size": original_uploads.max_size
+    })
+    response.headers["Cache-Control"] = "max-age=3600"
+    return response
+
+
+def upload_error(e):
+    body = {"error": str(e)}
+    if e.offset is not None:
+        body["offset"] = e.offset
+    return jsonify(body), e.status
+
+
+@app.route("/uploads", methods=["POST"])
+def create_upload():
+    if not RETAIN_UPLOADS:
+        return jsonify({"error": "Upload retention is disabled"}), 403
+
+    data = request.get_json(silent=True) or {}
+    try:
+        return jsonify(original_uploads.create(
+            data.get("sha256"), data.get("size"),
+            os.path.basename(str(data.get("filename") or "")) or None,
+            data.get("report_id")
+        ))
+    except UploadError as e:
+        return upload_error(e)
+
+
+@app.route("/uploads/<upload_id>", methods=["GET", "PUT"])
+def upload_chunk(upload_id):
+    if request.method == "GET":
+        status = original_uploads.status(upload_id)
+        if status is None:
+            return jsonify({"error": "Upload not found"}), 404
+        return jsonify(status)
+
+    try:
+        offset = int(request.args.get("offset", ""))
+    except ValueError:
+        return jsonify({"error": "offset must be an integer"}), 400
+
+    try:
+        with stage("upload_chunk"):
+            return jsonify(original_uploads.write(upload_id, offset, request.get_data()))
+    except UploadError as e:
+        return upload_error(e)
 
 # =========================================================
 # ===================== ANALYZE API =======================
@@ -105,29 +515,39 @@ def analyze():
     try:
 
         city = request.form.get("city")
-        weather = get_weather(city)
         humidity = float(request.form.get("humidity", 0))
         temperature = float(request.form.get("temperature", 0))
         language = request.form.get("language", "en")
+        host_url = request.host_url.rstrip("/")
+        deferred = request.form.get("artifacts", ARTIFACT_MODE) == "deferred"
+        data = None
 
-        explain_image = None
+        # Weather, inference -> (Grad-CAM | voice) run as a stage graph;
+        # optional stages degrade to None when they fail or overrun.
+        graph = StageGraph()
+        graph.add("weather", lambda: get_weather(city),
+                  deadline=WEATHER_DEADLINE, optional=True)
 
         # ================= IMAGE =================
         if "image" in request.files and request.files["image"].filename:
             image = request.files["image"]
-            image_path = os.path.join(
-                UPLOAD_DIR, f"{uuid.uuid4().hex}_{image.filename}"
-            )
-            image.save(image_path)
-
-            image_features = extract_image_features(image_path)
+            data = image.read()
 
-            try:
-                explain_image = generate_explainability(image_path)
-            except:
-                explain_image = None
-
-            result = analyze_with_image(image_features)
+            graph.add(
+                "inference",
+                lambda: infer_image(data, image.filename, explain=not deferred),
+                deadline=INFERENCE_DEADLINE
+            )
+            if not deferred:
+                graph.add("gradcam", render_gradcam, deps=("inference",),
+                          deadline=GRADCAM_DEADLINE, optional=True)
+                graph.add(
+                    "voice",
+                    lambda inference: voice_for(
+                        inference[0]["result"], language, inference[0]
+                    ),
+                    deps=("inference",), deadline=VOICE_DEADLINE, optional=True
+                )
 
         # ================= NO IMAGE =================
         else:
@@ -135,50 +555,45 @@ def analyze():
             if not crop:
                 return jsonify({"error": "Crop required"}), 400
 
-            result = analyze_without_image(
+            no_image_result = analyze_without_image(
                 crop_type=crop,
                 environment={
                     "humidity": humidity,
                     "temperature": temperature
                 }
             )
+            if not deferred:
+                graph.add("voice", lambda: voice_for(no_image_result, language),
+                          deadline=VOICE_DEADLINE, optional=True)
 
-        # =================================================
-        # ============ CONFIDENCE NORMALIZATION ============
-        # =================================================
-        raw_confidence = result.get("confidence", 0)
+        stages = graph.run()
 
-        if isinstance(raw_confidence, (int, float)):
-            confidence_value = float(raw_confidence)
+        if "inference" in stages:
+            result = cached_result(stages["inference"][0])
         else:
-            confidence_value = 50.0
-            result["confidence_type"] = str(raw_confidence)
+            result = no_image_result
 
-        result["confidence"] = confidence_value
+        finalize_result(result)
 
-        # ================= EXPERT CONNECT =================
-        result["expert_connect"] = {
-            "enabled": confidence_value < 60,
-            "reason": "Low AI confidence",
-            "whatsapp": f"https://wa.me/{EXPERTS['whatsapp']}",
-            "helpline": EXPERTS["helpline"]
-        }
+        result["weather_data"] = stages["weather"]
 
-        result["weather_data"] = weather
+        # Deferred requests only reuse artifacts already in the result cache
+        if deferred and "inference" in stages:
+            cache_entry = stages["inference"][0]
+            voice_path = cache_entry["voice"].get(language)
+            explain_image = cache_entry["explain_image"]
+        else:
+            voice_path = stages.get("voice")
+            explain_image = stages.get("gradcam")
 
         # ================= VOICE =================
-        voice_path = generate_voice_summary(result, language)
-
-        if voice_path:
-           result["voice_summary"] = request.host_url.rstrip("/") + voice_path
-        else:
-           result["voice_summary"] = None
+        result["voice_summary"] = host_url + voice_path if voice_path else None
 
         # ================= EXPLAIN IMAGE =================
         if explain_image:
-            result["explainability_image"] = os.path.abspath(
-                explain_image
-            ).replace("\\", "/")
+            result["explainability_image"] = explain_image_ref(
+                explain_image, host_url
+            )
 
         # =================================================
         # ============== SAVE REPORT TO SQLITE =============
@@ -186,25 +601,457 @@ def analyze():
         report_id = uuid.uuid4().hex
         result["report_id"] = report_id
 
-        cursor.execute("""
-        INSERT INTO crop_reports
-        (report_id, crop, disease, severity, confidence, advisory,
-         expert_enabled, voice_summary, explainability_image)
-        VALUES (?,?,?,?,?,?,?,?,?)
-        """, (
-            report_id,
-            result.get("crop_type"),
-            result.get("disease_detected"),
-            result.get("severity"),
-            confidence_value,
-            json.dumps(result.get("advisory", {})),
-            int(result.get("expert_connect", {}).get("enabled", False)),
-            result.get("voice_summary"),
-            result.get("explainability_image")
-        ))
-        conn.commit()
+        # Artifact jobs are queued once the report row is committed, since
+        # each finished artifact updates that row
+        enqueue = None
+        if deferred:
+            with stage("artifact_prepare"):
+                jobs = artifact_jobs_for(
+                    report_id, result, language, host_url,
+                    data, stages.get("inference")
+                )
+            enqueue = lambda: artifact_queue.enqueue(report_id, jobs)
+            result["artifacts"] = {
+                "status_url": f"{host_url}/reports/{report_id}/artifacts",
+                "pending": sorted(jobs)
+            }
+
+        with stage("db_insert"):
+            report_writer.submit(report_row(report_id, result), after_commit=enqueue)
+
+        # fields= / advisory=ref / format=msgpack shape what is sent back
+        return negotiated_response(request, result, kb_version=KB.current().version)
+
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+# =========================================================
+# ====================== RISK API =========================
+# =========================================================
+# Every field's series is padded into one (fields, steps) matrix so the
+# whole request is scored in a single vectorized call
+def risk_matrix(fields, key, steps):
+    return padded_matrix([field.get(key) for field in fields], steps)
+
+
+@app.route("/risk/batch", methods=["POST"])
+def risk_batch():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "JSON object with fields required"}), 400
+    fields = data.get("fields")
+    if not isinstance(fields, list) or not fields:
+        return jsonify({"error": "fields required"}), 400
+    if not all(isinstance(field, dict) for field in fields):
+        return jsonify({"error": "Invalid fields: each field must be an object"}), 400
+    if len(fields) > RISK_MAX_FIELDS:
+        return jsonify({"error": f"Too many fields (max {RISK_MAX_FIELDS})"}), 413
+
+    min_severity = data.get("min_severity", "Medium")
+    if min_severity not in SEVERITIES:
+        return jsonify({"error": f"min_severity must be one of {SEVERITIES}"}), 400
+    with_series = data.get("series", True)
+
+    try:
+        min_length = int(data.get("min_window", 1))
+        # Hours between readings; converts each crop's wetness window to steps
+        step_hours = float(data.get("step_hours", 1))
+        lengths = [len(field["humidity"]) for field in fields]
+        for field, length in zip(fields, lengths):
+            if len(field["temperature"]) != length or (
+                    field.get("leaf_wetness") and len(field["leaf_wetness"]) != length):
+                raise ValueError("series lengths differ within a field")
+        steps = max(lengths)
+        if steps > RISK_MAX_STEPS:
+            return jsonify({"error": f"Too many steps (max {RISK_MAX_STEPS})"}), 413
+
+        with stage("risk_engine"):
+            risk = assess_risk(
+                risk_matrix(fields, "humidity", steps),
+                risk_matrix(fields, "temperature", steps),
+                crop=[field.get("crop") for field in fields],
+                leaf_wetness=(
+                    risk_matrix(fields, "leaf_wetness", steps)
+                    if any(field.get("leaf_wetness") for field in fields) else None
+                ),
+                step_hours=step_hours
+            )
+            windows = pressure_windows(
+                risk["level"], SEVERITIES.index(min_severity), min_length
+            )
+    except KeyError as e:
+        return jsonify({"error": f"Invalid fields: missing {e}"}), 400
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid fields: {e}"}), 400
+
+    results = []
+    for row, (field, length) in enumerate(zip(fields, lengths)):
+        times = field.get("times")
+        item = {
+            "id": field.get("id", row),
+            "crop": field.get("crop"),
+            "peak_severity": SEVERITIES[int(risk["level"][row, :length].max(initial=0))],
+            "windows": [
+                dict(
+                    start=start, end=end, peak_severity=SEVERITIES[peak],
+                    **({"start_time": times[start], "end_time": times[end - 1]}
+                       if times and len(times) == length else {})
+                )
+                for start, end, peak in windows[row]
+            ]
+        }
+        if with_series:
+            item["severity"] = risk["severity"][row, :length].tolist()
+            item["risk_score"] = risk["risk_score"][row, :length].tolist()
+        results.append(item)
+
+    return encoded_response(request, {"status": "SUCCESS", "results": results})
+
+# =========================================================
+# ================= PROACTIVE RISK ALERTS =================
+# =========================================================
+# Hourly forecast check of every registered farm; alerts land in the
+# alert_outbox table, read and acknowledged by a dispatcher via /alerts
+forecast_client = (
+    WeatherClient(ForecastProvider(weather_client.provider), ttl=WEATHER_FORECAST_TTL)
+    if weather_client else None
+)
+alert_scheduler = None
+if forecast_client and ALERT_INTERVAL > 0:
+    alert_scheduler = RiskAlertScheduler(forecast_client.get).start()
+    register_collector("forecast", forecast_client.stats)
+    register_collector("alerts", alert_scheduler.stats)
+
+
+@app.route("/farms", methods=["POST"])
+def farms():
+    data = request.get_json(silent=True)
+    items = data.get("farms", [data]) if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items or not all(
+            isinstance(item, dict) for item in items):
+        return jsonify({"error": "A farm object or a farms list is required"}), 400
+    try:
+        farm_ids = register_farms(get_connection(), items)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"status": "SUCCESS", "farm_ids": farm_ids})
+
+
+@app.route("/farms/<farm_id>", methods=["DELETE"])
+def delete_farm(farm_id):
+    with transaction() as db:
+        deleted = db.execute("DELETE FROM farms WHERE farm_id = ?", (farm_id,)).rowcount
+    if not deleted:
+        return jsonify({"error": "Farm not found"}), 404
+    return jsonify({"status": "SUCCESS"})
+
+
+@app.route("/alerts")
+def alerts():
+    try:
+        after = int(request.args.get("after", 0))
+        limit = min(int(request.args.get("limit", 500)), 5000)
+    except ValueError:
+        return jsonify({"error": "after and limit must be integers"}), 400
+    items = pending_alerts(get_connection(), after, limit)
+    return encoded_response(request, {
+        "alerts": items,
+        "next_after": items[-1]["alert_id"] if items else after
+    })
+
+
+@app.route("/alerts/ack", methods=["POST"])
+def alerts_ack():
+    alert_ids = (request.get_json(silent=True) or {}).get("alert_ids")
+    if not isinstance(alert_ids, list) or not all(isinstance(i, int) for i in alert_ids):
+        return jsonify({"error": "alert_ids must be a list of integers"}), 400
+    return jsonify({"acknowledged": mark_sent(get_connection(), alert_ids)})
+
+# =========================================================
+# ===================== REPORTS API =======================
+# =========================================================
+@app.route("/reports")
+def reports():
+    try:
+        with stage("db_query"):
+            return jsonify(list_reports(get_connection(), request.args))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@app.route("/reports/stats")
+def reports_stats():
+    try:
+        with stage("db_query"):
+            return jsonify(report_stats(get_connection(), request.args))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@app.route("/reports/<report_id>")
+def report_detail(report_id):
+    with stage("db_query"):
+        report = get_report(get_connection(), report_id)
+        # The row may still be waiting in the write-behind queue
+        if report is None and report_writer.flush(timeout=1):
+            report = get_report(get_connection(), report_id)
+
+    if report is None:
+        return jsonify({"error": "Report not found"}), 404
+
+    artifacts = artifact_queue.status(report_id)
+    if artifacts:
+        report["artifacts"] = artifacts
+    return jsonify(report)
+
+# ---------- ARTIFACT STATUS (JSON POLLING OR SERVER-SENT EVENTS) ----------
+@app.route("/reports/<report_id>/artifacts")
+def report_artifacts(report_id):
+    status = artifact_queue.status(report_id)
+    if not status:
+        return jsonify({"error": "No artifacts for this report"}), 404
+
+    wants_stream = (
+        request.args.get("stream") == "1"
+        or "text/event-stream" in request.headers.get("Accept", "")
+    )
+    if not wants_stream:
+        return jsonify({
+            "report_id": report_id,
+            "artifacts": status,
+            "complete": artifact_queue.is_complete(status)
+        })
+
+    def events():
+        sent = {}
+        deadline = time.monotonic() + ARTIFACT_STREAM_TIMEOUT
+        current = status
+        while True:
+            for kind, item in current.items():
+                if sent.get(kind) != item:
+                    sent[kind] = item
+                    yield f"event: artifact\ndata: {json.dumps(dict(item, kind=kind))}\n\n"
+
+            if artifact_queue.is_complete(current):
+                yield f"event: complete\ndata: {json.dumps({'report_id': report_id})}\n\n"
+                return
+            if time.monotonic() > deadline:
+                yield "event: timeout\ndata: {}\n\n"
+                return
+
+            time.sleep(0.5)
+            current = artifact_queue.status(report_id)
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# ---------- ON-DEMAND GRAD-CAM RENDERING ----------
+@app.route("/explain/<name>")
+def render_explainability(name):
+    path = os.path.join(UPLOAD_DIR, os.path.basename(name))
+    if not path.endswith(".npz") or not os.path.exists(path):
+        return jsonify({"error": "Heatmap not found"}), 404
+
+    heatmap, image = load_heatmap(path)
+    ok, jpeg = cv2.imencode(".jpg", render_overlay(heatmap, image))
+    return Response(jpeg.tobytes(), mimetype="image/jpeg")
+
+# =========================================================
+# ================== BULK ANALYZE API =====================
+# =========================================================
+class BatchTooLarge(Exception):
+    pass
+
+
+def check_batch_limits(count, sizes, total):
+    if count > BATCH_MAX_IMAGES:
+        raise BatchTooLarge(f"Too many images (max {BATCH_MAX_IMAGES})")
+    if any(size > BATCH_MAX_IMAGE_BYTES for size in sizes):
+        raise BatchTooLarge(f"Image too large (max {BATCH_MAX_IMAGE_BYTES} bytes)")
+    if total > BATCH_MAX_TOTAL_BYTES:
+        raise BatchTooLarge(f"Batch too large (max {BATCH_MAX_TOTAL_BYTES} bytes)")
+
+
+def collect_batch_images():
+    images, total = [], 0
+    uploads = request.files.getlist("images") + request.files.getlist("archive")
+
+    for upload in uploads:
+        if not upload.filename:
+            continue
+
+        if upload.filename.lower().endswith(".zip"):
+            with zipfile.ZipFile(upload.stream) as archive:
+                members = [
+                    info for info in archive.infolist()
+                    if not (info.is_dir() or info.filename.startswith("__MACOSX/")
+                            or not info.filename.lower().endswith(IMAGE_EXTENSIONS))
+                ]
+                # Declared sizes bound what read() will inflate
+                sizes = [info.file_size for info in members]
+                total += sum(sizes)
+                check_batch_limits(len(images) + len(members), sizes, total)
+                images.extend(
+                    (os.path.basename(info.filename), archive.read(info))
+                    for info in members
+                )
+        else:
+            data = upload.read()
+            total += len(data)
+            check_batch_limits(len(images) + 1, [len(data)], total)
+            images.append((upload.filename, data))
+
+    return images
+
+
+def summarize_batch(items):
+    by_crop = Counter()
+    by_severity = Counter()
+    by_disease = Counter()
+
+    for item in items:
+        if "error" in item:
+            continue
+        by_crop[item["crop_type"]] += 1
+        by_severity[item["severity"]] += 1
+        by_disease[(item["crop_type"], item["disease_detected"])] += 1
+
+    analyzed = sum(by_crop.values())
+    return {
+        "total": len(items),
+        "analyzed": analyzed,
+        "failed": len(items) - analyzed,
+        "by_crop": dict(by_crop),
+        "by_severity": dict(by_severity),
+        "by_disease": [
+            {"crop": crop, "disease": disease, "count": count}
+            for (crop, disease), count in by_disease.most_common()
+        ]
+    }
+
+
+def run_batch_analysis(images, weather, language, host_url,
+                       with_voice=False, with_gradcam=False):
+    with stage("decode", path="/analyze-batch"):
+        batch, valid = preprocess_image_batch([data for _, data in images])
+    positions = {i: pos for pos, i in enumerate(valid)}
+    rows = []
+
+    def flush():
+        if rows:
+            with stage("db_insert", path="/analyze-batch"), transaction() as db:
+                db.executemany(REPORT_INSERT_SQL, rows)
+            rows.clear()
+
+    with stage("inference", path="/analyze-batch"):
+        if with_gradcam:
+            batch_features, heatmaps = explain_batch_features(batch)
+        else:
+            batch_features, heatmaps = extract_batch_features(batch), None
+    features = dict(zip(valid, batch_features))
+
+    try:
+        for i, (filename, data) in enumerate(images):
+            if i not in features:
+                yield {"filename": filename, "error": "Image could not be read"}
+                continue
+
+            retain_upload(data, filename)
+
+            result = analyze_with_image(features[i])
+            finalize_result(result)
+            result["weather_data"] = weather
+            result["voice_summary"] = None
+
+            if with_voice:
+                voice_path = generate_voice_summary(result, language)
+                if voice_path:
+                    result["voice_summary"] = host_url + voice_path
+
+            if heatmaps is not None:
+                pos = positions[i]
+                try:
+                    result["explainability_image"] = explain_image_ref(
+                        save_explainability(
+                            prepared_from_tensor(batch[pos]), heatmaps[pos],
+                            explain_image_path()
+                        ),
+                        host_url
+                    )
+                except Exception:
+                    pass
+
+            result["report_id"] = uuid.uuid4().hex
+            result["filename"] = filename
+            rows.append(report_row(result["report_id"], result))
+            if len(rows) >= BATCH_DB_CHUNK:
+                flush()
+            yield result
+    finally:
+        # Every report_id handed out is stored, even when a streaming
+        # client disconnects part-way
+        flush()
 
-        return jsonify(result)
+
+@app.route("/analyze-batch", methods=["POST"])
+def analyze_batch():
+    try:
+        images = collect_batch_images()
+        if not images:
+            return jsonify({"error": "No images uploaded"}), 400
+
+        flag = lambda name: request.form.get(name, "0").lower() in ("1", "true", "yes")
+        with stage("weather"):
+            weather = get_weather(request.form.get("city"))
+
+        results = run_batch_analysis(
+            images,
+            weather=weather,
+            language=request.form.get("language", "en"),
+            host_url=request.host_url.rstrip("/"),
+            with_voice=flag("voice"),
+            with_gradcam=flag("gradcam")
+        )
+
+        # Per-image fields= / advisory=ref; failed images keep their error
+        kb_version = KB.current().version
+        shape = lambda item: (
+            item if "error" in item else shape_result(request, item, kb_version)
+        )
+
+        # ---------- NDJSON STREAM: one line per image, then summary ----------
+        if flag("stream"):
+            def generate():
+                items = []
+                try:
+                    for item in results:
+                        items.append(item)
+                        yield dumps_json(shape(item)) + b"\n"
+                    yield dumps_json({"summary": summarize_batch(items)}) + b"\n"
+                finally:
+                    results.close()  # flushes rows on client disconnect
+
+            return Response(
+                stream_with_context(generate()),
+                mimetype="application/x-ndjson"
+            )
+
+        items = list(results)
+        return encoded_response(request, {
+            "status": "SUCCESS",
+            "results": [shape(item) for item in items],
+            "summary": summarize_batch(items)
+        })
+
+    except zipfile.BadZipFile:
+        return jsonify({"error": "Invalid zip archive"}), 400
+
+    except BatchTooLarge as e:
+        return jsonify({"error": str(e)}), 413
 
     except Exception as e:
         traceback.print_exc()
@@ -218,20 +1065,56 @@ def analyze():
 def feedback():
     try:
         data = request.json
-        if not data:
+        if not isinstance(data, dict) or not data:
             return jsonify({"error": "No feedback data"}), 400
 
-        with open(FEEDBACK_FILE, "r+") as f:
-            existing = json.load(f)
-            existing.append(data)
-            f.seek(0)
-            json.dump(existing, f, indent=2)
+        # feedback.report_id references crop_reports; the report row may
+        # still be waiting in the write-behind queue
+        report_id = data.get("report_id")
+        if report_id:
+            with stage("db_query"):
+                exists = lambda: get_connection().execute(
+                    "SELECT 1 FROM crop_reports WHERE report_id = ?", (report_id,)
+                ).fetchone()
+                if not exists() and not (report_writer.flush(timeout=1) and exists()):
+                    return jsonify({"error": "Report not found"}), 404
+
+        with stage("feedback_write"):
+            feedback_writer.submit(feedback_row(data))
 
         return jsonify({"status": "SUCCESS"})
 
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
+
+
+# ---------- BULK EXPORT FOR RETRAINING (NDJSON) ----------
+@app.route("/feedback/export")
+def feedback_export():
+    types = [t for t in request.args.get("type", "").split(",") if t] or None
+    try:
+        feedback_writer.flush(timeout=1)
+        items = iter_feedback(
+            get_connection(), request.args.get("from"),
+            request.args.get("to"), types
+        )
+        first = next(items, None)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def generate():
+        if first is None:
+            return
+        yield json.dumps(first) + "\n"
+        for item in items:
+            yield json.dumps(item) + "\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="application/x-ndjson",
+        headers={"Content-Disposition": "attachment; filename=feedback.jsonl"}
+    )
     
 # =========================================================
 # ================= OFFLINE SYNC API ======================
@@ -248,29 +1131,21 @@ def sync_offline():
             "confidence": data.get("confidence", "50%")
         }
 
-        result = analyze_with_image(image_features)
+        # Knowledge-base lookup only; the model already ran on the device
+        with stage("advisory"):
+            result = analyze_with_image(image_features)
         result["offline_mode"] = True
-        result["weather_data"] = get_weather(data.get("city"))
+        with stage("weather"):
+            result["weather_data"] = get_weather(data.get("city"))
 
         report_id = uuid.uuid4().hex
         result["report_id"] = report_id
 
-        cursor.execute("""
-        INSERT INTO crop_reports
-        (report_id, crop, disease, severity, confidence, advisory,
-         expert_enabled, offline_mode)
-        VALUES (?,?,?,?,?,?,?,?)
-        """, (
-            report_id,
-            result.get("crop_type"),
-            result.get("disease_detected"),
-            result.get("severity"),
-            float(result.get("confidence", 50)),
-            json.dumps(result.get("advisory", {})),
-            0,
-            1
-        ))
-        conn.commit()
+        with stage("db_insert"):
+            report_writer.submit(report_row(
+                report_id,
+                dict(result, confidence=numeric_confidence(result.get("confidence")))
+            ))
 
         return jsonify(result)
 
@@ -278,6 +1153,183 @@ def sync_offline():
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
+
+# ---------- BULK SYNC: gzip chunks, idempotent by client record id ----------
+SYNC_INSERT_SQL = """
+INSERT OR IGNORE INTO crop_reports
+(report_id, crop, disease, severity, confidence, advisory,
+ expert_enabled, voice_summary, explainability_image, offline_mode,
+ weather_data, client_record_id, created_at)
+VALUES (?,?,?,?,?,?,?,?,?,?,?,?, COALESCE(?, CURRENT_TIMESTAMP))
+"""
+
+
+# crop_reports.confidence is numeric; offline labels carry e.g. "87.5%"
+def numeric_confidence(value, default=50.0):
+    try:
+        return float(str(value).rstrip("%"))
+    except ValueError:
+        return default
+
+
+# Client ISO timestamps become UTC in the CURRENT_TIMESTAMP format
+def record_time(value):
+    try:
+        when = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if when.tzinfo:
+        when = when.astimezone(timezone.utc).replace(tzinfo=None)
+    return when.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def sync_payload():
+    body = request.get_data()
+    if request.headers.get("Content-Encoding", "").lower() == "gzip":
+        inflater = zlib.decompressobj(wbits=31)
+        body = inflater.decompress(body, SYNC_MAX_BYTES)
+        if inflater.unconsumed_tail:
+            raise ValueError("Sync chunk too large")
+    elif len(body) > SYNC_MAX_BYTES:
+        raise ValueError("Sync chunk too large")
+    return json.loads(body)
+
+
+def offline_record_result(record):
+    if record.get("crop_disease_label"):
+        result = analyze_with_image({
+            "disease": record["crop_disease_label"],
+            "confidence": str(record.get("confidence", "50%"))
+        })
+    elif record.get("crop_type"):
+        result = {
+            key: record.get(key)
+            for key in ("crop_type", "disease_detected", "severity", "advisory")
+        }
+    else:
+        raise ValueError("crop_disease_label or crop_type required")
+
+    result["confidence"] = numeric_confidence(record.get("confidence"))
+    result["offline_mode"] = True
+    finalize_result(result)
+    return result
+
+
+def device_cursor(conn, device_id):
+    row = conn.execute(
+        "SELECT cursor, records FROM sync_devices WHERE device_id = ?", (device_id,)
+    ).fetchone()
+    return {"device_id": device_id, "cursor": row[0] if row else 0,
+            "records": row[1] if row else 0}
+
+
+@app.route("/sync-offline/bulk", methods=["GET", "POST"])
+def sync_offline_bulk():
+    if request.method == "GET":
+        device_id = request.args.get("device_id")
+        if not device_id:
+            return jsonify({"error": "device_id required"}), 400
+        return jsonify(device_cursor(get_connection(), device_id))
+
+    try:
+        payload = sync_payload()
+    except (ValueError, zlib.error) as e:
+        return jsonify({"error": f"Invalid sync chunk: {e}"}), 400
+
+    records = payload.get("records") if isinstance(payload, dict) else None
+    if not isinstance(records, list) or not records:
+        return jsonify({"error": "No records"}), 400
+    if len(records) > SYNC_MAX_RECORDS:
+        return jsonify({"error": f"Too many records (max {SYNC_MAX_RECORDS})"}), 413
+    device_id = payload.get("device_id")
+
+    try:
+        record_ids = [r.get("record_id") if isinstance(r, dict) else None
+                      for r in records]
+        known_ids = [rid for rid in record_ids if isinstance(rid, str) and rid]
+        with stage("db_query"):
+            known = dict(get_connection().execute(
+                "SELECT client_record_id, report_id FROM crop_reports "
+                f"WHERE client_record_id IN ({', '.join('?' * len(known_ids))})",
+                known_ids
+            ).fetchall()) if known_ids else {}
+
+        # Only current conditions exist, so one lookup per (city, today);
+        # records from earlier days are stored without weather
+        today = datetime.utcnow().strftime("%Y-%m-%d")
+        weather = {}
+
+        def weather_for(city, day):
+            key = (normalize_city(city), day)
+            if key not in weather:
+                weather[key] = get_weather(city) if key[0] and day == today else None
+            return weather[key]
+
+        acks, pending = [], []
+        for record, record_id in zip(records, record_ids):
+            ack = {"record_id": record_id}
+            acks.append(ack)
+            if not isinstance(record_id, str) or not record_id:
+                ack.update(status="rejected", error="record_id required")
+            elif record_id in known:
+                ack.update(status="duplicate", report_id=known[record_id])
+            else:
+                try:
+                    result = offline_record_result(record)
+                except ValueError as e:
+                    ack.update(status="rejected", error=str(e))
+                    continue
+                created_at = record_time(record.get("saved_at"))
+                with stage("weather"):
+                    result["weather_data"] = weather_for(
+                        record.get("city"), (created_at or today)[:10]
+                    )
+                report_id = uuid.uuid4().hex
+                pending.append((ack, report_row(report_id, result) + (record_id, created_at)))
+
+        seqs = [r["seq"] for r in records
+                if isinstance(r, dict) and isinstance(r.get("seq"), int)]
+
+        # ---------- ONE TRANSACTION PER CHUNK ----------
+        with stage("db_insert"), transaction() as db:
+            for ack, row in pending:
+                if db.execute(SYNC_INSERT_SQL, row).rowcount:
+                    ack.update(status="created", report_id=row[0])
+                else:
+                    # Same record id inserted by a concurrent retry or
+                    # earlier in this chunk
+                    ack.update(status="duplicate", report_id=db.execute(
+                        "SELECT report_id FROM crop_reports WHERE client_record_id = ?",
+                        (ack["record_id"],)
+                    ).fetchone()[0])
+
+            created = sum(ack["status"] == "created" for ack in acks)
+            if device_id:
+                db.execute("""
+                INSERT INTO sync_devices (device_id, cursor, records)
+                VALUES (?, ?, ?)
+                ON CONFLICT (device_id) DO UPDATE SET
+                    cursor = MAX(cursor, excluded.cursor),
+                    records = records + excluded.records,
+                    updated_at = CURRENT_TIMESTAMP
+                """, (device_id, max(seqs, default=0), created))
+                cursor = device_cursor(db, device_id)["cursor"]
+            else:
+                cursor = max(seqs, default=None)
+
+        return jsonify({
+            "acks": acks,
+            "cursor": cursor,
+            "created": created,
+            "duplicates": sum(ack["status"] == "duplicate" for ack in acks),
+            "rejected": sum(ack["status"] == "rejected" for ack in acks),
+            "weather_lookups": len(weather)
+        })
+
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
 # =========================================================
 # ===================== HEALTH CHECK ======================
 # =========================================================
@@ -286,6 +1338,31 @@ def health():
     return jsonify({"status": "CropGuard backend running"}), 200
 
 
+# =========================================================
+# ================= PROMETHEUS METRICS ====================
+# =========================================================
+@app.route("/metrics")
+def metrics():
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+# =========================================================
+# ===================== RUNTIME STATS =====================
+# =========================================================
+@app.route("/stats")
+def stats():
+    return jsonify({
+        "inference": inference_batcher.stats(),
+        "explain": explain_batcher.stats(),
+        "pool": inference_pool.stats() if inference_pool else None,
+        "result_cache": result_cache.stats(),
+        "artifacts": artifact_queue.stats(),
+        "uploads": original_uploads.stats(),
+        "report_writer": report_writer.stats(),
+        "feedback_writer": feedback_writer.stats()
+    })
+
+
 # =========================================================
 # ===================== RUN SERVER ========================
 # =========================================================
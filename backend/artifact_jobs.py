@@ -0,0 +1,211 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+
+from storage import get_connection
+
+# ---------- CONFIG ----------
+ARTIFACT_WORKERS = int(os.getenv("ARTIFACT_WORKERS", 2))
+ARTIFACT_MAX_ATTEMPTS = int(os.getenv("ARTIFACT_MAX_ATTEMPTS", 3))
+ARTIFACT_RETRY_BACKOFF = float(os.getenv("ARTIFACT_RETRY_BACKOFF", 5))
+ARTIFACT_POLL_INTERVAL = float(os.getenv("ARTIFACT_POLL_INTERVAL", 1))
+# Seconds a claimed job stays with its worker before another may take it
+ARTIFACT_LEASE_SECONDS = float(os.getenv("ARTIFACT_LEASE_SECONDS", 300))
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+# Due pending jobs, and running jobs whose lease has expired
+CLAIMABLE_SQL = (
+    "(status = ? AND available_at <= ?) OR (status = ? AND claimed_at < ?)"
+)
+
+
+class ArtifactUnavailable(Exception):
+    pass
+
+
+# =====================================================
+# 📦 PERSISTENT ARTIFACT JOB QUEUE
+# =====================================================
+# Jobs live in the artifact_jobs table next to crop_reports (see storage
+# migrations), so a restart picks up whatever was still pending. A claim
+# is a lease (claimed_at + owner): jobs left running by a dead worker are
+# taken again once the lease expires, while jobs other live processes are
+# working on are left alone. Each handler returns the artifact reference,
+# which is written to the job row and to the report's column in a single
+# transaction.
+#
+#   handlers: {kind: fn(report_id, payload) -> value}
+#   columns:  {kind: crop_reports column that receives the value}
+class ArtifactQueue:
+    def __init__(self, handlers, columns, workers=ARTIFACT_WORKERS,
+                 max_attempts=ARTIFACT_MAX_ATTEMPTS,
+                 retry_backoff=ARTIFACT_RETRY_BACKOFF,
+                 poll_interval=ARTIFACT_POLL_INTERVAL,
+                 lease_seconds=ARTIFACT_LEASE_SECONDS):
+        self.handlers = handlers
+        self.columns = columns
+        self.num_workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_backoff = retry_backoff
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+        self._wakeup = threading.Condition()
+        self._started = False
+        self._lock = threading.Lock()
+        self.counters = {
+            "enqueued": 0, "completed": 0, "retried": 0, "failed": 0,
+            "lease_expired": 0
+        }
+
+    # ---------- LIFECYCLE ----------
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            for i in range(self.num_workers):
+                threading.Thread(target=self._worker, name=f"artifact-{i}",
+                                 daemon=True).start()
+            self._started = True
+
+    # ---------- PRODUCER ----------
+    def enqueue(self, report_id, jobs):
+        if not jobs:
+            return []
+
+        db = get_connection()
+        with db:
+            db.executemany(
+                "INSERT OR IGNORE INTO artifact_jobs (report_id, kind, payload) "
+                "VALUES (?, ?, ?)",
+                [(report_id, kind, json.dumps(payload))
+                 for kind, payload in jobs.items()]
+            )
+        self.counters["enqueued"] += len(jobs)
+
+        self.start()
+        with self._wakeup:
+            self._wakeup.notify(len(jobs))
+        return sorted(jobs)
+
+    # ---------- CONSUMER ----------
+    def _claim(self, db):
+        now = time.time()
+        args = (PENDING, now, RUNNING, now - self.lease_seconds)
+        row = db.execute(
+            "SELECT id, report_id, kind, payload, attempts, status FROM artifact_jobs "
+            f"WHERE {CLAIMABLE_SQL} ORDER BY id LIMIT 1",
+            args
+        ).fetchone()
+        if row is None:
+            return None
+
+        # Conditional update: only one worker (or process) wins the job
+        with db:
+            claimed = db.execute(
+                "UPDATE artifact_jobs SET status = ?, attempts = attempts + 1, "
+                "claimed_at = ?, owner = ?, updated_at = CURRENT_TIMESTAMP "
+                f"WHERE id = ? AND ({CLAIMABLE_SQL})",
+                (RUNNING, now, self.owner, row[0]) + args
+            ).rowcount
+        if not claimed:
+            return None
+        if row[5] == RUNNING:
+            self.counters["lease_expired"] += 1
+            # The job may be what killed its worker; stop after max_attempts
+            if row[4] >= self.max_attempts:
+                self._fail(db, row[0], row[4] + 1, "lease expired")
+                return None
+        return row[:5]
+
+    def _worker(self):
+        db = get_connection()
+        while True:
+            try:
+                job = self._claim(db)
+            except sqlite3.Error:
+                traceback.print_exc()
+                job = None
+
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
+                continue
+
+            self._run(db, *job)
+
+    def _run(self, db, job_id, report_id, kind, payload, attempts):
+        try:
+            value = self.handlers[kind](report_id, json.loads(payload or "null"))
+            if value is None:
+                raise ArtifactUnavailable(f"{kind} produced no output")
+        except Exception as e:
+            if not isinstance(e, ArtifactUnavailable):
+                traceback.print_exc()
+            self._fail(db, job_id, attempts + 1, repr(e))
+            return
+
+        column = self.columns.get(kind)
+        with db:
+            # A lease that expired mid-run now belongs to another worker
+            owned = db.execute(
+                "UPDATE artifact_jobs SET status = ?, value = ?, error = NULL, "
+                "updated_at = CURRENT_TIMESTAMP WHERE id = ? AND owner = ?",
+                (DONE, value, job_id, self.owner)
+            ).rowcount
+            if column and owned:
+                db.execute(
+                    f"UPDATE crop_reports SET {column} = ? WHERE report_id = ?",
+                    (value, report_id)
+                )
+        self.counters["completed"] += 1
+
+    def _fail(self, db, job_id, attempts, error):
+        if attempts < self.max_attempts:
+            status = PENDING
+            available_at = time.time() + self.retry_backoff * 2 ** (attempts - 1)
+            self.counters["retried"] += 1
+        else:
+            status, available_at = FAILED, 0
+            self.counters["failed"] += 1
+
+        with db:
+            db.execute(
+                "UPDATE artifact_jobs SET status = ?, error = ?, available_at = ?, "
+                "updated_at = CURRENT_TIMESTAMP WHERE id = ? AND owner = ?",
+                (status, error, available_at, job_id, self.owner)
+            )
+
+    # ---------- STATUS ----------
+    def status(self, report_id):
+        rows = get_connection().execute(
+            "SELECT kind, status, value, error, attempts FROM artifact_jobs "
+            "WHERE report_id = ? ORDER BY id",
+            (report_id,)
+        ).fetchall()
+        return {
+            kind: {"status": status, "url": value, "error": error,
+                   "attempts": attempts}
+            for kind, status, value, error, attempts in rows
+        }
+
+    @staticmethod
+    def is_complete(status):
+        return all(item["status"] in (DONE, FAILED) for item in status.values())
+
+    def stats(self):
+        counts = dict(get_connection().execute(
+            "SELECT status, COUNT(*) FROM artifact_jobs GROUP BY status"
+        ).fetchall())
+        return dict(
+            self.counters,
+            workers=self.num_workers,
+            lease_seconds=self.lease_seconds,
+            **{f"jobs_{s}": counts.get(s, 0) for s in (PENDING, RUNNING, DONE, FAILED)}
+        )
@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+# ---------- CONFIG ----------
+MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", 32))
+MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", 5))
+STATS_WINDOW = 1000
+
+
+# =====================================================
+# ⚡ MICRO-BATCHING SCHEDULER
+# =====================================================
+# Concurrent callers submit single (H, W, C) tensors. A background thread
+# groups whatever is queued (up to MAX_BATCH_SIZE, waiting at most
+# MAX_WAIT_MS for more) into one forward pass and resolves each caller's
+# future with its own row of the output.
+class MicroBatcher:
+    def __init__(self, predict_fn, max_batch_size=MAX_BATCH_SIZE,
+                 max_wait_ms=MAX_WAIT_MS, name="inference"):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._last_batch_size = 1
+
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._requests = 0
+        self._errors = 0
+        self._batch_sizes = deque(maxlen=STATS_WINDOW)
+        self._queue_waits = deque(maxlen=STATS_WINDOW)
+
+    # ---------- PUBLIC API ----------
+    def submit(self, tensor):
+        future = Future()
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name=f"{self.name}-batcher", daemon=True
+                )
+                self._thread.start()
+            self._queue.append((np.asarray(tensor), future, time.perf_counter()))
+            self._cond.notify()
+        return future
+
+    def predict(self, tensor, timeout=None):
+        return self.submit(tensor).result(timeout)
+
+    def stats(self):
+        with self._stats_lock:
+            sizes = list(self._batch_sizes)
+            waits = sorted(self._queue_waits)
+
+        def percentile(values, q):
+            if not values:
+                return 0.0
+            return values[min(len(values) - 1, int(q * len(values)))]
+
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self._batches,
+            "requests": self._requests,
+            "errors": self._errors,
+            "queue_depth": len(self._queue),
+            "batch_size_avg": round(sum(sizes) / len(sizes), 2) if sizes else 0.0,
+            "batch_size_max": max(sizes) if sizes else 0,
+            "queue_wait_ms_avg": round(sum(waits) / len(waits) * 1000, 3) if waits else 0.0,
+            "queue_wait_ms_p95": round(percentile(waits, 0.95) * 1000, 3),
+            "queue_wait_ms_max": round(waits[-1] * 1000, 3) if waits else 0.0
+        }
+
+    # ---------- WORKER LOOP ----------
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+
+            # Light traffic: the previous batch was a single request, so
+            # don't hold this one back waiting for company.
+            if self._last_batch_size > 1 and self.max_wait > 0:
+                deadline = self._queue[0][2] + self.max_wait
+                while len(self._queue) < self.max_batch_size:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+            count = min(len(self._queue), self.max_batch_size)
+            batch = [self._queue.popleft() for _ in range(count)]
+
+            # Anything still queued means callers are arriving concurrently.
+            self._last_batch_size = count + len(self._queue)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            started = time.perf_counter()
+
+            with self._stats_lock:
+                self._batches += 1
+                self._requests += len(batch)
+                self._batch_sizes.append(len(batch))
+                self._queue_waits.extend(started - item[2] for item in batch)
+
+            try:
+                outputs = self.predict_fn(np.stack([item[0] for item in batch]))
+                for (_, future, _), output in zip(batch, outputs):
+                    future.set_result(output)
+            except Exception as e:
+                with self._stats_lock:
+                    self._errors += 1
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
@@ -0,0 +1,158 @@
+import hashlib
+import os
+import re
+import threading
+import uuid
+
+from storage import get_connection, transaction
+
+# ---------- CONFIG ----------
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 256 * 1024))
+UPLOAD_MAX_SIZE = int(os.getenv("UPLOAD_MAX_SIZE", 50 * 1024 * 1024))
+
+SESSION_COLUMNS = (
+    "upload_id", "sha256", "filename", "size", "report_id", "path", "completed_at"
+)
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+# =====================================================
+# ⏫ RESUMABLE CHUNKED UPLOADS
+# =====================================================
+# Sessions live in the upload_sessions table and the bytes received so far
+# in <directory>/partial/<upload_id>.part, whose size is the resume offset.
+# A session is keyed by the file's sha256: creating one again for the same
+# content returns the session in progress (or the finished file), so a
+# client that lost its upload id still resumes where it stopped.
+#
+#   finalize: fn(session, part_path) -> final path of the verified file
+class ChunkedUploads:
+    def __init__(self, directory, finalize, chunk_size=UPLOAD_CHUNK_SIZE,
+                 max_size=UPLOAD_MAX_SIZE):
+        self.partial_dir = os.path.join(directory, "partial")
+        self.finalize = finalize
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        os.makedirs(self.partial_dir, exist_ok=True)
+
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self.counters = {"created": 0, "resumed": 0, "chunks": 0, "completed": 0,
+                         "rejected": 0}
+
+    def _part_path(self, upload_id):
+        return os.path.join(self.partial_dir, f"{upload_id}.part")
+
+    # Held only while a session is in progress; finished or unknown uploads
+    # give theirs back so the table does not grow with every upload
+    def _lock(self, upload_id):
+        with self._locks_guard:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    def _release_lock(self, upload_id):
+        with self._locks_guard:
+            self._locks.pop(upload_id, None)
+
+    def _session(self, where, value):
+        row = get_connection().execute(
+            f"SELECT {', '.join(SESSION_COLUMNS)} FROM upload_sessions WHERE {where} = ?",
+            (value,)
+        ).fetchone()
+        return dict(zip(SESSION_COLUMNS, row)) if row else None
+
+    def _status(self, session):
+        complete = session["completed_at"] is not None
+        part = self._part_path(session["upload_id"])
+        offset = session["size"] if complete else (
+            os.path.getsize(part) if os.path.exists(part) else 0
+        )
+        return {
+            "upload_id": session["upload_id"],
+            "offset": offset,
+            "size": session["size"],
+            "complete": complete,
+            "chunk_size": self.chunk_size
+        }
+
+    # ---------- SESSIONS ----------
+    def create(self, sha256, size, filename=None, report_id=None):
+        if not re.fullmatch(r"[0-9a-f]{64}", str(sha256)):
+            raise UploadError("sha256 must be a hex digest")
+        # bool is an int subclass; JSON true must not pass as size 1
+        if not isinstance(size, int) or isinstance(size, bool) or size <= 0:
+            raise UploadError("size must be a positive integer")
+        if size > self.max_size:
+            raise UploadError(f"File too large (max {self.max_size} bytes)", 413)
+
+        with transaction() as db:
+            created = db.execute(
+                "INSERT OR IGNORE INTO upload_sessions "
+                "(upload_id, sha256, filename, size, report_id) VALUES (?, ?, ?, ?, ?)",
+                (uuid.uuid4().hex, sha256, filename, size, report_id)
+            ).rowcount
+        session = self._session("sha256", sha256)
+        if session["size"] != size:
+            raise UploadError("size does not match the existing upload", 409)
+        self.counters["created" if created else "resumed"] += 1
+        return self._status(session)
+
+    def status(self, upload_id):
+        session = self._session("upload_id", upload_id)
+        return self._status(session) if session else None
+
+    # ---------- CHUNKS ----------
+    def write(self, upload_id, offset, data):
+        with self._lock(upload_id):
+            session = self._session("upload_id", upload_id)
+            if session is None:
+                self._release_lock(upload_id)
+                raise UploadError("Upload not found", 404)
+
+            status = self._status(session)
+            if status["complete"] or offset != status["offset"]:
+                # Client is out of step (e.g. a lost response); tell it where to go on
+                raise UploadError("Offset mismatch", 409, offset=status["offset"])
+            if len(data) > self.chunk_size:
+                raise UploadError(f"Chunk too large (max {self.chunk_size} bytes)", 413)
+            if offset + len(data) > session["size"]:
+                raise UploadError("Chunk runs past the declared size", 400)
+
+            part = self._part_path(upload_id)
+            with open(part, "ab") as f:
+                f.write(data)
+            self.counters["chunks"] += 1
+
+            if offset + len(data) == session["size"]:
+                self._complete(session, part)
+            return self.status(upload_id)
+
+    def _complete(self, session, part):
+        digest = hashlib.sha256()
+        with open(part, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+
+        if digest.hexdigest() != session["sha256"]:
+            os.remove(part)
+            self.counters["rejected"] += 1
+            raise UploadError("Checksum mismatch; upload restarted", 422, offset=0)
+
+        path = self.finalize(session, part)
+        with transaction() as db:
+            db.execute(
+                "UPDATE upload_sessions SET path = ?, completed_at = CURRENT_TIMESTAMP "
+                "WHERE upload_id = ?",
+                (path, session["upload_id"])
+            )
+        self._release_lock(session["upload_id"])
+        self.counters["completed"] += 1
+
+    def stats(self):
+        return dict(self.counters, chunk_size=self.chunk_size, max_size=self.max_size,
+                    active_locks=len(self._locks))
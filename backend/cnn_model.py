@@ -3,9 +3,12 @@ import numpy as np
 import json
 import os
 import cv2
+import hashlib
 
 from image_preprocessing import preprocess_image
-from gradcam_utils import generate_gradcam
+from gradcam_utils import GradCamEngine, render_overlay, save_heatmap
+from batch_inference import MicroBatcher
+from inference_pool import InferencePool
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MODEL_PATH = os.path.join(BASE_DIR, "model", "crop_disease_cnn.h5")
@@ -17,42 +20,122 @@ with open(LABELS_PATH) as f:
 CLASS_LABELS = [LABELS[str(i)] for i in range(len(LABELS))]
 
 model = tf.keras.models.load_model(MODEL_PATH)
+# (height, width) of the model input; clients size uploads from it
+MODEL_INPUT_SIZE = tuple(int(d) for d in model.input_shape[1:3])
 
 
-def extract_image_features(image_path):
-    img = preprocess_image(image_path)
-    preds = model.predict(img)
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
 
+
+# Part of every result-cache key, so a retrained model never serves stale hits
+MODEL_VERSION = os.getenv("MODEL_VERSION") or file_digest(MODEL_PATH)
+
+
+# ---------- BATCHED FORWARD PASS ----------
+def predict_batch(batch):
+    return np.asarray(model.predict_on_batch(np.asarray(batch, dtype=np.float32)))
+
+
+inference_batcher = MicroBatcher(predict_batch)
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", 128))
+
+# "batch": in-process micro-batching; "pool": multi-process worker pool
+INFERENCE_MODE = os.getenv("INFERENCE_MODE", "batch")
+
+
+def features_from_predictions(preds):
     idx = int(np.argmax(preds))
     confidence = float(np.max(preds)) * 100
 
     return {
         "disease": CLASS_LABELS[idx],
+        "class_id": idx,
         "confidence": f"{confidence:.2f}%",
         "source": "cnn"
     }
 
 
-def generate_explainability(image_path):
-    img = cv2.imread(image_path)
-    img = cv2.resize(img, (28, 28))
-    img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    input_img = np.expand_dims(img_rgb / 255.0, axis=0)
+# Accepts an image path or an already prepared (1, H, W, 3) input tensor.
+def extract_image_features(image):
+    if isinstance(image, str):
+        image = preprocess_image(image)
+    if inference_pool:
+        preds = inference_pool.predict(np.asarray(image)[0])
+    else:
+        preds = inference_batcher.predict(np.asarray(image)[0])
+    return features_from_predictions(preds)
 
-    last_conv = next(
-        layer.name for layer in reversed(model.layers)
-        if "conv" in layer.name.lower()
-    )
 
-    heatmap = generate_gradcam(model, input_img, last_conv)
-    heatmap = cv2.resize(heatmap, (img.shape[1], img.shape[0]))
-    heatmap = np.uint8(255 * heatmap)
+def extract_batch_features(batch, chunk_size=BATCH_CHUNK_SIZE):
+    if inference_pool:
+        futures = [inference_pool.submit(row) for row in batch]
+        return [features_from_predictions(f.result()) for f in futures]
+
+    features = []
+    for start in range(0, len(batch), chunk_size):
+        preds = predict_batch(batch[start:start + chunk_size])
+        features.extend(features_from_predictions(p) for p in preds)
+    return features
+
 
-    overlay = cv2.addWeighted(
-        cv2.applyColorMap(heatmap, cv2.COLORMAP_JET),
-        0.5, img, 0.5, 0
+# ---------- FUSED PREDICT + GRAD-CAM ----------
+# "overlay" writes a JPEG overlay per request; "heatmap" keeps only the raw
+# low-res heatmap (uint8) plus the model-sized thumbnail, rendered on demand.
+GRADCAM_STORE = os.getenv("GRADCAM_STORE", "overlay")
+
+explain_engine = GradCamEngine(model)
+explain_batcher = MicroBatcher(
+    lambda batch: list(zip(*explain_engine.explain_batch(batch))),
+    name="explain"
+)
+
+inference_pool = None
+if INFERENCE_MODE == "pool":
+    # Workers are spawned lazily on the first request
+    inference_pool = InferencePool(
+        MODEL_PATH,
+        input_shape=model.input_shape[1:],
+        num_classes=len(CLASS_LABELS),
+        heatmap_shape=explain_engine.grad_model.outputs[0].shape[1:3]
     )
 
-    out_path = image_path.replace(".jpg", "_gradcam.jpg")
-    cv2.imwrite(out_path, overlay)
+
+def predict_and_explain(image):
+    if inference_pool:
+        preds, heatmap = inference_pool.predict(image.tensor[0], explain=True)
+    else:
+        preds, heatmap = explain_batcher.predict(image.tensor[0])
+    return features_from_predictions(preds), heatmap
+
+
+def explain_batch_features(batch, chunk_size=BATCH_CHUNK_SIZE):
+    if inference_pool:
+        futures = [inference_pool.submit(row, explain=True) for row in batch]
+        results = [f.result() for f in futures]
+        return (
+            [features_from_predictions(preds) for preds, _ in results],
+            [heatmap for _, heatmap in results]
+        )
+
+    features, heatmaps = [], []
+    for start in range(0, len(batch), chunk_size):
+        preds, maps = explain_engine.explain_batch(batch[start:start + chunk_size])
+        features.extend(features_from_predictions(p) for p in preds)
+        heatmaps.extend(maps)
+    return features, heatmaps
+
+
+def save_explainability(image, heatmap, out_path, store=GRADCAM_STORE):
+    if store == "heatmap":
+        return save_heatmap(
+            os.path.splitext(out_path)[0] + ".npz", heatmap, image.bgr
+        )
+
+    cv2.imwrite(out_path, render_overlay(heatmap, image.bgr))
     return out_path
+
@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+import traceback
+
+import requests
+
+# ---------- CONFIG ----------
+CONNECTIVITY_INTERVAL = float(os.getenv("CONNECTIVITY_INTERVAL", 15))
+CONNECTIVITY_MAX_BACKOFF = float(os.getenv("CONNECTIVITY_MAX_BACKOFF", 120))
+CONNECTIVITY_CONFIRM_INTERVAL = float(os.getenv("CONNECTIVITY_CONFIRM_INTERVAL", 2))
+CONNECTIVITY_TIMEOUT = float(os.getenv("CONNECTIVITY_TIMEOUT", 3))
+# Consecutive probes needed before the published state flips
+CONNECTIVITY_UP_AFTER = int(os.getenv("CONNECTIVITY_UP_AFTER", 2))
+CONNECTIVITY_DOWN_AFTER = int(os.getenv("CONNECTIVITY_DOWN_AFTER", 2))
+
+
+# =====================================================
+# 📶 CONNECTIVITY MONITOR
+# =====================================================
+# Probes the backend health endpoint from a daemon thread and publishes a
+# cached online/offline state. Callers read .online without any I/O.
+#   - hysteresis: the state flips only after UP_AFTER / DOWN_AFTER
+#     consecutive probes disagree with it
+#   - backoff: while offline, the probe interval doubles up to MAX_BACKOFF
+#   - on_online callbacks run in the monitor thread on every offline ->
+#     online transition (e.g. to sync the offline journal)
+class ConnectivityMonitor:
+    def __init__(self, url, interval=CONNECTIVITY_INTERVAL,
+                 max_backoff=CONNECTIVITY_MAX_BACKOFF,
+                 confirm_interval=CONNECTIVITY_CONFIRM_INTERVAL,
+                 timeout=CONNECTIVITY_TIMEOUT, up_after=CONNECTIVITY_UP_AFTER,
+                 down_after=CONNECTIVITY_DOWN_AFTER, on_online=None, name="connectivity"):
+        self.url = url
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.confirm_interval = confirm_interval
+        self.timeout = timeout
+        self.up_after = max(1, up_after)
+        self.down_after = max(1, down_after)
+        self.name = name
+        self.callbacks = [on_online] if on_online else []
+
+        self.session = requests.Session()
+        self._state = None
+        self._streak = 0
+        self._backoff = interval
+        self._ready = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.counters = {"probes": 0, "failures": 0, "transitions": 0}
+        self.last_change = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name=self.name, daemon=True
+                )
+                self._thread.start()
+        return self
+
+    # ---------- STATE ----------
+    @property
+    def online(self):
+        return self.is_online()
+
+    # Before the first probe finishes, waits at most `wait` seconds for it
+    def is_online(self, wait=None):
+        if self._state is None:
+            self._ready.wait(self.timeout if wait is None else wait)
+        return bool(self._state)
+
+    # A real request failing is as good as a failed probe; re-check soon
+    def report_failure(self):
+        self._observe(False)
+        self._wake.set()
+
+    def check_now(self):
+        self._wake.set()
+
+    # ---------- PROBING ----------
+    def probe(self):
+        self.counters["probes"] += 1
+        try:
+            response = self.session.get(self.url, timeout=self.timeout)
+            ok = response.status_code < 500
+        except requests.RequestException:
+            ok = False
+        if not ok:
+            self.counters["failures"] += 1
+        return ok
+
+    def _observe(self, ok):
+        with self._lock:
+            if ok == self._state:
+                self._streak = 0
+                return False
+
+            if self._state is not None:
+                self._streak += 1
+                if self._streak < (self.up_after if ok else self.down_after):
+                    return False
+                self.counters["transitions"] += 1
+
+            # The first answer is published as-is
+            self._state, self._streak = ok, 0
+            self.last_change = time.time()
+            self._ready.set()
+            return ok
+
+    def _next_delay(self):
+        if self._streak:
+            return self.confirm_interval
+        if self._state:
+            self._backoff = self.interval
+            return self.interval
+        delay = self._backoff
+        self._backoff = min(self._backoff * 2, self.max_backoff)
+        return delay
+
+    def _run(self):
+        while True:
+            if self._observe(self.probe()):
+                self._backoff = self.interval
+                for callback in self.callbacks:
+                    try:
+                        callback()
+                    except Exception:
+                        traceback.print_exc()
+
+            self._wake.wait(self._next_delay())
+            self._wake.clear()
+
+    def stats(self):
+        return dict(
+            self.counters,
+            online=self._state,
+            url=self.url,
+            last_change=self.last_change
+        )
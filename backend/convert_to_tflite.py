@@ -1,16 +1,242 @@
+import argparse
+import json
+import os
+import shutil
+import time
+
+import cv2
+import numpy as np
 import tensorflow as tf
 
+from edge_inference import dequantize_output, quantize_input
+
 MODEL_PATH = "model/crop_disease_cnn.h5"
 TFLITE_PATH = "model/crop_disease_cnn.tflite"
+LABELS_PATH = "model/class_labels.json"
+VAL_DIR = "datasets/valid"
+REPORT_PATH = "model/quantization_report.json"
+
+IMG_SIZE = (28, 28)
+VARIANTS = ("int8", "float16", "dynamic")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+# ---------------- VALIDATION DATA ----------------
+def load_validation_set(data_dir, labels, limit_per_class=None):
+    label_to_index = {label: int(i) for i, label in labels.items()}
+    images, targets = [], []
+
+    for label in sorted(os.listdir(data_dir)):
+        class_dir = os.path.join(data_dir, label)
+        if label not in label_to_index or not os.path.isdir(class_dir):
+            continue
+
+        files = sorted(
+            f for f in os.listdir(class_dir)
+            if f.lower().endswith(IMAGE_EXTENSIONS)
+        )[:limit_per_class]
+
+        for name in files:
+            img = cv2.imread(os.path.join(class_dir, name))
+            if img is None:
+                continue
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+            images.append(cv2.resize(img, IMG_SIZE))
+            targets.append(label_to_index[label])
+
+    return np.asarray(images, dtype=np.float32) / 255.0, np.asarray(targets)
+
+
+def representative_dataset(images, samples):
+    rng = np.random.default_rng(0)
+    picks = rng.choice(len(images), size=min(samples, len(images)), replace=False)
+
+    def generator():
+        for i in picks:
+            yield [images[i:i + 1]]
+
+    return generator
+
+
+# ---------------- CONVERSION ----------------
+def convert(model, variant, rep_data=None):
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if variant == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    elif variant == "int8":
+        converter.representative_dataset = rep_data
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+
+    return converter.convert()
+
+
+# ---------------- TFLITE RUNNER ----------------
+class TFLiteRunner:
+    def __init__(self, model_content, num_threads=None):
+        self.interpreter = tf.lite.Interpreter(
+            model_content=model_content, num_threads=num_threads
+        )
+        self.interpreter.allocate_tensors()
+        self.batch_size = 1
+
+    def _resize(self, batch_size):
+        if batch_size != self.batch_size:
+            index = self.interpreter.get_input_details()[0]["index"]
+            self.interpreter.resize_tensor_input(index, [batch_size, *IMG_SIZE, 3])
+            self.interpreter.allocate_tensors()
+            self.batch_size = batch_size
+
+    def predict(self, batch):
+        self._resize(len(batch))
+        inp = self.interpreter.get_input_details()[0]
+        out = self.interpreter.get_output_details()[0]
+
+        # Same input/output conversion as the deployed EdgeModel
+        self.interpreter.set_tensor(inp["index"], quantize_input(batch, inp))
+        self.interpreter.invoke()
+        return dequantize_output(self.interpreter.get_tensor(out["index"]), out)
+
+
+# ---------------- EVALUATION ----------------
+def per_class_accuracy(preds, targets, num_classes):
+    correct = preds == targets
+    return {
+        c: float(correct[targets == c].mean())
+        for c in range(num_classes) if (targets == c).any()
+    }
+
+
+def time_call(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "median_ms": round(float(np.median(timings)), 3),
+        "p95_ms": round(float(np.percentile(timings, 95)), 3)
+    }
+
+
+def evaluate(runner, images, targets, reference, labels, batch_size, latency_samples):
+    preds = np.concatenate([
+        runner.predict(images[i:i + batch_size]).argmax(axis=1)
+        for i in range(0, len(images), batch_size)
+    ])
+
+    ref_classes = per_class_accuracy(reference, targets, len(labels))
+    var_classes = per_class_accuracy(preds, targets, len(labels))
+
+    single = images[:1]
+    batch = images[:batch_size]
+    return {
+        "top1_accuracy": round(float((preds == targets).mean()), 4),
+        "top1_agreement_with_h5": round(float((preds == reference).mean()), 4),
+        "per_class_accuracy_delta": {
+            labels[str(c)]: round(var_classes[c] - ref_classes[c], 4)
+            for c in var_classes
+        },
+        "latency_single": time_call(lambda: runner.predict(single), latency_samples),
+        "latency_batch": dict(
+            time_call(lambda: runner.predict(batch), max(1, latency_samples // 10)),
+            batch_size=len(batch)
+        )
+    }
+
+
+def print_report(report):
+    print(f"\n{'variant':<10}{'size KB':>10}{'acc':>8}{'agree':>8}"
+          f"{'1-img ms':>10}{'batch ms':>10}")
+    for name, row in report["variants"].items():
+        print(f"{name:<10}{row['size_bytes'] / 1024:>10.1f}"
+              f"{row.get('top1_accuracy', float('nan')):>8.3f}"
+              f"{row.get('top1_agreement_with_h5', float('nan')):>8.3f}"
+              f"{row['latency_single']['median_ms']:>10.2f}"
+              f"{row['latency_batch']['median_ms']:>10.2f}")
+
+        worst = sorted(row.get("per_class_accuracy_delta", {}).items(),
+                       key=lambda kv: kv[1])[:3]
+        for label, delta in worst:
+            if delta < 0:
+                print(f"{'':<10}  {label}: {delta:+.3f}")
+
+
+# ---------------- MAIN ----------------
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert the CNN to TFLite variants and compare them"
+    )
+    parser.add_argument("--variants", default=",".join(VARIANTS),
+                        help="Comma-separated subset of int8,float16,dynamic")
+    parser.add_argument("--val-dir", default=VAL_DIR)
+    parser.add_argument("--limit-per-class", type=int, default=None)
+    parser.add_argument("--representative-samples", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--latency-samples", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--ship", choices=VARIANTS, default=None,
+                        help=f"Copy this variant to {TFLITE_PATH}")
+    args = parser.parse_args()
+
+    variants = [v.strip() for v in args.variants.split(",") if v.strip()]
+    unknown = set(variants) - set(VARIANTS)
+    if unknown:
+        parser.error(f"Unknown variants: {', '.join(sorted(unknown))}")
+
+    with open(LABELS_PATH) as f:
+        labels = json.load(f)
+
+    model = tf.keras.models.load_model(MODEL_PATH)
+    images, targets = load_validation_set(args.val_dir, labels, args.limit_per_class)
+    if not len(images):
+        raise SystemExit(f"No validation images found in {args.val_dir}")
+    print(f"✅ Loaded {len(images)} validation images")
+
+    reference = np.concatenate([
+        model.predict_on_batch(images[i:i + args.batch_size]).argmax(axis=1)
+        for i in range(0, len(images), args.batch_size)
+    ])
+
+    report = {
+        "validation_images": int(len(images)),
+        "h5_top1_accuracy": round(float((reference == targets).mean()), 4),
+        "h5_size_bytes": os.path.getsize(MODEL_PATH),
+        "variants": {}
+    }
+
+    for variant in variants:
+        rep_data = representative_dataset(images, args.representative_samples)
+        content = convert(model, variant, rep_data)
+
+        path = TFLITE_PATH.replace(".tflite", f"_{variant}.tflite")
+        with open(path, "wb") as f:
+            f.write(content)
+
+        runner = TFLiteRunner(content, num_threads=args.threads)
+        report["variants"][variant] = dict(
+            path=path,
+            size_bytes=len(content),
+            **evaluate(runner, images, targets, reference, labels,
+                       args.batch_size, args.latency_samples)
+        )
+        print(f"✅ {variant} model saved: {path}")
 
-model = tf.keras.models.load_model(MODEL_PATH)
+    print_report(report)
 
-converter = tf.lite.TFLiteConverter.from_keras_model(model)
-converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    with open(REPORT_PATH, "w") as f:
+        json.dump(report, f, indent=2)
+    print("✅ Report saved:", REPORT_PATH)
 
-tflite_model = converter.convert()
+    if args.ship:
+        if args.ship not in report["variants"]:
+            raise SystemExit(f"--ship {args.ship} was not converted")
+        shutil.copyfile(report["variants"][args.ship]["path"], TFLITE_PATH)
+        print("✅ TFLite model saved:", TFLITE_PATH)
 
-with open(TFLITE_PATH, "wb") as f:
-    f.write(tflite_model)
 
-print("✅ TFLite model saved:", TFLITE_PATH)
+if __name__ == "__main__":
+    main()
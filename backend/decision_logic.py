@@ -1,9 +1,9 @@
-def assess_severity(humidity, temperature):
-    if humidity > 75 and temperature > 30:
-        return "High"
-    elif humidity > 60:
-        return "Medium"
-    return "Low"
+from risk_engine import assess_risk
+
+
+# One reading; thresholds come from the per-crop table in risk_rules.json
+def assess_severity(humidity, temperature, crop=None):
+    return str(assess_risk(humidity, temperature, crop)["severity"])
 
 
 def pesticide_optimization(severity):
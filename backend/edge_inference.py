@@ -1,41 +1,109 @@
-import tensorflow as tf
-import numpy as np
-import cv2
 import json
+import os
+import threading
 
-MODEL_PATH = "model/crop_disease_cnn.tflite"
-LABELS_PATH = "model/class_labels.json"
+import numpy as np
 
-with open(LABELS_PATH) as f:
-    LABELS = json.load(f)
+from image_preprocessing import prepare_image, prepare_image_file
 
-CLASS_LABELS = [LABELS[str(i)] for i in range(len(LABELS))]
+# tflite_runtime is enough on edge devices; full TensorFlow also works
+try:
+    from tflite_runtime.interpreter import Interpreter
+except ImportError:
+    import tensorflow as tf
+    Interpreter = tf.lite.Interpreter
 
-interpreter = tf.lite.Interpreter(model_path=MODEL_PATH)
-interpreter.allocate_tensors()
+# Resolved from this file so the Streamlit client can load them too
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(BASE_DIR, "model", "crop_disease_cnn.tflite")
+LABELS_PATH = os.path.join(BASE_DIR, "model", "class_labels.json")
+EDGE_NUM_THREADS = int(os.getenv("EDGE_NUM_THREADS", min(4, os.cpu_count() or 1)))
 
-input_details = interpreter.get_input_details()
-output_details = interpreter.get_output_details()
+# Full-integer (INT8) models take quantized input and return quantized scores
+def quantize_input(input_data, details):
+    if details["dtype"] not in (np.int8, np.uint8):
+        return input_data.astype(details["dtype"])
 
-def preprocess(image_path):
-    img = cv2.imread(image_path)
-    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    img = cv2.resize(img, (28, 28))
-    img = img / 255.0
-    return np.expand_dims(img, axis=0).astype(np.float32)
+    scale, zero_point = details["quantization"]
+    info = np.iinfo(details["dtype"])
+    quantized = np.round(input_data / scale + zero_point)
+    return np.clip(quantized, info.min, info.max).astype(details["dtype"])
 
-def run_offline_inference(image_path):
-    input_data = preprocess(image_path)
 
-    interpreter.set_tensor(input_details[0]['index'], input_data)
-    interpreter.invoke()
+def dequantize_output(preds, details):
+    if details["dtype"] not in (np.int8, np.uint8):
+        return preds
+
+    scale, zero_point = details["quantization"]
+    return (preds.astype(np.float32) - zero_point) * scale
+
+
+# =====================================================
+# 📱 EDGE MODEL
+# =====================================================
+# One interpreter per process; invoke() is not thread-safe, so concurrent
+# callers (Streamlit sessions run in threads) take turns.
+class EdgeModel:
+    def __init__(self, model_path=MODEL_PATH, labels_path=LABELS_PATH,
+                 num_threads=EDGE_NUM_THREADS):
+        with open(labels_path) as f:
+            labels = json.load(f)
+        self.class_labels = [labels[str(i)] for i in range(len(labels))]
+
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self.input_details = self.interpreter.get_input_details()[0]
+        self.output_details = self.interpreter.get_output_details()[0]
+
+        height, width = self.input_details["shape"][1:3]
+        self.target_size = (int(width), int(height))
+        self._lock = threading.Lock()
+
+    def predict(self, tensor):
+        input_data = quantize_input(tensor, self.input_details)
+        with self._lock:
+            self.interpreter.set_tensor(self.input_details["index"], input_data)
+            self.interpreter.invoke()
+            preds = self.interpreter.get_tensor(self.output_details["index"])[0]
+        preds = dequantize_output(preds, self.output_details)
+
+        idx = int(np.argmax(preds))
+        confidence = float(preds[idx]) * 100
+        return {
+            "disease": self.class_labels[idx],
+            "class_id": idx,
+            "confidence": f"{confidence:.2f}%",
+            "source": "TFLITE_EDGE"
+        }
+
+    # Decoded straight from the uploaded buffer, no temp file
+    def predict_bytes(self, data):
+        return self.predict(prepare_image(data, self.target_size).tensor)
+
+    def predict_file(self, image_path):
+        return self.predict(prepare_image_file(image_path, self.target_size).tensor)
+
+
+_default_model = None
+_default_lock = threading.Lock()
+
+
+def get_edge_model():
+    global _default_model
+    with _default_lock:
+        if _default_model is None:
+            _default_model = EdgeModel()
+        return _default_model
+
+
+# Public helpers keep crop_disease_label, the key /sync-offline reads
+def with_sync_label(features):
+    return dict(features, crop_disease_label=features["disease"])
+
+
+def run_offline_inference(image_path):
+    return with_sync_label(get_edge_model().predict_file(image_path))
 
-    preds = interpreter.get_tensor(output_details[0]['index'])[0]
-    idx = int(np.argmax(preds))
-    confidence = float(preds[idx]) * 100
 
-    return {
-        "crop_disease_label": CLASS_LABELS[idx],
-        "confidence": f"{confidence:.2f}%",
-        "source": "TFLITE_EDGE"
-    }
+def run_offline_inference_bytes(data):
+    return with_sync_label(get_edge_model().predict_bytes(data))
@@ -0,0 +1,179 @@
+import argparse
+import hashlib
+import json
+import sys
+
+from report_queries import parse_day
+
+FEEDBACK_TYPES = ("correct", "incorrect", "query", "outcome")
+
+FEEDBACK_INSERT_SQL = """
+INSERT OR IGNORE INTO feedback
+(report_id, type, crop, disease, confidence, correct, outcome,
+ yield_change, days_after_treatment, comment, payload, import_key)
+VALUES (?,?,?,?,?,?,?,?,?,?,?,?)
+"""
+
+# Feedback joined with the report it refers to, one row per feedback item
+EXPORT_COLUMNS = (
+    "f.id", "f.report_id", "f.type", "f.crop", "f.disease", "f.confidence",
+    "f.correct", "f.outcome", "f.yield_change", "f.days_after_treatment",
+    "f.comment", "f.created_at", "r.severity", "r.confidence",
+    "r.explainability_image", "r.offline_mode", "r.created_at"
+)
+EXPORT_KEYS = (
+    "id", "report_id", "type", "crop", "disease", "confidence",
+    "correct", "outcome", "yield_change", "days_after_treatment",
+    "comment", "created_at", "report_severity", "report_confidence",
+    "explainability_image", "offline_mode", "report_created_at"
+)
+KNOWN_FIELDS = {
+    "report_id", "type", "crop", "disease", "confidence", "correct",
+    "outcome", "yield_change", "days_after_treatment", "comment"
+}
+
+
+# ---------- ROW CONVERSION ----------
+def feedback_type(data):
+    if data.get("type") in FEEDBACK_TYPES:
+        return data["type"]
+    if data.get("outcome"):
+        return "outcome"
+    if data.get("correct") is True:
+        return "correct"
+    if data.get("correct") is False:
+        return "incorrect"
+    return "query"
+
+
+def _number(value, cast=float):
+    # Confidences arrive as 87.5 or "87.5%"
+    try:
+        return cast(str(value).rstrip("%")) if value is not None else None
+    except ValueError:
+        return None
+
+
+def feedback_row(data, import_key=None):
+    correct = data.get("correct")
+    extra = {k: v for k, v in data.items() if k not in KNOWN_FIELDS}
+    return (
+        data.get("report_id") or None,
+        feedback_type(data),
+        data.get("crop"),
+        data.get("disease"),
+        _number(data.get("confidence")),
+        None if correct is None else int(bool(correct)),
+        data.get("outcome"),
+        data.get("yield_change"),
+        _number(data.get("days_after_treatment"), int),
+        data.get("comment"),
+        json.dumps(extra) if extra else None,
+        import_key
+    )
+
+
+# =====================================================
+# 📥 ONE-TIME IMPORT OF feedback_data.json
+# =====================================================
+# The old endpoint rewrote the file in place, so a shorter rewrite could
+# leave trailing bytes after the array; only the leading array is read.
+def load_legacy_json(path):
+    with open(path, encoding="utf-8") as f:
+        text = f.read().strip()
+    if not text:
+        return []
+    items, _ = json.JSONDecoder().raw_decode(text)
+    return [item for item in items if isinstance(item, dict)]
+
+
+def import_legacy_json(conn, path):
+    rows = []
+    for position, item in enumerate(load_legacy_json(path)):
+        digest = hashlib.sha1(
+            json.dumps(item, sort_keys=True).encode()
+        ).hexdigest()
+        item = dict(item)
+        # Legacy items referenced no report; a stale id would break the FK
+        item.pop("report_id", None)
+        rows.append(feedback_row(item, import_key=f"legacy:{position}:{digest}"))
+
+    with conn:
+        before = conn.total_changes
+        conn.executemany(FEEDBACK_INSERT_SQL, rows)
+        return conn.total_changes - before
+
+
+# =====================================================
+# 📤 BULK EXPORT FOR RETRAINING
+# =====================================================
+def iter_feedback(conn, since=None, until=None, types=None):
+    clauses, params = [], []
+    since = parse_day(since, "since")
+    until = parse_day(until, "until")
+    if since:
+        clauses.append("f.created_at >= ?")
+        params.append(since)
+    if until:
+        clauses.append("f.created_at < date(?, '+1 day')")
+        params.append(until)
+    if types:
+        unknown = set(types) - set(FEEDBACK_TYPES)
+        if unknown:
+            raise ValueError(f"type must be a subset of {','.join(FEEDBACK_TYPES)}")
+        clauses.append(f"f.type IN ({', '.join('?' * len(types))})")
+        params.extend(types)
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    cursor = conn.execute(
+        f"SELECT {', '.join(EXPORT_COLUMNS)} FROM feedback f "
+        f"LEFT JOIN crop_reports r ON r.report_id = f.report_id "
+        f"{where} ORDER BY f.created_at, f.id",
+        params
+    )
+    for row in cursor:
+        item = dict(zip(EXPORT_KEYS, row))
+        for flag in ("correct", "offline_mode"):
+            if item[flag] is not None:
+                item[flag] = bool(item[flag])
+        yield item
+
+
+def main():
+    from storage import get_connection, migrate
+
+    parser = argparse.ArgumentParser(description="Import or export farmer feedback")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    imp = sub.add_parser("import", help="Load a legacy feedback_data.json file")
+    imp.add_argument("path", nargs="?", default="feedback/feedback_data.json")
+
+    exp = sub.add_parser("export", help="Write feedback as JSON lines")
+    exp.add_argument("--out", default="-", help="Output file (default stdout)")
+    exp.add_argument("--since", help="YYYY-MM-DD")
+    exp.add_argument("--until", help="YYYY-MM-DD")
+    exp.add_argument("--types", help=f"Comma list of {','.join(FEEDBACK_TYPES)}")
+    args = parser.parse_args()
+
+    conn = get_connection()
+    migrate(conn)
+
+    if args.command == "import":
+        print(f"Imported {import_legacy_json(conn, args.path)} feedback items")
+        return
+
+    types = [t for t in (args.types or "").split(",") if t] or None
+    out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    count = 0
+    try:
+        for item in iter_feedback(conn, args.since, args.until, types):
+            out.write(json.dumps(item) + "\n")
+            count += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"Exported {count} feedback items", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
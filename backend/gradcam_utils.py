@@ -2,26 +2,102 @@ import tensorflow as tf
 import numpy as np
 import cv2
 
-def generate_gradcam(model, image_array, last_conv_layer_name):
-    grad_model = tf.keras.models.Model(
-        inputs=model.input,
-        outputs=[
-            model.get_layer(last_conv_layer_name).output,
-            model.output
-        ]
+
+def find_last_conv_layer(model):
+    return next(
+        layer.name for layer in reversed(model.layers)
+        if "conv" in layer.name.lower()
     )
 
-    with tf.GradientTape() as tape:
-        conv_output, predictions = grad_model(image_array)
-        class_index = tf.argmax(predictions[0])
-        loss = predictions[:, class_index]
 
-    grads = tape.gradient(loss, conv_output)
-    pooled_grads = tf.reduce_mean(grads, axis=(0, 1, 2))
+def build_grad_model(model, last_conv_layer_name):
+    if not isinstance(model, tf.keras.Sequential):
+        return tf.keras.models.Model(
+            inputs=model.inputs,
+            outputs=[
+                model.get_layer(last_conv_layer_name).output,
+                model.outputs[0]
+            ]
+        )
+
+    # Sequential models (e.g. restored from .h5) may not expose a symbolic
+    # graph connecting the conv layer to the output; rebuild it explicitly.
+    inputs = tf.keras.Input(shape=model.input_shape[1:])
+    x, conv_output = inputs, None
+    for layer in model.layers:
+        x = layer(x)
+        if layer.name == last_conv_layer_name:
+            conv_output = x
+    return tf.keras.models.Model(inputs=inputs, outputs=[conv_output, x])
+
+
+# =====================================================
+# 🔥 FUSED PREDICT + GRAD-CAM ENGINE
+# =====================================================
+# Built once per model. One traced forward/backward pass returns both the
+# class probabilities and a normalized low-res heatmap for every image in
+# the batch.
+class GradCamEngine:
+    def __init__(self, model, last_conv_layer_name=None):
+        self.last_conv = last_conv_layer_name or find_last_conv_layer(model)
+        self.grad_model = build_grad_model(model, self.last_conv)
+        self._fused = tf.function(
+            self._predict_and_explain,
+            input_signature=[
+                tf.TensorSpec([None, *model.input_shape[1:]], tf.float32)
+            ]
+        )
+
+    def _predict_and_explain(self, images):
+        with tf.GradientTape() as tape:
+            conv_output, predictions = self.grad_model(images, training=False)
+            class_index = tf.argmax(predictions, axis=1)
+            # Samples are independent, so the gradient of the summed top-class
+            # scores w.r.t. each sample's activations is its own Grad-CAM.
+            loss = tf.reduce_sum(
+                tf.gather(predictions, class_index, axis=1, batch_dims=1)
+            )
+
+        grads = tape.gradient(loss, conv_output)
+        pooled_grads = tf.reduce_mean(grads, axis=(1, 2))
+
+        heatmaps = tf.einsum("nhwc,nc->nhw", conv_output, pooled_grads)
+        heatmaps = tf.maximum(heatmaps, 0)
+        heatmaps = heatmaps / (
+            tf.reduce_max(heatmaps, axis=(1, 2), keepdims=True) + 1e-8
+        )
+        return predictions, heatmaps
+
+    def explain_batch(self, images):
+        predictions, heatmaps = self._fused(
+            tf.convert_to_tensor(images, dtype=tf.float32)
+        )
+        return predictions.numpy(), heatmaps.numpy()
+
 
-    conv_output = conv_output[0]
-    heatmap = conv_output @ pooled_grads[..., tf.newaxis]
-    heatmap = tf.squeeze(heatmap)
+# ---------- COMPACT STORAGE + ON-DEMAND RENDERING ----------
+def heatmap_to_uint8(heatmap):
+    return np.uint8(np.rint(255 * np.clip(heatmap, 0, 1)))
 
-    heatmap = tf.maximum(heatmap, 0) / tf.reduce_max(heatmap)
-    return heatmap.numpy()
+
+def save_heatmap(path, heatmap, image_bgr):
+    np.savez_compressed(
+        path, heatmap=heatmap_to_uint8(heatmap), image=np.uint8(image_bgr)
+    )
+    return path
+
+
+def load_heatmap(path):
+    with np.load(path) as data:
+        return data["heatmap"], data["image"]
+
+
+def render_overlay(heatmap, image_bgr):
+    if heatmap.dtype != np.uint8:
+        heatmap = heatmap_to_uint8(heatmap)
+
+    heatmap = cv2.resize(heatmap, (image_bgr.shape[1], image_bgr.shape[0]))
+    return cv2.addWeighted(
+        cv2.applyColorMap(heatmap, cv2.COLORMAP_JET),
+        0.5, image_bgr, 0.5, 0
+    )
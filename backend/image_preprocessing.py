@@ -1,6 +1,31 @@
+import os
+import struct
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
 import numpy as np
 
+DECODE_WORKERS = int(os.getenv("DECODE_WORKERS", os.cpu_count() or 4))
+
+# Decoded image shared by prediction and Grad-CAM: the resized BGR pixels
+# (for overlays) and the normalized (1, H, W, 3) RGB model input.
+PreparedImage = namedtuple("PreparedImage", ["bgr", "tensor"])
+
+# JPEG DCT scaling: decode at 1/8, 1/4 or 1/2 resolution when the image
+# stays at least this many times larger than the model input.
+REDUCED_DECODE_MARGIN = 2
+REDUCED_DECODE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2)
+)
+SOF_MARKERS = {
+    0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+    0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF
+}
+
+
 def preprocess_image(image_path, target_size=(28, 28)):
     img = cv2.imread(image_path)
     if img is None:
@@ -12,3 +37,102 @@ def preprocess_image(image_path, target_size=(28, 28)):
     img = np.expand_dims(img, axis=0)
 
     return img
+
+
+# ---------- JPEG HEADER ----------
+def jpeg_dimensions(data):
+    if data[:2] != b"\xff\xd8":
+        return None
+
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            pos += 1
+            continue
+
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            pos += 2
+            continue
+
+        (length,) = struct.unpack(">H", data[pos + 2:pos + 4])
+        if marker in SOF_MARKERS and pos + 9 <= len(data):
+            height, width = struct.unpack(">HH", data[pos + 5:pos + 9])
+            return width, height
+
+        pos += 2 + length
+
+    return None
+
+
+def decode_flag(data, target_size):
+    dims = jpeg_dimensions(data)
+    if not dims:
+        return cv2.IMREAD_COLOR
+
+    needed = max(target_size) * REDUCED_DECODE_MARGIN
+    for factor, flag in REDUCED_DECODE_FLAGS:
+        if min(dims) // factor >= needed:
+            return flag
+
+    return cv2.IMREAD_COLOR
+
+
+# ---------- IN-MEMORY DECODE ----------
+def decode_image_bytes(data, target_size=(28, 28)):
+    buf = np.frombuffer(data, np.uint8)
+    img = cv2.imdecode(buf, decode_flag(data, target_size))
+    if img is None:
+        raise ValueError("Image could not be read")
+
+    return cv2.resize(img, target_size, interpolation=cv2.INTER_AREA)
+
+
+def prepare_image(data, target_size=(28, 28)):
+    bgr = decode_image_bytes(data, target_size)
+    rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+    tensor = np.expand_dims(rgb.astype(np.float32) / 255.0, axis=0)
+    return PreparedImage(bgr, tensor)
+
+
+def prepare_image_file(image_path, target_size=(28, 28)):
+    with open(image_path, "rb") as f:
+        return prepare_image(f.read(), target_size)
+
+
+def prepared_from_tensor(tensor):
+    rgb = np.uint8(np.rint(np.clip(tensor, 0, 1) * 255))
+    return PreparedImage(
+        cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR), np.expand_dims(tensor, axis=0)
+    )
+
+
+def _decode_or_none(data, target_size):
+    try:
+        return decode_image_bytes(data, target_size)
+    except Exception:
+        return None
+
+
+# ---------- BATCH PREPROCESSING ----------
+# Decodes many encoded images in parallel (cv2 releases the GIL) and
+# normalizes the whole stack in one vectorized step. Returns the
+# (N, H, W, 3) float32 RGB batch plus the indices of the inputs that
+# decoded successfully.
+def preprocess_image_batch(blobs, target_size=(28, 28), workers=DECODE_WORKERS):
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        decoded = list(executor.map(
+            lambda data: _decode_or_none(data, target_size), blobs
+        ))
+
+    valid = [i for i, img in enumerate(decoded) if img is not None]
+    if not valid:
+        width, height = target_size
+        return np.empty((0, height, width, 3), dtype=np.float32), valid
+
+    stack = np.stack([decoded[i] for i in valid])
+    batch = stack[..., ::-1].astype(np.float32) / 255.0
+    return batch, valid
@@ -0,0 +1,121 @@
+import hashlib
+import io
+import os
+import time
+
+import requests
+from PIL import Image, ImageOps
+
+# ---------- CONFIG ----------
+# 0 uses the bound advertised by the server's /analyze/config
+UPLOAD_MAX_SIDE = int(os.getenv("UPLOAD_MAX_SIDE", 0))
+UPLOAD_RETRIES = int(os.getenv("UPLOAD_RETRIES", 3))
+UPLOAD_TIMEOUT = float(os.getenv("UPLOAD_TIMEOUT", 30))
+
+# Used when the server cannot be asked (older backend, flaky link)
+DEFAULT_UPLOAD_CONFIG = {
+    "model_input": [28, 28],
+    "gradcam_input": [28, 28],
+    "min_side": 28,
+    "max_side": 256,
+    "jpeg_quality": 85,
+    "retain_uploads": False,
+    "chunk_size": 256 * 1024,
+    "max_upload_size": 50 * 1024 * 1024
+}
+
+
+def fetch_upload_config(base_url, session=requests, timeout=5):
+    response = session.get(f"{base_url}/analyze/config", timeout=timeout)
+    response.raise_for_status()
+    return dict(DEFAULT_UPLOAD_CONFIG, **response.json())
+
+
+def target_side(config, max_side=UPLOAD_MAX_SIDE):
+    return max(config["min_side"], max_side or config["max_side"])
+
+
+# =====================================================
+# 🗜️ CLIENT-SIDE DOWNSCALE
+# =====================================================
+# Returns (bytes, content_type). Phone JPEGs are reduced in the DCT domain
+# (draft) before the final resize, EXIF rotation is applied, and the result
+# is re-encoded as JPEG. The original is returned when it is already
+# smaller than the re-encoded copy.
+def downscale_for_upload(data, max_side, quality=85):
+    try:
+        img = Image.open(io.BytesIO(data))
+        content_type = Image.MIME.get(img.format, "application/octet-stream")
+        img.draft("RGB", (max_side, max_side))
+        img = ImageOps.exif_transpose(img).convert("RGB")
+    except Exception:
+        # Let the server report unreadable images
+        return data, "application/octet-stream"
+
+    img.thumbnail((max_side, max_side), Image.LANCZOS)
+    out = io.BytesIO()
+    img.save(out, "JPEG", quality=quality, optimize=True)
+    encoded = out.getvalue()
+
+    if len(encoded) >= len(data):
+        return data, content_type
+    return encoded, "image/jpeg"
+
+
+# =====================================================
+# ⏫ RESUMABLE ORIGINAL UPLOAD
+# =====================================================
+# Sends the full-resolution original in server-sized chunks. The server keys
+# sessions by sha256, so calling this again for the same bytes (after a
+# dropped link or an app restart) continues from the last stored offset.
+#   progress: optional fn(fraction_done)
+def upload_original(base_url, data, filename=None, report_id=None,
+                    session=requests, progress=None, retries=UPLOAD_RETRIES):
+    response = session.post(f"{base_url}/uploads", json={
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "size": len(data),
+        "filename": filename,
+        "report_id": report_id
+    }, timeout=UPLOAD_TIMEOUT)
+    response.raise_for_status()
+    status = response.json()
+    chunk_size = status["chunk_size"]
+
+    failures = 0
+    while not status["complete"]:
+        offset = status["offset"]
+        if progress:
+            progress(offset / len(data))
+        try:
+            response = session.put(
+                f"{base_url}/uploads/{status['upload_id']}",
+                params={"offset": offset},
+                data=data[offset:offset + chunk_size],
+                headers={"Content-Type": "application/octet-stream"},
+                timeout=UPLOAD_TIMEOUT
+            )
+        except (requests.ConnectionError, requests.Timeout):
+            failures += 1
+            if failures > retries:
+                raise
+            time.sleep(min(2 ** failures, 30))
+            continue
+
+        if response.status_code == 409:
+            # Out of step (e.g. a lost response): ask where the server is
+            response = session.get(
+                f"{base_url}/uploads/{status['upload_id']}", timeout=UPLOAD_TIMEOUT
+            )
+        elif response.status_code == 422:
+            # Checksum mismatch; the server discarded the partial file
+            failures += 1
+            if failures > retries:
+                response.raise_for_status()
+            status = dict(status, offset=0)
+            continue
+        response.raise_for_status()
+        status, failures = response.json(), 0
+
+    if progress:
+        progress(1.0)
+    return status
@@ -0,0 +1,347 @@
+import atexit
+import contextlib
+import multiprocessing as mp
+import os
+import queue
+import sys
+import threading
+import time
+import types
+from concurrent.futures import Future
+from multiprocessing import connection
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+# ---------- CONFIG ----------
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", os.cpu_count() or 2))
+RING_SLOTS = int(os.getenv("INFERENCE_RING_SLOTS", 64))
+SLOT_TIMEOUT = float(os.getenv("INFERENCE_SLOT_TIMEOUT", 30))
+HEALTH_INTERVAL = float(os.getenv("INFERENCE_HEALTH_INTERVAL", 2))
+HEALTH_TIMEOUT = float(os.getenv("INFERENCE_HEALTH_TIMEOUT", 30))
+
+
+# =====================================================
+# 👷 WORKER PROCESS
+# =====================================================
+# Runs in the worker: returns (predict_fn, explain_fn) for model_path, where
+# predict_fn(batch) -> scores and explain_fn(batch) -> (scores, heatmaps)
+def load_keras_engine(model_path):
+    import tensorflow as tf
+    from gradcam_utils import GradCamEngine
+
+    model = tf.keras.models.load_model(model_path)
+    engine = GradCamEngine(model)
+    return model.predict_on_batch, engine.explain_batch
+
+
+# Each worker owns one input ring (slots x H x W x C) and one output ring
+# (slots x (classes + heatmap cells)) in shared memory. Only slot numbers
+# travel over the pipe; the tensors never get pickled.
+def _worker_main(loader, model_path, input_name, output_name, slots, input_shape,
+                 num_classes, heartbeat, conn):
+    predict_batch, explain_batch = loader(model_path)
+
+    in_shm = SharedMemory(name=input_name)
+    out_shm = SharedMemory(name=output_name)
+    inputs = np.ndarray((slots, *input_shape), dtype=np.float32, buffer=in_shm.buf)
+    outputs = np.ndarray((slots, out_shm.size // (4 * slots)), dtype=np.float32,
+                         buffer=out_shm.buf)
+
+    conn.send(("ready", os.getpid()))
+
+    while True:
+        heartbeat.value = time.time()
+        if not conn.poll(1.0):
+            continue
+
+        requests, stop = [], False
+        try:
+            # Drain whatever else is waiting into the same forward pass
+            while True:
+                message = conn.recv()
+                if message is None:
+                    stop = True
+                    break
+                requests.append(message)
+                if len(requests) >= slots or not conn.poll():
+                    break
+        except EOFError:
+            stop = True
+
+        for explain in (False, True):
+            idx = [slot for slot, flag in requests if flag == explain]
+            if not idx:
+                continue
+            try:
+                if explain:
+                    preds, heatmaps = explain_batch(inputs[idx])
+                    outputs[idx, num_classes:] = heatmaps.reshape(len(idx), -1)
+                else:
+                    preds = predict_batch(inputs[idx])
+                outputs[idx, :num_classes] = np.asarray(preds)
+                conn.send(("done", idx, None))
+            except Exception as e:
+                conn.send(("done", idx, repr(e)))
+
+        if stop:
+            break
+
+    del inputs, outputs
+    in_shm.close()
+    out_shm.close()
+
+
+# spawn re-runs the parent's __main__ script in every child before it
+# unpickles the target; for `python app.py` that is the whole server startup
+# (model load, migrations, background threads). The target lives in this
+# module, so children are started with __main__ hidden and import nothing
+# but inference_pool.
+_spawn_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def _main_module_hidden():
+    with _spawn_lock:
+        main = sys.modules["__main__"]
+        sys.modules["__main__"] = types.ModuleType("__main__")
+        try:
+            yield
+        finally:
+            sys.modules["__main__"] = main
+
+
+class _Worker:
+    def __init__(self, index, slots, input_shape, out_width):
+        self.index = index
+        self.lock = threading.Lock()
+        self.in_shm = SharedMemory(
+            create=True, size=slots * int(np.prod(input_shape)) * 4
+        )
+        self.out_shm = SharedMemory(create=True, size=slots * out_width * 4)
+        self.inputs = np.ndarray(
+            (slots, *input_shape), dtype=np.float32, buffer=self.in_shm.buf
+        )
+        self.outputs = np.ndarray(
+            (slots, out_width), dtype=np.float32, buffer=self.out_shm.buf
+        )
+        self.process = None
+        self.conn = None
+        self.heartbeat = None
+        self.generation = 0
+        self.free = None
+        self.pending = {}
+        self.ready = False
+        self.dead = False
+        self.restarts = 0
+
+
+# =====================================================
+# 🏭 PRE-FORKED INFERENCE POOL
+# =====================================================
+class InferencePool:
+    def __init__(self, model_path, input_shape, num_classes, heatmap_shape,
+                 workers=INFERENCE_WORKERS, slots=RING_SLOTS,
+                 loader=load_keras_engine):
+        self.model_path = model_path
+        # Module-level function, pickled by name into each worker
+        self.loader = loader
+        self.input_shape = tuple(input_shape)
+        self.num_classes = num_classes
+        self.heatmap_shape = tuple(heatmap_shape)
+        self.num_workers = max(1, workers)
+        self.slots = max(1, slots)
+        self.out_width = num_classes + int(np.prod(self.heatmap_shape))
+
+        # spawn, not fork: TensorFlow's runtime is not fork-safe
+        self._ctx = mp.get_context("spawn")
+        self._workers = []
+        self._lock = threading.Lock()
+        self._started = False
+        self._closed = False
+        self._requests = 0
+        self._errors = 0
+
+    # ---------- LIFECYCLE ----------
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            for i in range(self.num_workers):
+                worker = _Worker(i, self.slots, self.input_shape, self.out_width)
+                self._spawn(worker)
+                self._workers.append(worker)
+
+            threading.Thread(target=self._dispatch, name="pool-dispatch",
+                             daemon=True).start()
+            threading.Thread(target=self._monitor, name="pool-health",
+                             daemon=True).start()
+            atexit.register(self.shutdown)
+            self._started = True
+
+    def _spawn(self, worker):
+        parent_conn, child_conn = self._ctx.Pipe()
+        worker.heartbeat = self._ctx.Value("d", time.time(), lock=False)
+        worker.process = self._ctx.Process(
+            target=_worker_main,
+            args=(self.loader, self.model_path, worker.in_shm.name,
+                  worker.out_shm.name, self.slots, self.input_shape,
+                  self.num_classes, worker.heartbeat, child_conn),
+            name=f"inference-worker-{worker.index}",
+            daemon=True
+        )
+        with _main_module_hidden():
+            worker.process.start()
+        child_conn.close()
+
+        worker.conn = parent_conn
+        worker.generation += 1
+        worker.free = queue.Queue()
+        for slot in range(self.slots):
+            worker.free.put(slot)
+        worker.ready = False
+        worker.dead = False
+
+    def _respawn(self, worker, reason):
+        with worker.lock:
+            for future, _ in worker.pending.values():
+                if not future.done():
+                    future.set_exception(RuntimeError(f"Inference worker {reason}"))
+            worker.pending = {}
+
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.process.join(timeout=5)
+            worker.conn.close()
+
+            worker.restarts += 1
+            self._spawn(worker)
+
+    def shutdown(self):
+        if self._closed:
+            return
+        self._closed = True
+
+        for worker in self._workers:
+            try:
+                with worker.lock:
+                    worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for worker in self._workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.inputs = worker.outputs = None
+            for shm in (worker.in_shm, worker.out_shm):
+                shm.close()
+                shm.unlink()
+
+    # ---------- REQUESTS ----------
+    def submit(self, tensor, explain=False):
+        self.start()
+
+        while True:
+            worker = min(self._workers, key=lambda w: (w.dead, len(w.pending)))
+            generation = worker.generation
+            try:
+                slot = worker.free.get(timeout=SLOT_TIMEOUT)
+            except queue.Empty:
+                raise TimeoutError("No free inference slot")
+
+            with worker.lock:
+                # Worker was respawned while we waited; its ring was reset
+                if worker.generation != generation:
+                    continue
+
+                worker.inputs[slot] = tensor
+                future = Future()
+                worker.pending[slot] = (future, explain)
+                self._requests += 1
+                try:
+                    worker.conn.send((slot, explain))
+                except (OSError, ValueError):
+                    worker.pending.pop(slot, None)
+                    worker.dead = True
+                    continue
+                return future
+
+    def predict(self, tensor, explain=False, timeout=None):
+        return self.submit(tensor, explain).result(timeout)
+
+    # ---------- RESPONSES ----------
+    def _dispatch(self):
+        while not self._closed:
+            conns = {w.conn: w for w in self._workers if not w.dead}
+            if not conns:
+                time.sleep(0.1)
+                continue
+
+            try:
+                ready = connection.wait(list(conns), timeout=0.5)
+            except (OSError, ValueError):
+                continue
+
+            for conn in ready:
+                worker = conns[conn]
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    worker.dead = True
+                    continue
+
+                if message[0] == "ready":
+                    worker.ready = True
+                    continue
+
+                _, slots, error = message
+                with worker.lock:
+                    if conn is not worker.conn:
+                        continue
+                    for slot in slots:
+                        item = worker.pending.pop(slot, None)
+                        if item is None:
+                            continue
+                        future, explain = item
+                        if error:
+                            self._errors += 1
+                            future.set_exception(RuntimeError(error))
+                        else:
+                            row = worker.outputs[slot].copy()
+                            preds = row[:self.num_classes]
+                            future.set_result(
+                                (preds, row[self.num_classes:].reshape(self.heatmap_shape))
+                                if explain else preds
+                            )
+                        worker.free.put(slot)
+
+    # ---------- HEALTH CHECKS ----------
+    def _monitor(self):
+        while not self._closed:
+            time.sleep(HEALTH_INTERVAL)
+            for worker in self._workers:
+                if self._closed:
+                    return
+                if worker.dead or not worker.process.is_alive():
+                    self._respawn(worker, "died")
+                elif (worker.ready and worker.pending
+                        and time.time() - worker.heartbeat.value > HEALTH_TIMEOUT):
+                    self._respawn(worker, "stopped responding")
+
+    def stats(self):
+        return {
+            "workers": [
+                {
+                    "pid": w.process.pid if w.process else None,
+                    "alive": bool(w.process and w.process.is_alive()),
+                    "ready": w.ready,
+                    "in_flight": len(w.pending),
+                    "restarts": w.restarts
+                }
+                for w in self._workers
+            ],
+            "configured_workers": self.num_workers,
+            "ring_slots": self.slots,
+            "requests": self._requests,
+            "errors": self._errors
+        }
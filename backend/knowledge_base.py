@@ -0,0 +1,235 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import traceback
+
+from decision_logic import pesticide_optimization
+from risk_engine import SEVERITIES
+
+# Resolved from this file so the Streamlit client can load them offline
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+KB_PATH = os.path.join(BASE_DIR, "disease_knowledge_base.json")
+LABELS_PATH = os.path.join(BASE_DIR, "model", "class_labels.json")
+# Seconds between checks of the knowledge-base file for changes
+KB_RELOAD_INTERVAL = float(os.getenv("KB_RELOAD_INTERVAL", 5))
+
+DEFAULT_TREATMENT = {
+    "chemical": "Consult local agriculture expert before chemical use",
+    "organic": "Neem oil or bio-fungicide spray",
+    "prevention": "Regular monitoring and field hygiene"
+}
+DEFAULT_KB_ID = "default"
+IMAGE_YIELD_IMPACT = "Early detection improves yield and reduces losses"
+
+
+def kb_id(crop, disease):
+    return f"{crop}/{disease}"
+
+
+# ---------- LABEL NAMES ----------
+# Display names straight from a CNN label, e.g. "Corn_(maize)___Common_rust_"
+def parse_crop_and_disease(label):
+    if not label or "___" not in label:
+        return "Unknown Crop", label
+
+    crop, disease = label.split("___", 1)
+    crop = crop.replace("_", " ").replace("(including sour)", "").title()
+    disease = disease.replace("_", " ").title()
+    return " ".join(crop.split()), " ".join(disease.split())
+
+
+def _normalize(text):
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text.lower()).split())
+
+
+# "Haunglongbing_(Citrus_greening)" -> ["haunglongbing", "citrus greening"]
+def _name_variants(text):
+    main = re.sub(r"\(.*?\)", " ", text)
+    names = [_normalize(main)] + [_normalize(p) for p in re.findall(r"\((.*?)\)", text)]
+    return [name for name in names if name]
+
+
+# Exact name first, then the longest KB name contained word-for-word in the
+# label ("Northern Leaf Blight" -> "Leaf Blight")
+def _match(names, candidates):
+    normalized = {_normalize(candidate): candidate for candidate in candidates}
+    for name in names:
+        if name in normalized:
+            return normalized[name]
+
+    best = None
+    for key, candidate in normalized.items():
+        if any(f" {key} " in f" {name} " for name in names):
+            if best is None or len(key) > len(_normalize(best)):
+                best = candidate
+    return best
+
+
+# =====================================================
+# 📚 COMPILED KNOWLEDGE BASE
+# =====================================================
+class LabelEntry:
+    __slots__ = ("label", "crop", "disease", "kb_id", "treatment", "advisories")
+
+    def __init__(self, label, crop, disease, kb_id, treatment, advisories):
+        self.label = label
+        self.crop = crop
+        self.disease = disease
+        self.kb_id = kb_id
+        self.treatment = treatment
+        self.advisories = advisories
+
+    @property
+    def matched(self):
+        return self.kb_id != DEFAULT_KB_ID
+
+
+# Immutable snapshot: one LabelEntry per model class id, with the advisory
+# for every severity built up front. Reloads build a new snapshot.
+class CompiledKnowledgeBase:
+    def __init__(self, db, version, labels):
+        self.db = db
+        self.version = version
+        self.treatments = {DEFAULT_KB_ID: DEFAULT_TREATMENT}
+        for crop, diseases in db.items():
+            for disease, entry in diseases.items():
+                self.treatments[kb_id(crop, disease)] = entry["treatment"]
+
+        self.entries = [self.compile_label(label) for label in labels]
+        self.by_label = {entry.label: entry for entry in self.entries}
+        self.unmapped = [entry.label for entry in self.entries if not entry.matched]
+
+    def compile_label(self, label):
+        crop, disease = parse_crop_and_disease(label)
+        treatment, treatment_id = DEFAULT_TREATMENT, DEFAULT_KB_ID
+
+        if label and "___" in label:
+            raw_crop, raw_disease = label.split("___", 1)
+            kb_crop = _match(_name_variants(raw_crop), self.db)
+            if kb_crop:
+                crop = kb_crop
+                kb_disease = _match(_name_variants(raw_disease), self.db[kb_crop])
+                if kb_disease:
+                    treatment_id = kb_id(kb_crop, kb_disease)
+                    treatment = self.treatments[treatment_id]
+
+        advisories = {
+            severity: {
+                "kb_id": treatment_id,
+                "treatment": treatment,
+                "pesticide_strategy": pesticide_optimization(severity),
+                "yield_impact": IMAGE_YIELD_IMPACT
+            }
+            for severity in SEVERITIES
+        }
+        return LabelEntry(label, crop, disease, treatment_id, treatment, advisories)
+
+    # class_id from the model output is a list index; labels the model does
+    # not know (e.g. old offline records) are compiled on the fly
+    def lookup(self, label, class_id=None):
+        if class_id is not None and 0 <= class_id < len(self.entries):
+            entry = self.entries[class_id]
+            if entry.label == label:
+                return entry
+        return self.by_label.get(label) or self.compile_label(label)
+
+    # (kb_id, treatment) for a crop / disease named as in the knowledge base
+    def treatment(self, crop, disease):
+        entry = self.db.get(crop, {}).get(disease)
+        if entry and "treatment" in entry:
+            return kb_id(crop, disease), entry["treatment"]
+        return DEFAULT_KB_ID, DEFAULT_TREATMENT
+
+    def report(self):
+        mapped = len(self.entries) - len(self.unmapped)
+        lines = [f"Knowledge base {self.version}: {mapped}/{len(self.entries)} "
+                 f"model labels mapped"]
+        if self.unmapped:
+            lines.append("  generic advisory for: " + ", ".join(self.unmapped))
+        return "\n".join(lines)
+
+
+def compile_knowledge_base(kb_path=KB_PATH, labels_path=LABELS_PATH):
+    with open(kb_path, "rb") as f:
+        data = f.read()
+    with open(labels_path) as f:
+        labels = json.load(f)
+
+    return CompiledKnowledgeBase(
+        json.loads(data),
+        # Changes whenever the file does; clients cache /knowledge-base under it
+        hashlib.sha1(data).hexdigest()[:12],
+        [labels[str(i)] for i in range(len(labels))]
+    )
+
+
+# =====================================================
+# 🔄 HOT RELOAD
+# =====================================================
+# Holds the current snapshot. watch() polls the file's mtime and size from
+# a daemon thread; a changed file is compiled in full before the snapshot
+# reference is swapped, so readers never see a half-built table. A file
+# that fails to parse (e.g. caught mid-save) keeps the previous snapshot.
+class KnowledgeBaseIndex:
+    def __init__(self, kb_path=KB_PATH, labels_path=LABELS_PATH):
+        self.kb_path = kb_path
+        self.labels_path = labels_path
+        self._signature = self._stat()
+        self._snapshot = compile_knowledge_base(kb_path, labels_path)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.counters = {"reloads": 0, "reload_errors": 0}
+
+    def current(self):
+        return self._snapshot
+
+    def _stat(self):
+        try:
+            st = os.stat(self.kb_path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def reload_if_changed(self):
+        with self._lock:
+            signature = self._stat()
+            if signature is None or signature == self._signature:
+                return False
+            self._signature = signature
+            try:
+                snapshot = compile_knowledge_base(self.kb_path, self.labels_path)
+            except Exception:
+                self.counters["reload_errors"] += 1
+                traceback.print_exc()
+                return False
+
+            self._snapshot = snapshot
+            self.counters["reloads"] += 1
+            print(snapshot.report())
+            return True
+
+    def watch(self, interval=KB_RELOAD_INTERVAL):
+        def run():
+            while True:
+                time.sleep(interval)
+                self.reload_if_changed()
+
+        with self._lock:
+            if self._thread is None and interval > 0:
+                self._thread = threading.Thread(
+                    target=run, name="kb-reload", daemon=True
+                )
+                self._thread.start()
+        return self
+
+    def stats(self):
+        snapshot = self._snapshot
+        return dict(
+            self.counters,
+            version=snapshot.version,
+            labels=len(snapshot.entries),
+            unmapped=len(snapshot.unmapped)
+        )
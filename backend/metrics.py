@@ -0,0 +1,190 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import g, has_request_context
+
+# Seconds; covers sub-ms cache hits up to the 10 s weather timeout
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+
+def _label_str(labels):
+    if not labels:
+        return ""
+    inner = ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+    return "{" + inner + "}"
+
+
+# =====================================================
+# 📈 METRIC TYPES
+# =====================================================
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name, self.help = name, help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, dict(k), v) for k, v in self._values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name, self.help = name, help_text
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            i = bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        out = []
+        with self._lock:
+            for key, (counts, total, count) in self._series.items():
+                labels = dict(key)
+                cumulative = 0
+                for bound, c in zip(self.buckets, counts):
+                    cumulative += c
+                    out.append((f"{self.name}_bucket", dict(labels, le=str(bound)), cumulative))
+                out.append((f"{self.name}_bucket", dict(labels, le="+Inf"), count))
+                out.append((f"{self.name}_sum", labels, round(total, 6)))
+                out.append((f"{self.name}_count", labels, count))
+        return out
+
+
+# =====================================================
+# 🗂️ REGISTRY
+# =====================================================
+STAGE_SECONDS = Histogram(
+    "cropguard_stage_duration_seconds", "Time spent per request stage"
+)
+STAGE_IN_FLIGHT = Gauge(
+    "cropguard_stage_in_flight", "Stages currently executing"
+)
+STAGE_ERRORS = Counter(
+    "cropguard_stage_errors_total", "Stages that raised an exception"
+)
+REQUEST_SECONDS = Histogram(
+    "cropguard_request_duration_seconds", "End-to-end request latency"
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "cropguard_requests_in_flight", "Requests currently being handled"
+)
+
+METRICS = [STAGE_SECONDS, STAGE_IN_FLIGHT, STAGE_ERRORS,
+           REQUEST_SECONDS, REQUESTS_IN_FLIGHT]
+
+# name -> callable returning {metric_suffix: number}; exported as gauges
+COLLECTORS = {}
+
+
+def register_collector(name, fn):
+    COLLECTORS[name] = fn
+
+
+# ---------- STAGE TIMING ----------
+# Worker threads (e.g. StageGraph tasks) have no request context; they bind
+# the originating request's path and timing list explicitly.
+_local = threading.local()
+
+
+def current_context():
+    if getattr(_local, "timings", None) is not None:
+        return _local.path, _local.timings
+    if has_request_context():
+        return g.get("metrics_path", "-"), g.setdefault("stage_timings", [])
+    return "-", None
+
+
+@contextmanager
+def bind_context(path, timings):
+    previous = getattr(_local, "path", None), getattr(_local, "timings", None)
+    _local.path, _local.timings = path, timings
+    try:
+        yield
+    finally:
+        _local.path, _local.timings = previous
+
+
+@contextmanager
+def stage(name, path=None):
+    context_path, timings = current_context()
+    path = path or context_path
+    STAGE_IN_FLIGHT.inc(stage=name, path=path)
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=name, path=path)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_IN_FLIGHT.dec(stage=name, path=path)
+        STAGE_SECONDS.observe(elapsed, stage=name, path=path)
+        if timings is not None:
+            timings.append((name, elapsed))
+
+
+def server_timing_header(timings):
+    return ", ".join(f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in timings)
+
+
+# ---------- PROMETHEUS TEXT FORMAT ----------
+def render_prometheus():
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{_label_str(labels)} {value}")
+
+    for prefix, fn in COLLECTORS.items():
+        try:
+            values = fn() or {}
+        except Exception:
+            continue
+        for key, value in values.items():
+            if isinstance(value, bool):
+                value = int(value)
+            if not isinstance(value, (int, float)):
+                continue
+            name = f"cropguard_{prefix}_{key}"
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,206 @@
+import json
+import os
+import tempfile
+import threading
+import zlib
+
+# ---------- CONFIG ----------
+JOURNAL_PATH = os.getenv("OFFLINE_JOURNAL", "offline_journal.log")
+# fsync after every append; a power cut then loses at most the record
+# being written, which the checksum detects on the next open.
+JOURNAL_FSYNC = os.getenv("OFFLINE_JOURNAL_FSYNC", "1").lower() in ("1", "true", "yes")
+# Compact once at least this many synced records make up this share of the log
+JOURNAL_COMPACT_MIN = int(os.getenv("OFFLINE_JOURNAL_COMPACT_MIN", 200))
+JOURNAL_COMPACT_RATIO = float(os.getenv("OFFLINE_JOURNAL_COMPACT_RATIO", 0.5))
+
+
+# =====================================================
+# 🧾 LINE FORMAT
+# =====================================================
+# One record per line: "<crc32 hex> <json>\n", json = {"seq": n, "record": {...}}.
+# A line whose checksum does not match was torn by a crash or power cut.
+def encode_line(seq, record):
+    body = json.dumps({"seq": seq, "record": record}, separators=(",", ":"))
+    return f"{zlib.crc32(body.encode()):08x} {body}\n".encode()
+
+
+def decode_line(line):
+    try:
+        text = line.decode().rstrip("\n")
+        checksum, body = text.split(" ", 1)
+        if int(checksum, 16) != zlib.crc32(body.encode()):
+            return None
+        entry = json.loads(body)
+        return int(entry["seq"]), entry["record"]
+    except (ValueError, KeyError, TypeError, UnicodeDecodeError):
+        return None
+
+
+def _fsync_dir(path):
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def _write_atomic(path, data):
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        _fsync_dir(path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+# =====================================================
+# 📒 OFFLINE JOURNAL
+# =====================================================
+# Append-only log of offline results plus a small cursor file recording
+# which sequence numbers have been synced. Appends are O(1); the log is
+# rewritten only by compaction, which drops synced records.
+class OfflineJournal:
+    def __init__(self, path=JOURNAL_PATH, fsync=JOURNAL_FSYNC,
+                 compact_min=JOURNAL_COMPACT_MIN,
+                 compact_ratio=JOURNAL_COMPACT_RATIO):
+        self.path = path
+        self.cursor_path = path + ".cursor"
+        self.fsync = fsync
+        self.compact_min = compact_min
+        self.compact_ratio = compact_ratio
+
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._in_log = 0
+        self.counters = {"appended": 0, "synced": 0, "torn": 0, "compactions": 0}
+
+        # Everything <= cursor is synced, plus any acked out of order
+        self._cursor = 0
+        self._synced = set()
+        self._load()
+
+    # ---------- LOAD / RECOVERY ----------
+    def _load(self):
+        if os.path.exists(self.cursor_path):
+            with open(self.cursor_path) as f:
+                state = json.load(f)
+            self._cursor = state.get("cursor", 0)
+            self._synced = set(state.get("synced", []))
+
+        last_seq = self._cursor
+        good_end = 0
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                offset = 0
+                for line in f:
+                    offset += len(line)
+                    entry = decode_line(line) if line.endswith(b"\n") else None
+                    if entry is None:
+                        self.counters["torn"] += 1
+                        continue
+                    good_end = offset
+                    seq, record = entry
+                    self._in_log += 1
+                    last_seq = max(last_seq, seq)
+                    if not self._is_synced(seq):
+                        self._pending[seq] = record
+
+            # A torn tail would swallow the next append; cut it off
+            if good_end < os.path.getsize(self.path):
+                with open(self.path, "r+b") as f:
+                    f.truncate(good_end)
+
+        self._next_seq = max([last_seq, *self._synced]) + 1
+
+    def _is_synced(self, seq):
+        return seq <= self._cursor or seq in self._synced
+
+    # ---------- APPEND ----------
+    def append(self, record):
+        with self._lock:
+            seq = self._next_seq
+            with open(self.path, "ab") as f:
+                f.write(encode_line(seq, record))
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            self._next_seq += 1
+            self._pending[seq] = record
+            self._in_log += 1
+            self.counters["appended"] += 1
+            return seq
+
+    def pending(self, limit=None):
+        with self._lock:
+            seqs = sorted(self._pending)[:limit]
+            return [(seq, self._pending[seq]) for seq in seqs]
+
+    def __len__(self):
+        return len(self._pending)
+
+    # ---------- SYNC CURSOR ----------
+    def mark_synced(self, seqs):
+        with self._lock:
+            marked = [seq for seq in seqs if self._pending.pop(seq, None) is not None]
+            if not marked:
+                return 0
+            self._synced.update(marked)
+
+            # Fold the contiguous run into the cursor
+            lowest_pending = min(self._pending, default=self._next_seq)
+            self._cursor = max(self._cursor, lowest_pending - 1)
+            self._synced = {seq for seq in self._synced if seq > self._cursor}
+            _write_atomic(self.cursor_path, json.dumps({
+                "cursor": self._cursor,
+                "synced": sorted(self._synced)
+            }).encode())
+
+            self.counters["synced"] += len(marked)
+            synced_in_log = self._in_log - len(self._pending)
+            if (synced_in_log >= self.compact_min
+                    and synced_in_log >= self.compact_ratio * self._in_log):
+                self._compact()
+            return len(marked)
+
+    # ---------- COMPACTION ----------
+    def compact(self):
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        data = b"".join(
+            encode_line(seq, self._pending[seq]) for seq in sorted(self._pending)
+        )
+        _write_atomic(self.path, data)
+        self._in_log = len(self._pending)
+        self.counters["compactions"] += 1
+
+    # ---------- LEGACY QUEUE ----------
+    # Imports an offline_results.json array once and renames the file
+    def import_json(self, path, prepare=lambda record: record):
+        if not os.path.exists(path):
+            return 0
+        with open(path) as f:
+            text = f.read().strip()
+        records = json.JSONDecoder().raw_decode(text)[0] if text else []
+        for record in records:
+            if isinstance(record, dict):
+                self.append(prepare(record))
+        os.replace(path, path + ".imported")
+        return len(records)
+
+    def stats(self):
+        return dict(
+            self.counters,
+            pending=len(self._pending),
+            records_in_log=self._in_log,
+            cursor=self._cursor
+        )
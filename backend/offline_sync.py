@@ -1,46 +1,147 @@
+import gzip
+import hashlib
 import json
 import os
+import threading
+import uuid
+from datetime import datetime
+
 import requests
 
+from connectivity import ConnectivityMonitor
+from offline_journal import OfflineJournal, JOURNAL_PATH
+
+# Pre-journal queue; imported into the journal on first use
 OFFLINE_FILE = "offline_results.json"
-SERVER_SYNC_URL = "http://127.0.0.1:5000/sync"
+DEVICE_ID_FILE = "device_id"
+BACKEND_URL = os.getenv("BACKEND_URL", "http://127.0.0.1:5000").rstrip("/")
+SERVER_SYNC_URL = os.getenv("SERVER_SYNC_URL", f"{BACKEND_URL}/sync-offline/bulk")
+SYNC_CHUNK_SIZE = int(os.getenv("SYNC_CHUNK_SIZE", 100))
+SYNC_TIMEOUT = float(os.getenv("SYNC_TIMEOUT", 30))
+
+_monitors = {}
+_monitors_lock = threading.Lock()
+
+
+# One background monitor per backend; the journal syncs as soon as the
+# backend becomes reachable again
+def start_connectivity_monitor(backend_url=BACKEND_URL):
+    backend_url = backend_url.rstrip("/")
+    with _monitors_lock:
+        monitor = _monitors.get(backend_url)
+        if monitor is None:
+            sync_url = (SERVER_SYNC_URL if backend_url == BACKEND_URL
+                        else f"{backend_url}/sync-offline/bulk")
+            monitor = _monitors[backend_url] = ConnectivityMonitor(
+                f"{backend_url}/",
+                on_online=lambda: sync_offline_results(url=sync_url)
+            ).start()
+        return monitor
+
 
+# Reads the monitor's cached state; only the very first call can wait
 def is_online(timeout=3):
-    try:
-        requests.get("https://www.google.com", timeout=timeout)
-        return True
-    except:
-        return False
+    return start_connectivity_monitor().is_online(wait=timeout)
 
 
-def save_offline_result(result):
-    data = []
-    if os.path.exists(OFFLINE_FILE):
-        with open(OFFLINE_FILE, "r") as f:
-            data = json.load(f)
+def device_id():
+    if os.path.exists(DEVICE_ID_FILE):
+        with open(DEVICE_ID_FILE) as f:
+            return f.read().strip()
+    value = uuid.uuid4().hex
+    with open(DEVICE_ID_FILE, "w") as f:
+        f.write(value)
+    return value
+
+
+# record_id is generated once on the device so the server can drop retries
+def new_record(result):
+    return dict(
+        result,
+        record_id=result.get("record_id") or uuid.uuid4().hex,
+        saved_at=result.get("saved_at") or datetime.utcnow().isoformat()
+    )
+
 
-    data.append(result)
+# Legacy queue items get a content-derived id, so importing the same
+# file twice cannot create two server reports
+def legacy_record(result):
+    if not result.get("record_id"):
+        digest = hashlib.sha1(json.dumps(result, sort_keys=True).encode())
+        result = dict(result, record_id=digest.hexdigest())
+    return new_record(result)
 
-    with open(OFFLINE_FILE, "w") as f:
-        json.dump(data, f, indent=2)
 
+_journal = None
+_journal_lock = threading.Lock()
 
-def sync_offline_results():
-    if not os.path.exists(OFFLINE_FILE):
-        return {"synced": 0}
 
-    with open(OFFLINE_FILE, "r") as f:
-        data = json.load(f)
+def get_journal():
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = OfflineJournal(JOURNAL_PATH)
+            _journal.import_json(OFFLINE_FILE, prepare=legacy_record)
+        return _journal
 
-    if not data:
-        return {"synced": 0}
 
+def save_offline_result(result):
+    return get_journal().append(new_record(result))
+
+
+def post_chunk(records, session=requests, url=SERVER_SYNC_URL):
+    body = gzip.compress(json.dumps({
+        "device_id": device_id(),
+        "records": records
+    }).encode())
+    res = session.post(
+        url,
+        data=body,
+        headers={"Content-Type": "application/json", "Content-Encoding": "gzip"},
+        timeout=SYNC_TIMEOUT
+    )
+    res.raise_for_status()
+    return res.json()
+
+
+_sync_lock = threading.Lock()
+
+
+# Sends the journal in gzip chunks and marks only the records the server
+# acknowledged. Rejected records are acknowledged too: they can never sync.
+def sync_offline_results(chunk_size=SYNC_CHUNK_SIZE, session=requests,
+                         url=SERVER_SYNC_URL):
+    # A sync already running (e.g. started by the monitor) covers this call
+    if not _sync_lock.acquire(blocking=False):
+        return {"synced": 0, "pending": len(get_journal()), "busy": True}
     try:
-        res = requests.post(SERVER_SYNC_URL, json=data, timeout=10)
-        if res.status_code == 200:
-            os.remove(OFFLINE_FILE)
-            return {"synced": len(data)}
-    except:
-        pass
-
-    return {"synced": 0}
+        return _sync(chunk_size, session, url)
+    finally:
+        _sync_lock.release()
+
+
+def _sync(chunk_size, session, url):
+    journal = get_journal()
+    pending = journal.pending()
+    if not pending:
+        return {"synced": 0, "pending": 0}
+
+    by_record_id = {record["record_id"]: seq for seq, record in pending}
+    counts = {"synced": 0, "duplicates": 0, "rejected": 0}
+    for start in range(0, len(pending), chunk_size):
+        chunk = pending[start:start + chunk_size]
+        try:
+            response = post_chunk(
+                [dict(record, seq=seq) for seq, record in chunk], session, url
+            )
+        except Exception:
+            break
+        journal.mark_synced(
+            by_record_id[ack["record_id"]] for ack in response.get("acks", [])
+            if ack.get("record_id") in by_record_id
+        )
+        counts["synced"] += response.get("created", 0)
+        counts["duplicates"] += response.get("duplicates", 0)
+        counts["rejected"] += response.get("rejected", 0)
+
+    return dict(counts, pending=len(journal))
@@ -0,0 +1,61 @@
+import argparse
+import time
+
+from ai_engine import KB
+from voice_summary import (
+    LANGUAGES, TTS_ENGINES, TTS_ENGINE, build_voice_text, get_engine,
+    synthesize_cached
+)
+
+SEVERITIES = ("Low", "Medium", "High")
+
+
+# Every (crop, disease) the API can report: CNN labels and knowledge-base
+# entries used by the no-image path
+def known_conditions():
+    kb = KB.current()
+    conditions = {(entry.crop, entry.disease) for entry in kb.entries}
+    for crop, diseases in kb.db.items():
+        conditions.add((crop, "Healthy"))
+        conditions.update((crop, disease) for disease in diseases)
+    conditions.add(("Unknown Crop", "Unknown"))
+    return sorted(conditions)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fill static/voice with every voice summary the API can return"
+    )
+    parser.add_argument("--engine", choices=sorted(TTS_ENGINES), default=TTS_ENGINE)
+    parser.add_argument("--languages", default=",".join(LANGUAGES))
+    parser.add_argument("--delay", type=float, default=None,
+                        help="Seconds between synthesis calls (default 1 for network engines)")
+    args = parser.parse_args()
+
+    engine = get_engine(args.engine)
+    delay = args.delay if args.delay is not None else (1.0 if engine.network else 0.0)
+    languages = [lang.strip() for lang in args.languages.split(",") if lang.strip()]
+
+    created = cached = failed = 0
+    for crop, disease in known_conditions():
+        for severity in SEVERITIES:
+            result = {"crop_type": crop, "disease_detected": disease, "severity": severity}
+            for lang in languages:
+                try:
+                    _, new = synthesize_cached(build_voice_text(result, lang), lang, engine)
+                except Exception as e:
+                    failed += 1
+                    print(f"⚠️ {crop} / {disease} / {severity} / {lang}: {e}")
+                    continue
+
+                if new:
+                    created += 1
+                    time.sleep(delay)  # stay under the provider's rate limit
+                else:
+                    cached += 1
+
+    print(f"✅ Voice cache: {created} generated, {cached} already cached, {failed} failed")
+
+
+if __name__ == "__main__":
+    main()
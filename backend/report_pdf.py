@@ -0,0 +1,115 @@
+import io
+import os
+
+import qrcode
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FONT_PATH = os.getenv(
+    "REPORT_FONT_PATH",
+    os.path.join(BASE_DIR, "..", "frontend", "fonts", "NotoSansDevanagari-Regular.ttf")
+)
+
+# Same wording as the Streamlit UI labels
+REPORT_LABELS = {
+    "en": {
+        "title": "CropGuard AI",
+        "crop_detected": "Crop Detected from Image",
+        "disease": "Disease",
+        "severity": "Severity",
+        "confidence": "Confidence",
+        "chemical": "Chemical Treatment",
+        "organic": "Organic Treatment",
+        "prevention": "Prevention"
+    },
+    "hi": {
+        "title": "क्रॉपगार्ड एआई",
+        "crop_detected": "छवि से पहचानी गई फसल",
+        "disease": "रोग",
+        "severity": "गंभीरता",
+        "confidence": "विश्वास स्तर",
+        "chemical": "रासायनिक उपचार",
+        "organic": "जैविक उपचार",
+        "prevention": "रोकथाम"
+    },
+    "mr": {
+        "title": "क्रॉपगार्ड एआय",
+        "crop_detected": "फोटोवरून ओळखलेले पीक",
+        "disease": "रोग",
+        "severity": "तीव्रता",
+        "confidence": "विश्वास पातळी",
+        "chemical": "रासायनिक उपचार",
+        "organic": "सेंद्रिय उपचार",
+        "prevention": "प्रतिबंध"
+    }
+}
+
+_font_registered = None
+
+
+def _register_font():
+    global _font_registered
+    if _font_registered is None:
+        _font_registered = False
+        if os.path.exists(FONT_PATH):
+            pdfmetrics.registerFont(TTFont("Deva", FONT_PATH))
+            _font_registered = True
+    return _font_registered
+
+
+def _set_font(c, size, fallback):
+    if _register_font():
+        c.setFont("Deva", size)
+    else:
+        c.setFont(fallback, size)
+
+
+# ---------- PDF REPORT ----------
+def build_report_pdf(result, lang_code="en"):
+    labels = REPORT_LABELS.get(lang_code, REPORT_LABELS["en"])
+    buffer = io.BytesIO()
+
+    qr_text = f"""
+Crop: {result.get('crop_type')}
+Disease: {result.get('disease_detected')}
+Severity: {result.get('severity')}
+Confidence: {result.get('confidence')}%
+"""
+    qr = qrcode.make(qr_text).get_image()
+
+    c = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+
+    _set_font(c, 16, "Helvetica-Bold")
+    c.drawString(50, height - 50, f"{labels['title']} – Report")
+
+    _set_font(c, 12, "Helvetica")
+    y = height - 100
+
+    c.drawString(50, y, f"{labels['crop_detected']}: {result.get('crop_type')}")
+    y -= 25
+    c.drawString(50, y, f"{labels['disease']}: {result.get('disease_detected')}")
+    y -= 25
+    c.drawString(50, y, f"{labels['severity']}: {result.get('severity')}")
+    y -= 25
+    c.drawString(50, y, f"{labels['confidence']}: {result.get('confidence')}")
+    y -= 40
+
+    treatment = result.get("advisory", {}).get("treatment", {})
+    c.drawString(50, y, f"{labels['chemical']}: {treatment.get('chemical', 'N/A')}")
+    y -= 25
+    c.drawString(50, y, f"{labels['organic']}: {treatment.get('organic', 'N/A')}")
+    y -= 25
+    c.drawString(50, y, f"{labels['prevention']}: {treatment.get('prevention', 'N/A')}")
+
+    c.drawImage(ImageReader(qr), width - 160, 60, 100, 100)
+    c.setFont("Helvetica", 9)
+    c.drawString(width - 170, 45, "Scan QR for summary")
+
+    c.showPage()
+    c.save()
+    return buffer.getvalue()
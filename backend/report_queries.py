@@ -0,0 +1,163 @@
+import base64
+import json
+from datetime import datetime
+
+REPORT_PAGE_SIZE = 50
+REPORT_PAGE_MAX = 500
+
+REPORT_COLUMNS = (
+    "report_id", "crop", "disease", "severity", "confidence", "advisory",
+    "expert_enabled", "voice_summary", "explainability_image", "pdf_report",
+    "offline_mode", "weather_data", "created_at"
+)
+LIST_COLUMNS = (
+    "report_id", "crop", "disease", "severity", "confidence",
+    "offline_mode", "created_at"
+)
+FILTER_COLUMNS = ("crop", "disease", "severity")
+STATS_GROUPS = ("day", "crop", "disease", "severity")
+
+
+# ---------- ROW CONVERSION ----------
+def _report_dict(columns, row):
+    report = dict(zip(columns, row))
+    for field, empty in (("advisory", "{}"), ("weather_data", "null")):
+        if field in report:
+            try:
+                report[field] = json.loads(report[field] or empty)
+            except ValueError:
+                pass
+    for flag in ("expert_enabled", "offline_mode"):
+        if flag in report:
+            report[flag] = bool(report[flag])
+    return report
+
+
+def parse_day(value, name):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        raise ValueError(f"{name} must be YYYY-MM-DD")
+
+
+# ---------- KEYSET CURSOR ----------
+# Opaque token holding the (created_at, id) of the last row on a page
+def encode_cursor(created_at, row_id):
+    raw = json.dumps([created_at, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return str(created_at), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def _filters(args):
+    clauses, params = [], []
+    for column in FILTER_COLUMNS:
+        if args.get(column):
+            clauses.append(f"{column} = ?")
+            params.append(args[column])
+
+    start = parse_day(args.get("from"), "from")
+    end = parse_day(args.get("to"), "to")
+    return clauses, params, start, end
+
+
+# =====================================================
+# 🔎 QUERIES
+# =====================================================
+def get_report(conn, report_id):
+    row = conn.execute(
+        f"SELECT {', '.join(REPORT_COLUMNS)} FROM crop_reports WHERE report_id = ?",
+        (report_id,)
+    ).fetchone()
+    return _report_dict(REPORT_COLUMNS, row) if row else None
+
+
+# Newest first, paginated on (created_at, id) so deep pages cost the same
+# as the first one.
+def list_reports(conn, args):
+    try:
+        limit = int(args.get("limit") or REPORT_PAGE_SIZE)
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    limit = max(1, min(limit, REPORT_PAGE_MAX))
+
+    clauses, params, start, end = _filters(args)
+    if start:
+        clauses.append("created_at >= ?")
+        params.append(start)
+    if end:
+        clauses.append("created_at < date(?, '+1 day')")
+        params.append(end)
+    if args.get("cursor"):
+        clauses.append("(created_at, id) < (?, ?)")
+        params.extend(decode_cursor(args["cursor"]))
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = conn.execute(
+        f"SELECT id, {', '.join(LIST_COLUMNS)} FROM crop_reports {where} "
+        f"ORDER BY created_at DESC, id DESC LIMIT ?",
+        (*params, limit + 1)
+    ).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last[-1], last[0])
+
+    return {
+        "reports": [_report_dict(LIST_COLUMNS, row[1:]) for row in rows],
+        "next_cursor": next_cursor
+    }
+
+
+# Served from the daily rollup, never from crop_reports itself
+def report_stats(conn, args):
+    group_by = [g.strip() for g in (args.get("group_by") or "crop,disease").split(",")
+                if g.strip()]
+    unknown = set(group_by) - set(STATS_GROUPS)
+    if unknown:
+        raise ValueError(f"group_by must be a subset of {','.join(STATS_GROUPS)}")
+
+    clauses, params, start, end = _filters(args)
+    if start:
+        clauses.append("day >= ?")
+        params.append(start)
+    if end:
+        clauses.append("day <= ?")
+        params.append(end)
+    clauses.append("reports > 0")
+
+    select = ", ".join(group_by + ["SUM(reports)", "SUM(confidence_sum)"])
+    group = f"GROUP BY {', '.join(group_by)}" if group_by else ""
+    rows = conn.execute(
+        f"SELECT {select} FROM report_daily_counts "
+        f"WHERE {' AND '.join(clauses)} {group} ORDER BY {len(group_by) + 1} DESC",
+        params
+    ).fetchall()
+
+    groups = []
+    for row in rows:
+        reports, confidence_sum = row[-2], row[-1]
+        if not reports:
+            continue
+        groups.append(dict(
+            zip(group_by, row),
+            reports=reports,
+            avg_confidence=round(confidence_sum / reports, 2)
+        ))
+
+    return {
+        "group_by": group_by,
+        "total": sum(item["reports"] for item in groups),
+        "groups": groups
+    }
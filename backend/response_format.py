@@ -0,0 +1,160 @@
+import gzip
+import json
+import os
+
+from flask import Response
+
+# Optional speedups; the stdlib json / gzip paths are always available
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# ---------- CONFIG ----------
+# Bodies smaller than this are sent uncompressed (headers would eat the gain)
+RESPONSE_COMPRESS_MIN = int(os.getenv("RESPONSE_COMPRESS_MIN", 512))
+RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", 6))
+RESPONSE_BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", 5))
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson") + MSGPACK_TYPES
+
+# fields=compact: what a low-bandwidth client needs to show a diagnosis
+COMPACT_FIELDS = (
+    "report_id", "crop_type", "disease_detected", "severity", "risk_score",
+    "confidence", "advisory", "expert_connect.enabled", "voice_summary",
+    "artifacts"
+)
+
+
+# =====================================================
+# ✂️ FIELD SELECTION
+# =====================================================
+# fields=a,b.c keeps only those keys (dotted paths reach into nested
+# objects); unknown fields are skipped.
+def parse_fields(value):
+    if not value:
+        return None
+    if value == "compact":
+        return COMPACT_FIELDS
+    return tuple(field.strip() for field in value.split(",") if field.strip())
+
+
+def select_fields(obj, fields):
+    selected = {}
+    for field in fields:
+        source, target = obj, selected
+        *parents, leaf = field.split(".")
+        for key in parents:
+            source = source.get(key) if isinstance(source, dict) else None
+            if not isinstance(source, dict):
+                break
+            target = target.setdefault(key, {})
+        else:
+            if leaf in source:
+                target[leaf] = source[leaf]
+    return selected
+
+
+# Static treatment text is replaced by its knowledge-base id and version;
+# clients resolve it from their cached copy of /knowledge-base.
+def reference_advisory(result, kb_version):
+    advisory = result.get("advisory")
+    if not isinstance(advisory, dict) or "kb_id" not in advisory:
+        return result
+    advisory = {k: v for k, v in advisory.items() if k != "treatment"}
+    advisory["kb_version"] = kb_version
+    return dict(result, advisory=advisory)
+
+
+# =====================================================
+# 📦 ENCODING
+# =====================================================
+def dumps_json(obj):
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+        except TypeError:
+            pass  # e.g. non-string keys; the stdlib encoder handles those
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+def wants_msgpack(req):
+    if msgpack is None:
+        return False
+    if req.values.get("format") == "msgpack":
+        return True
+    accept = req.accept_mimetypes
+    best = accept.best_match(MSGPACK_TYPES + ("application/json",))
+    return best in MSGPACK_TYPES and accept[best] > accept["application/json"]
+
+
+# Applies the request's advisory=ref / fields= options to one result
+def shape_result(req, result, kb_version=None):
+    if kb_version and (req.values.get("advisory") == "ref"
+                       or req.values.get("fields") == "compact"):
+        result = reference_advisory(result, kb_version)
+
+    fields = parse_fields(req.values.get("fields"))
+    return select_fields(result, fields) if fields else result
+
+
+# JSON or msgpack per the request; compression is left to compress_response
+def encoded_response(req, body, status=200):
+    if wants_msgpack(req):
+        response = Response(
+            msgpack.packb(body, use_bin_type=True), status,
+            mimetype=MSGPACK_TYPES[0]
+        )
+    else:
+        response = Response(dumps_json(body), status, mimetype="application/json")
+    response.vary.add("Accept")
+    return response
+
+
+def negotiated_response(req, result, status=200, kb_version=None):
+    return encoded_response(req, shape_result(req, result, kb_version), status)
+
+
+# =====================================================
+# 🗜️ COMPRESSION
+# =====================================================
+def choose_encoding(req):
+    accept = req.accept_encodings
+    if brotli is not None and accept["br"]:
+        return "br"
+    if accept["gzip"]:
+        return "gzip"
+    return None
+
+
+def compress_response(req, response):
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = choose_encoding(req)
+    data = response.get_data()
+    if encoding is None or len(data) < RESPONSE_COMPRESS_MIN:
+        return response
+
+    if encoding == "br":
+        data = brotli.compress(data, quality=RESPONSE_BROTLI_QUALITY)
+    else:
+        data = gzip.compress(data, compresslevel=RESPONSE_GZIP_LEVEL, mtime=0)
+    response.set_data(data)
+    response.headers["Content-Encoding"] = encoding
+    return response
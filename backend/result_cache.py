@@ -0,0 +1,120 @@
+import copy
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+# ---------- CONFIG ----------
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", 1024))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", 24 * 3600))
+# Max Hamming distance between 64-bit dHashes to count as a near-duplicate;
+# a negative value disables perceptual matching.
+RESULT_CACHE_PHASH_DISTANCE = int(os.getenv("RESULT_CACHE_PHASH_DISTANCE", -1))
+
+
+# =====================================================
+# 🔑 IMAGE HASHES
+# =====================================================
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def perceptual_hash(image_bgr):
+    gray = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+# =====================================================
+# 🗃️ LRU + TTL RESULT CACHE
+# =====================================================
+# Maps (image hash, model version, knowledge-base version) to a cached
+# analysis entry:
+#   {"result": analyze_with_image(...), "explain_image": path,
+#    "voice": {lang: path}}
+class ResultCache:
+    def __init__(self, max_entries=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL,
+                 phash_distance=RESULT_CACHE_PHASH_DISTANCE):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.phash_distance = phash_distance
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _live(self, key, now):
+        item = self._entries.get(key)
+        if item is None:
+            return None
+
+        stored_at, _, _ = item
+        if now - stored_at > self.ttl:
+            del self._entries[key]
+            self.expirations += 1
+            return None
+
+        self._entries.move_to_end(key)
+        return item
+
+    def get(self, key):
+        with self._lock:
+            item = self._live(key, time.monotonic())
+            if item is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return item[2]
+
+    def get_similar(self, phash):
+        if self.phash_distance < 0 or phash is None:
+            return None
+
+        with self._lock:
+            now = time.monotonic()
+            for key, (_, entry_phash, _) in list(self._entries.items()):
+                if entry_phash is None:
+                    continue
+                if bin(entry_phash ^ phash).count("1") <= self.phash_distance:
+                    item = self._live(key, now)
+                    if item is not None:
+                        self.near_hits += 1
+                        return item[2]
+        return None
+
+    def put(self, key, entry, phash=None):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), phash, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": (
+                round((self.hits + self.near_hits) / lookups, 4) if lookups else 0.0
+            )
+        }
+
+
+def cached_result(entry):
+    return copy.deepcopy(entry["result"])
@@ -0,0 +1,275 @@
+import argparse
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+from risk_engine import (
+    SEVERITIES, SEVERITY_RISK_MAP, assess_risk, estimated_leaf_wetness, padded_matrix,
+    pressure_windows, series_step_hours
+)
+from storage import get_connection, transaction
+from weather_service import normalize_city
+
+# ---------- CONFIG ----------
+ALERT_INTERVAL = float(os.getenv("ALERT_INTERVAL", 3600))
+# Alert when the forecast risk score reaches this (default: High)
+ALERT_RISK_THRESHOLD = float(os.getenv("ALERT_RISK_THRESHOLD", SEVERITY_RISK_MAP["High"]))
+ALERT_COOLDOWN_HOURS = float(os.getenv("ALERT_COOLDOWN_HOURS", 24))
+ALERT_HORIZON_HOURS = float(os.getenv("ALERT_HORIZON_HOURS", 48))
+# Concurrent forecast fetches (one per distinct location)
+ALERT_FETCH_WORKERS = int(os.getenv("ALERT_FETCH_WORKERS", 16))
+
+# Cool-down is re-checked inside the insert, so overlapping runs (e.g. one
+# scheduler per server process) never queue the same farm twice
+ALERT_INSERT_SQL = """
+INSERT INTO alert_outbox
+(farm_id, crop, city, contact, severity, risk_score, window_start, window_end)
+SELECT farm_id, crop, city, contact, ?, ?, ?, ?
+FROM farms
+WHERE farm_id = ?
+  AND (last_alert_at IS NULL OR last_alert_at <= datetime(?, 'unixepoch'))
+"""
+ALERT_MARK_SQL = """
+UPDATE farms SET last_alert_at = datetime(?, 'unixepoch')
+WHERE farm_id = ?
+  AND (last_alert_at IS NULL OR last_alert_at <= datetime(?, 'unixepoch'))
+"""
+FARM_UPSERT_SQL = """
+INSERT INTO farms (farm_id, crop, city, location_key, contact)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (farm_id) DO UPDATE SET
+    crop = excluded.crop,
+    city = excluded.city,
+    location_key = excluded.location_key,
+    contact = excluded.contact
+"""
+ALERT_COLUMNS = (
+    "alert_id", "farm_id", "crop", "city", "contact", "severity", "risk_score",
+    "window_start", "window_end", "created_at"
+)
+
+
+def utc_time(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+# ---------- FARMS ----------
+def farm_row(data):
+    crop, city = data.get("crop"), data.get("city")
+    if not crop or not normalize_city(city):
+        raise ValueError("crop and city are required")
+    return (
+        str(data.get("farm_id") or uuid.uuid4().hex),
+        crop,
+        city,
+        normalize_city(city),
+        data.get("contact")
+    )
+
+
+def register_farms(conn, farms):
+    rows = [farm_row(farm) for farm in farms]
+    with conn:
+        conn.executemany(FARM_UPSERT_SQL, rows)
+    return [row[0] for row in rows]
+
+
+# ---------- OUTBOX ----------
+def pending_alerts(conn, after=0, limit=500):
+    rows = conn.execute(
+        f"SELECT {', '.join(ALERT_COLUMNS)} FROM alert_outbox "
+        "WHERE sent_at IS NULL AND alert_id > ? ORDER BY alert_id LIMIT ?",
+        (after, limit)
+    ).fetchall()
+    return [dict(zip(ALERT_COLUMNS, row)) for row in rows]
+
+
+def mark_sent(conn, alert_ids):
+    with conn:
+        return conn.executemany(
+            "UPDATE alert_outbox SET sent_at = CURRENT_TIMESTAMP "
+            "WHERE alert_id = ? AND sent_at IS NULL",
+            [(alert_id,) for alert_id in alert_ids]
+        ).rowcount
+
+
+# =====================================================
+# ⏰ PROACTIVE RISK ALERTS
+# =====================================================
+# Every interval: load the farms out of cool-down, fetch one forecast per
+# distinct location, score each distinct (location, crop) pair over the
+# horizon in one vectorized call, and queue an outbox alert for every farm
+# whose peak risk reaches the threshold.
+#   forecast: fn(city) -> {"times", "temperature", "humidity"} or None,
+#             e.g. WeatherClient(ForecastProvider(...)).get
+class RiskAlertScheduler:
+    def __init__(self, forecast, interval=ALERT_INTERVAL,
+                 threshold=ALERT_RISK_THRESHOLD, cooldown_hours=ALERT_COOLDOWN_HOURS,
+                 horizon_hours=ALERT_HORIZON_HOURS, workers=ALERT_FETCH_WORKERS):
+        self.forecast = forecast
+        self.interval = interval
+        self.threshold = threshold
+        self.cooldown = cooldown_hours * 3600
+        self.horizon = horizon_hours * 3600
+        self.workers = max(1, workers)
+        # Lowest severity level whose risk score reaches the threshold
+        self.min_level = next(
+            (level for level, name in enumerate(SEVERITIES)
+             if SEVERITY_RISK_MAP[name] >= threshold),
+            len(SEVERITIES)
+        )
+
+        self._lock = threading.Lock()
+        self._thread = None
+        self.counters = {"runs": 0, "failed_runs": 0, "alerts": 0}
+        self.last_run = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None and self.interval > 0:
+                self._thread = threading.Thread(
+                    target=self._run, name="risk-alerts", daemon=True
+                )
+                self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.run_once()
+            except Exception:
+                self.counters["failed_runs"] += 1
+                traceback.print_exc()
+
+    # ---------- ONE RUN ----------
+    def _fetch_forecasts(self, cities):
+        def fetch(city):
+            try:
+                return self.forecast(city)
+            except Exception:
+                return None
+
+        with ThreadPoolExecutor(self.workers) as pool:
+            return dict(zip(cities, pool.map(fetch, cities.values())))
+
+    def _horizon(self, forecast, now):
+        times = np.asarray(forecast.get("times") or [], dtype=float)
+        keep = (times >= now - 3 * 3600) & (times <= now + self.horizon)
+        return {
+            "times": times[keep],
+            "temperature": np.asarray(forecast["temperature"], dtype=float)[keep],
+            "humidity": np.asarray(forecast["humidity"], dtype=float)[keep]
+        }
+
+    def run_once(self, now=None):
+        started = time.perf_counter()
+        now = time.time() if now is None else now
+        conn = get_connection()
+
+        farms = conn.execute(
+            "SELECT farm_id, crop, city, location_key FROM farms "
+            "WHERE last_alert_at IS NULL OR last_alert_at <= datetime(?, 'unixepoch') "
+            "ORDER BY location_key",
+            (now - self.cooldown,)
+        ).fetchall()
+
+        # ---------- ONE FORECAST PER LOCATION ----------
+        cities = {}
+        for _, _, city, location in farms:
+            cities.setdefault(location, city)
+        forecasts = {
+            location: self._horizon(forecast, now)
+            for location, forecast in self._fetch_forecasts(cities).items()
+            if forecast
+        }
+
+        # ---------- ONE ROW PER (LOCATION, CROP) ----------
+        pairs, pair_index, farm_pairs = [], {}, []
+        for farm_id, crop, _, location in farms:
+            if location not in forecasts:
+                continue
+            key = (location, crop)
+            if key not in pair_index:
+                pair_index[key] = len(pairs)
+                pairs.append(key)
+            farm_pairs.append((farm_id, pair_index[key]))
+
+        alerts = []
+        if pairs:
+            series = [forecasts[location] for location, _ in pairs]
+            # Forecasts are 3-hourly; the step converts wetness windows (hours)
+            step_hours = float(np.median([series_step_hours(s["times"]) for s in series]))
+            humidity = padded_matrix([s["humidity"] for s in series])
+            risk = assess_risk(
+                humidity,
+                padded_matrix([s["temperature"] for s in series]),
+                crop=[crop for _, crop in pairs],
+                leaf_wetness=estimated_leaf_wetness(humidity, step_hours),
+                step_hours=step_hours
+            )
+            peak = risk["level"].max(axis=1, initial=0)
+            windows = pressure_windows(risk["level"], self.min_level)
+
+            pair_alerts = {}
+            for i in np.flatnonzero(peak >= self.min_level):
+                if not windows[i]:
+                    continue  # empty horizon
+                start, end, _ = windows[i][0]
+                times = series[i]["times"]
+                pair_alerts[i] = (
+                    SEVERITIES[peak[i]], SEVERITY_RISK_MAP[SEVERITIES[peak[i]]],
+                    utc_time(times[start]), utc_time(times[end - 1])
+                )
+            alerts = [
+                pair_alerts[i] + (farm_id, now - self.cooldown)
+                for farm_id, i in farm_pairs if i in pair_alerts
+            ]
+
+        # ---------- OUTBOX + COOL-DOWN IN ONE TRANSACTION ----------
+        queued = 0
+        if alerts:
+            with transaction() as db:
+                queued = db.executemany(ALERT_INSERT_SQL, alerts).rowcount
+                db.executemany(ALERT_MARK_SQL, [
+                    (now, alert[4], alert[5]) for alert in alerts
+                ])
+
+        self.counters["runs"] += 1
+        self.counters["alerts"] += queued
+        self.last_run = {
+            "at": utc_time(now),
+            "farms": len(farms),
+            "locations": len(cities),
+            "locations_without_forecast": len(cities) - len(forecasts),
+            "pairs": len(pairs),
+            "alerts": queued,
+            "seconds": round(time.perf_counter() - started, 3)
+        }
+        return self.last_run
+
+    def stats(self):
+        return dict(self.counters, interval=self.interval, last_run=self.last_run)
+
+
+def main():
+    from weather_service import ForecastProvider, OpenWeatherProvider, WeatherClient
+
+    parser = argparse.ArgumentParser(
+        description="Evaluate every registered farm against forecast weather once"
+    )
+    parser.add_argument("--api-key", default=os.getenv("WEATHER_API_KEY"))
+    args = parser.parse_args()
+
+    client = WeatherClient(ForecastProvider(OpenWeatherProvider(args.api_key)))
+    print(RiskAlertScheduler(client.get).run_once())
+
+
+if __name__ == "__main__":
+    main()
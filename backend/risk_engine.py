@@ -0,0 +1,160 @@
+import json
+import os
+
+import numpy as np
+
+# Resolved from this file so the Streamlit client can load it offline
+RISK_RULES_PATH = os.getenv(
+    "RISK_RULES_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "risk_rules.json")
+)
+
+SEVERITIES = ("Low", "Medium", "High")
+RISK_SCORES = (0.2, 0.5, 0.8)
+SEVERITY_RISK_MAP = dict(zip(SEVERITIES, RISK_SCORES))
+
+_SEVERITY_ARRAY = np.array(SEVERITIES)
+_RISK_ARRAY = np.array(RISK_SCORES)
+
+# ---------- RULE TABLE ----------
+# "default" thresholds, overridden key by key under "crops": {crop: {...}}
+#   humidity_medium:  humidity (%) above which severity is at least Medium
+#   humidity_high / temperature_high: both exceeded -> High
+#   wetness_hours / wetness_window: that many leaf-wetness hours within the
+#     trailing window (in hours) raise severity one level
+with open(RISK_RULES_PATH) as f:
+    RISK_RULES = json.load(f)
+
+RULE_KEYS = tuple(RISK_RULES["default"])
+# Relative humidity (%) at which a step counts as leaf-wet when no sensor
+# reading exists (forecast series)
+LEAF_WET_HUMIDITY = 90
+
+
+def rules_for(crop=None):
+    return dict(RISK_RULES["default"], **RISK_RULES["crops"].get(crop, {}))
+
+
+# Scalars for one crop; for a crop per row, (rows, 1, ...) columns that
+# broadcast along the time axis
+def _rule_arrays(crop, ndim):
+    if crop is None or isinstance(crop, str):
+        return rules_for(crop)
+
+    per_crop = {name: rules_for(name) for name in set(crop)}
+    shape = (len(crop),) + (1,) * (ndim - 1)
+    return {
+        key: np.array([per_crop[name][key] for name in crop]).reshape(shape)
+        for key in RULE_KEYS
+    }
+
+
+# Stacks series of different lengths into one (rows, steps) matrix; the
+# padding (and any missing series) is NaN, which scores Low
+def padded_matrix(series, steps=None):
+    series = [[] if values is None else values for values in series]
+    steps = max(map(len, series), default=0) if steps is None else steps
+    matrix = np.full((len(series), steps), np.nan)
+    for row, values in enumerate(series):
+        matrix[row, :len(values)] = np.asarray(values, dtype=float)
+    return matrix
+
+
+# Hours between readings, from epoch-second timestamps (1 when unknown)
+def series_step_hours(times):
+    steps = np.diff(np.asarray(times, dtype=float)) / 3600
+    steps = steps[steps > 0]
+    return float(np.median(steps)) if len(steps) else 1.0
+
+
+# Leaf-wetness hours per step estimated from humidity alone
+def estimated_leaf_wetness(humidity, step_hours=1):
+    return np.where(np.asarray(humidity, dtype=float) >= LEAF_WET_HUMIDITY, step_hours, 0.0)
+
+
+# Sum of each step and the window - 1 steps before it, along the last axis
+def trailing_sum(values, window):
+    if values.ndim == 0:
+        return values
+    steps = values.shape[-1]
+    csum = np.concatenate(
+        [np.zeros(values.shape[:-1] + (1,)), np.cumsum(values, axis=-1)], axis=-1
+    )
+    start = np.clip(np.arange(1, steps + 1) - np.asarray(window), 0, None)
+    start = np.broadcast_to(start, values.shape)
+    return csum[..., 1:] - np.take_along_axis(csum, start, axis=-1)
+
+
+# =====================================================
+# 🌦 VECTORIZED RISK ENGINE
+# =====================================================
+# humidity / temperature (and optional leaf-wetness hours per step) are
+# scalars, series, or (fields, steps) matrices; crop is one name or one per
+# field. step_hours is the spacing of the series (e.g. 3 for OpenWeather
+# forecasts) and converts the wetness window to steps. Missing readings (NaN)
+# score Low. Returns severity level (0-2), severity names and risk scores
+# with the input's shape.
+def severity_levels(humidity, temperature, crop=None, leaf_wetness=None, step_hours=1):
+    if not step_hours > 0:
+        raise ValueError("step_hours must be positive")
+
+    humidity, temperature = np.broadcast_arrays(
+        np.asarray(humidity, dtype=float), np.asarray(temperature, dtype=float)
+    )
+    rules = _rule_arrays(crop, humidity.ndim)
+
+    level = np.where(humidity > rules["humidity_medium"], 1, 0)
+    level = np.where(
+        (humidity > rules["humidity_high"]) & (temperature > rules["temperature_high"]),
+        2, level
+    )
+
+    if leaf_wetness is not None:
+        wet = np.broadcast_to(
+            np.nan_to_num(np.asarray(leaf_wetness, dtype=float)), humidity.shape
+        )
+        window = np.maximum(np.rint(np.asarray(rules["wetness_window"]) / step_hours), 1)
+        wet_hours = trailing_sum(wet, window.astype(int))
+        level = np.minimum(level + (wet_hours >= rules["wetness_hours"]), 2)
+
+    missing = np.isnan(humidity) | np.isnan(temperature)
+    return np.where(missing, 0, level).astype(np.int8)
+
+
+def assess_risk(humidity, temperature, crop=None, leaf_wetness=None, step_hours=1):
+    level = severity_levels(humidity, temperature, crop, leaf_wetness, step_hours)
+    return {
+        "level": level,
+        "severity": _SEVERITY_ARRAY[level],
+        "risk_score": _RISK_ARRAY[level]
+    }
+
+
+# ---------- DISEASE-PRESSURE WINDOWS ----------
+# Runs of at least min_length consecutive steps at or above min_level, as
+# (start, end, peak_level) with end exclusive. A 2-D input returns one
+# list per row.
+def pressure_windows(level, min_level=1, min_length=1):
+    level = np.asarray(level)
+    rows = np.atleast_2d(level)
+    n, steps = rows.shape
+
+    active = np.zeros((n, steps + 2), dtype=np.int8)
+    active[:, 1:-1] = rows >= min_level
+    edges = np.diff(active, axis=1)
+    starts = np.argwhere(edges == 1)
+    ends = np.argwhere(edges == -1)
+
+    windows = [[] for _ in range(n)]
+    if len(starts):
+        # Both are in row-major order, so the k-th start pairs with the k-th end
+        flat = np.append(rows.ravel(), 0)
+        bounds = np.column_stack([
+            starts[:, 0] * steps + starts[:, 1], ends[:, 0] * steps + ends[:, 1]
+        ]).ravel()
+        peaks = np.maximum.reduceat(flat, bounds)[::2]
+        for (row, start), (_, end), peak in zip(starts, ends, peaks):
+            if end - start >= min_length:
+                windows[row].append((int(start), int(end), int(peak)))
+
+    return windows if level.ndim > 1 else windows[0]
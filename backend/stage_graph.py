@@ -0,0 +1,92 @@
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from metrics import bind_context, current_context, stage
+
+STAGE_WORKERS = int(os.getenv("STAGE_WORKERS", 32))
+STAGE_EXECUTOR = ThreadPoolExecutor(max_workers=STAGE_WORKERS,
+                                    thread_name_prefix="stage")
+
+
+def _transfer(source, target):
+    error = source.exception()
+    if error is not None:
+        target.set_exception(error)
+    else:
+        target.set_result(source.result())
+
+
+def _value(future):
+    return None if future.exception() is not None else future.result()
+
+
+# =====================================================
+# 🕸️ REQUEST STAGE GRAPH
+# =====================================================
+# Stages run on a shared thread pool as soon as their dependencies finish,
+# so request latency follows the critical path instead of the sum of all
+# stages. Each stage receives its dependencies' results as keyword
+# arguments. Deadlines are seconds from the start of run(); an optional
+# stage that fails or misses its deadline yields None instead of failing
+# the request (its task keeps running in the background).
+class StageGraph:
+    def __init__(self, executor=None):
+        self.executor = executor or STAGE_EXECUTOR
+        self.stages = {}
+        self.path, self.timings = current_context()
+
+    def add(self, name, fn, deps=(), deadline=None, optional=False):
+        missing = [d for d in deps if d not in self.stages]
+        if missing:
+            raise ValueError(f"Stage {name} depends on unknown stages {missing}")
+        self.stages[name] = (fn, tuple(deps), deadline, optional)
+        return self
+
+    def run(self):
+        started = time.monotonic()
+        futures = {name: Future() for name in self.stages}
+        submitted = set()
+        lock = threading.Lock()
+
+        def launch(name):
+            fn, deps, _, _ = self.stages[name]
+            kwargs = {d: _value(futures[d]) for d in deps}
+
+            def task():
+                with bind_context(self.path, self.timings), stage(name):
+                    return fn(**kwargs)
+
+            self.executor.submit(task).add_done_callback(
+                lambda f: _transfer(f, futures[name])
+            )
+
+        def schedule(_=None):
+            with lock:
+                ready = [
+                    name for name, (_, deps, _, _) in self.stages.items()
+                    if name not in submitted
+                    and all(futures[d].done() for d in deps)
+                ]
+                submitted.update(ready)
+            for name in ready:
+                launch(name)
+
+        for future in futures.values():
+            future.add_done_callback(schedule)
+        schedule()
+
+        results = {}
+        for name, (_, _, deadline, optional) in self.stages.items():
+            timeout = (
+                None if deadline is None
+                else max(0.0, started + deadline - time.monotonic())
+            )
+            try:
+                results[name] = futures[name].result(timeout)
+            except Exception:
+                if not optional:
+                    raise
+                results[name] = None
+        return results
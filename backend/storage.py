@@ -0,0 +1,427 @@
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+# ---------- CONFIG ----------
+DB_PATH = os.getenv("DB_PATH", "cropguard.db")
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", 5000))
+DB_CACHE_KB = int(os.getenv("DB_CACHE_KB", 16384))
+# Write-behind for report inserts: commit every N rows or M ms, whichever
+# comes first. A batch size of 1 writes synchronously.
+DB_WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", 1))
+DB_WRITE_BATCH_MS = float(os.getenv("DB_WRITE_BATCH_MS", 50))
+
+
+# =====================================================
+# 🔌 CONNECTIONS
+# =====================================================
+def connect(path=DB_PATH):
+    conn = sqlite3.connect(path, timeout=DB_BUSY_TIMEOUT_MS / 1000)
+    conn.execute("PRAGMA journal_mode = WAL")
+    # WAL keeps the database consistent with NORMAL; only the last
+    # transactions before a power loss can be lost.
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size = -{DB_CACHE_KB}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+
+# One connection per thread; sqlite3 connections must not be shared
+_local = threading.local()
+
+
+def get_connection():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = connect()
+    return conn
+
+
+@contextmanager
+def transaction():
+    conn = get_connection()
+    with conn:
+        yield conn
+
+
+# =====================================================
+# 🧱 SCHEMA MIGRATIONS
+# =====================================================
+# Applied in order inside one transaction; PRAGMA user_version records the
+# last applied step. Steps must be safe on databases created before
+# migrations existed (tables already present, columns maybe missing).
+def columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def add_column(conn, table, column, decl):
+    if column not in columns(conn, table):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def _create_crop_reports(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS crop_reports (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        report_id TEXT UNIQUE,
+        crop TEXT,
+        disease TEXT,
+        severity TEXT,
+        confidence REAL,
+        advisory TEXT,
+        expert_enabled INTEGER,
+        voice_summary TEXT,
+        explainability_image TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+
+def _add_pdf_report(conn):
+    add_column(conn, "crop_reports", "pdf_report", "TEXT")
+
+
+def _add_offline_mode(conn):
+    add_column(conn, "crop_reports", "offline_mode", "INTEGER NOT NULL DEFAULT 0")
+
+
+def _create_artifact_jobs(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS artifact_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        report_id TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        payload TEXT,
+        status TEXT NOT NULL DEFAULT 'pending',
+        value TEXT,
+        error TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        available_at REAL NOT NULL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (report_id, kind)
+    )
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_artifact_jobs_status "
+        "ON artifact_jobs (status, available_at)"
+    )
+
+
+# Dashboard queries read per-day counts instead of scanning crop_reports;
+# triggers keep the rollup in step with every insert and delete.
+def _add_report_indexes_and_rollups(conn):
+    for column in ("crop", "disease", "severity"):
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_crop_reports_{column}_created "
+            f"ON crop_reports ({column}, created_at, id)"
+        )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_crop_reports_created "
+        "ON crop_reports (created_at, id)"
+    )
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS report_daily_counts (
+        day TEXT NOT NULL,
+        crop TEXT NOT NULL,
+        disease TEXT NOT NULL,
+        severity TEXT NOT NULL,
+        reports INTEGER NOT NULL DEFAULT 0,
+        confidence_sum REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, crop, disease, severity)
+    ) WITHOUT ROWID
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_crop_reports_rollup_insert
+    AFTER INSERT ON crop_reports
+    BEGIN
+        INSERT INTO report_daily_counts
+            (day, crop, disease, severity, reports, confidence_sum)
+        VALUES (
+            date(NEW.created_at), COALESCE(NEW.crop, ''),
+            COALESCE(NEW.disease, ''), COALESCE(NEW.severity, ''),
+            1, COALESCE(NEW.confidence, 0)
+        )
+        ON CONFLICT (day, crop, disease, severity) DO UPDATE SET
+            reports = reports + 1,
+            confidence_sum = confidence_sum + excluded.confidence_sum;
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_crop_reports_rollup_delete
+    AFTER DELETE ON crop_reports
+    BEGIN
+        UPDATE report_daily_counts SET
+            reports = reports - 1,
+            confidence_sum = confidence_sum - COALESCE(OLD.confidence, 0)
+        WHERE day = date(OLD.created_at)
+          AND crop = COALESCE(OLD.crop, '')
+          AND disease = COALESCE(OLD.disease, '')
+          AND severity = COALESCE(OLD.severity, '');
+    END
+    """)
+
+    # Backfill from reports stored before the rollup existed
+    conn.execute("DELETE FROM report_daily_counts")
+    conn.execute("""
+    INSERT INTO report_daily_counts
+        (day, crop, disease, severity, reports, confidence_sum)
+    SELECT date(created_at), COALESCE(crop, ''), COALESCE(disease, ''),
+           COALESCE(severity, ''), COUNT(*), COALESCE(SUM(confidence), 0)
+    FROM crop_reports
+    GROUP BY 1, 2, 3, 4
+    """)
+
+
+# Append-only replacement for feedback/feedback_data.json. import_key is
+# set only on rows imported from that file so re-running the import is a no-op.
+def _create_feedback(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS feedback (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        report_id TEXT REFERENCES crop_reports (report_id) ON DELETE SET NULL,
+        type TEXT NOT NULL,
+        crop TEXT,
+        disease TEXT,
+        confidence REAL,
+        correct INTEGER,
+        outcome TEXT,
+        yield_change TEXT,
+        days_after_treatment INTEGER,
+        comment TEXT,
+        payload TEXT,
+        import_key TEXT UNIQUE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    for name, columns in (
+        ("report", "report_id, created_at"),
+        ("type", "type, created_at"),
+        ("created", "created_at, id"),
+    ):
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_feedback_{name} ON feedback ({columns})"
+        )
+
+
+# Bulk offline sync: client-generated record ids make retried chunks
+# idempotent; sync_devices keeps each device's resume cursor.
+def _add_offline_sync(conn):
+    add_column(conn, "crop_reports", "weather_data", "TEXT")
+    add_column(conn, "crop_reports", "client_record_id", "TEXT")
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_crop_reports_client_record "
+        "ON crop_reports (client_record_id)"
+    )
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS sync_devices (
+        device_id TEXT PRIMARY KEY,
+        cursor INTEGER NOT NULL DEFAULT 0,
+        records INTEGER NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+
+# Resumable uploads of original images, keyed by content hash
+def _create_upload_sessions(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS upload_sessions (
+        upload_id TEXT PRIMARY KEY,
+        sha256 TEXT NOT NULL UNIQUE,
+        filename TEXT,
+        size INTEGER NOT NULL,
+        report_id TEXT,
+        path TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        completed_at TIMESTAMP
+    )
+    """)
+
+
+# Proactive alerts: registered farms (crop + city) and an outbox of risk
+# alerts for a dispatcher to deliver; last_alert_at drives the cool-down.
+def _create_farm_alerts(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS farms (
+        farm_id TEXT PRIMARY KEY,
+        crop TEXT NOT NULL,
+        city TEXT NOT NULL,
+        location_key TEXT NOT NULL,
+        contact TEXT,
+        last_alert_at TIMESTAMP,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_farms_location ON farms (location_key, crop)"
+    )
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS alert_outbox (
+        alert_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        farm_id TEXT NOT NULL REFERENCES farms (farm_id) ON DELETE CASCADE,
+        crop TEXT,
+        city TEXT,
+        contact TEXT,
+        severity TEXT NOT NULL,
+        risk_score REAL,
+        window_start TIMESTAMP,
+        window_end TIMESTAMP,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        sent_at TIMESTAMP
+    )
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_alert_outbox_unsent "
+        "ON alert_outbox (alert_id) WHERE sent_at IS NULL"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_alert_outbox_farm ON alert_outbox (farm_id)"
+    )
+
+
+# Worker leases: a running job whose claimed_at is older than the lease
+# belongs to a dead worker and may be claimed again by any process.
+def _add_artifact_leases(conn):
+    add_column(conn, "artifact_jobs", "claimed_at", "REAL")
+    add_column(conn, "artifact_jobs", "owner", "TEXT")
+
+
+MIGRATIONS = [
+    (1, _create_crop_reports),
+    (2, _add_pdf_report),
+    (3, _add_offline_mode),
+    (4, _create_artifact_jobs),
+    (5, _add_report_indexes_and_rollups),
+    (6, _create_feedback),
+    (7, _add_offline_sync),
+    (8, _create_upload_sessions),
+    (9, _create_farm_alerts),
+    (10, _add_artifact_leases),
+]
+
+
+def migrate(conn=None):
+    conn = conn or get_connection()
+    # IMMEDIATE takes the write lock up front, so concurrent processes
+    # starting together apply each step exactly once.
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for target, step in MIGRATIONS:
+            if target > version:
+                step(conn)
+                conn.execute(f"PRAGMA user_version = {target}")
+                version = target
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return version
+
+
+# =====================================================
+# ✍️ WRITE-BEHIND QUEUE
+# =====================================================
+# Rows for one INSERT statement are grouped into a single executemany
+# transaction. after_commit callbacks run once the row is durable (or
+# immediately after the synchronous insert when batching is off).
+class WriteBehind:
+    def __init__(self, sql, batch_size=DB_WRITE_BATCH_SIZE,
+                 interval_ms=DB_WRITE_BATCH_MS, name="writer"):
+        self.sql = sql
+        self.batch_size = max(1, batch_size)
+        self.interval = interval_ms / 1000
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.counters = {"rows": 0, "batches": 0, "errors": 0}
+
+    def submit(self, row, after_commit=None):
+        if self.batch_size == 1:
+            with transaction() as conn:
+                conn.execute(self.sql, row)
+            self.counters["rows"] += 1
+            self.counters["batches"] += 1
+            if after_commit:
+                after_commit()
+            return
+
+        self._start()
+        self._queue.put((row, after_commit))
+
+    def flush(self, timeout=None):
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self._queue.put((None, done.set))
+        return done.wait(timeout)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name=self.name, daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.flush, 5)
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            deadline = time.monotonic() + self.interval
+            while len(items) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(items)
+
+    def _write(self, items):
+        rows = [row for row, _ in items if row is not None]
+        failed = set()
+        if rows:
+            conn = get_connection()
+            try:
+                with conn:
+                    conn.executemany(self.sql, rows)
+            except sqlite3.Error:
+                # One bad row must not take the rest of the batch with it
+                traceback.print_exc()
+                for row in rows:
+                    try:
+                        with conn:
+                            conn.execute(self.sql, row)
+                    except sqlite3.Error:
+                        failed.add(id(row))
+            self.counters["rows"] += len(rows) - len(failed)
+            self.counters["errors"] += len(failed)
+            self.counters["batches"] += 1
+
+        for row, callback in items:
+            if callback and id(row) not in failed:
+                try:
+                    callback()
+                except Exception:
+                    traceback.print_exc()
+
+    def stats(self):
+        return dict(
+            self.counters,
+            queue_depth=self._queue.qsize(),
+            batch_size=self.batch_size,
+            interval_ms=self.interval * 1000
+        )
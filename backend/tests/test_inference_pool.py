@@ -0,0 +1,95 @@
+import os
+import subprocess
+import sys
+import textwrap
+import time
+
+import numpy as np
+import pytest
+
+import inference_pool
+from inference_pool import InferencePool
+
+INPUT_SHAPE = (4, 4, 3)
+NUM_CLASSES = 3
+HEATMAP_SHAPE = (2, 2)
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# Stands in for the Keras model in the worker: class scores are the mean
+# pixel times 1, 2, 3 and the heatmap is all ones
+def load_stub_engine(model_path):
+    def predict(batch):
+        return batch.mean(axis=(1, 2, 3))[:, None] * np.arange(1, NUM_CLASSES + 1)
+
+    def explain(batch):
+        return predict(batch), np.ones((len(batch), *HEATMAP_SHAPE), dtype=np.float32)
+
+    return predict, explain
+
+
+def wait_for(condition, timeout=30):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.05)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(inference_pool, "HEALTH_INTERVAL", 0.1)
+    pool = InferencePool(
+        "unused.h5", INPUT_SHAPE, NUM_CLASSES, HEATMAP_SHAPE,
+        workers=1, slots=4, loader=load_stub_engine
+    )
+    yield pool
+    pool.shutdown()
+
+
+def test_prediction_and_respawn(pool):
+    tensor = np.full(INPUT_SHAPE, 0.5, dtype=np.float32)
+
+    np.testing.assert_allclose(pool.predict(tensor, timeout=30), [0.5, 1.0, 1.5])
+
+    worker = pool._workers[0]
+    old_pid = worker.process.pid
+    worker.process.kill()
+    wait_for(lambda: pool.stats()["workers"][0]["restarts"] == 1)
+
+    preds, heatmap = pool.predict(tensor, explain=True, timeout=30)
+    np.testing.assert_allclose(preds, [0.5, 1.0, 1.5])
+    assert heatmap.shape == HEATMAP_SHAPE
+    assert worker.process.pid != old_pid
+
+
+# A server started as `python app.py` must not run its startup again in
+# every spawned worker
+def test_workers_do_not_rerun_main_script(tmp_path):
+    script = tmp_path / "server.py"
+    script.write_text(textwrap.dedent(f"""
+        import numpy as np
+        from inference_pool import InferencePool
+        from test_inference_pool import load_stub_engine
+
+        print("startup", flush=True)
+
+        if __name__ == "__main__":
+            pool = InferencePool(
+                "unused.h5", {INPUT_SHAPE}, {NUM_CLASSES}, {HEATMAP_SHAPE},
+                workers=1, slots=1, loader=load_stub_engine
+            )
+            print(pool.predict(np.ones({INPUT_SHAPE}, dtype=np.float32), timeout=30))
+            pool.shutdown()
+    """))
+
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        [BACKEND_DIR, os.path.join(BACKEND_DIR, "tests")]
+    ))
+    output = subprocess.run(
+        [sys.executable, str(script)], capture_output=True, text=True,
+        env=env, timeout=60, check=True
+    ).stdout
+
+    assert output.count("startup") == 1
+    assert "[1. 2. 3.]" in output
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from decision_logic import assess_severity
+from risk_engine import assess_risk
+
+
+# The rule assess_severity implemented before the risk engine existed
+def baseline_severity(humidity, temperature):
+    if humidity > 75 and temperature > 30:
+        return "High"
+    elif humidity > 60:
+        return "Medium"
+    return "Low"
+
+
+READINGS = [
+    (humidity, temperature)
+    for humidity in (0, 40, 60, 60.5, 62, 75, 75.5, 90, 100)
+    for temperature in (-5, 12, 25, 30, 30.5, 40)
+]
+
+
+@pytest.mark.parametrize("crop", [None, "Tomato", "Potato", "Maize", "Apple", "Grape"])
+def test_assess_severity_matches_baseline_rule(crop):
+    for humidity, temperature in READINGS:
+        assert assess_severity(humidity, temperature, crop) == \
+            baseline_severity(humidity, temperature), (humidity, temperature, crop)
+
+
+def test_vectorized_engine_matches_baseline_rule():
+    rng = np.random.default_rng(0)
+    humidity = rng.uniform(0, 100, 20000)
+    temperature = rng.uniform(-10, 45, 20000)
+
+    severity = assess_risk(humidity, temperature)["severity"]
+    expected = [baseline_severity(h, t) for h, t in zip(humidity, temperature)]
+    assert severity.tolist() == expected
@@ -1,43 +1,122 @@
 from gtts import gTTS
 from gtts.tts import gTTSError
+import hashlib
 import os
-import uuid
-import time
+import shutil
+import subprocess
+import tempfile
+
+VOICE_DIR = "static/voice"
+TTS_ENGINE = os.getenv("TTS_ENGINE", "gtts")
+LANGUAGES = ("en", "hi", "mr")
 
-def generate_voice_summary(result, lang_code="en"):
-    try:
 
-        # ---------- TEXT ----------
-        if lang_code == "hi":
-            text = f"""
+# ---------- TEXT ----------
+def build_voice_text(result, lang_code="en"):
+    if lang_code == "hi":
+        return f"""
 फसल {result.get('crop_type')} में
 {result.get('disease_detected')} रोग पाया गया है।
 रोग की गंभीरता {result.get('severity')} है।
 उपचार तुरंत करें।
 """
-        elif lang_code == "mr":
-            text = f"""
+    elif lang_code == "mr":
+        return f"""
 {result.get('crop_type')} पिकामध्ये
 {result.get('disease_detected')} रोग आढळला आहे.
 रोगाची तीव्रता {result.get('severity')} आहे.
 त्वरित उपचार करा.
 """
-        else:
-            text = f"""
+    return f"""
 Crop {result.get('crop_type')} has
 {result.get('disease_detected')} disease.
 Severity level is {result.get('severity')}.
 Immediate treatment is advised.
 """
 
-        os.makedirs("static/voice", exist_ok=True)
-        filename = f"static/voice/{uuid.uuid4().hex}.mp3"
 
-        tts = gTTS(text=text, lang=lang_code, slow=False)
-        tts.save(filename)
+# =====================================================
+# 🔊 TTS ENGINES
+# =====================================================
+class GTTSEngine:
+    name = "gtts"
+    extension = ".mp3"
+    network = True
+
+    def synthesize(self, text, lang_code, out_path):
+        gTTS(text=text, lang=lang_code, slow=False).save(out_path)
+
+
+# Offline engine: espeak-ng (or espeak) writes WAV with no network access
+class EspeakEngine:
+    name = "espeak"
+    extension = ".wav"
+    network = False
+
+    def __init__(self):
+        self.binary = shutil.which("espeak-ng") or shutil.which("espeak")
+
+    def synthesize(self, text, lang_code, out_path):
+        if not self.binary:
+            raise RuntimeError("espeak-ng is not installed")
+        subprocess.run(
+            [self.binary, "-v", lang_code, "-w", out_path, text],
+            check=True, capture_output=True, timeout=30
+        )
+
+
+TTS_ENGINES = {
+    "gtts": GTTSEngine,
+    "espeak": EspeakEngine
+}
+
+
+_engines = {}
 
-        time.sleep(1)  # small delay to reduce rate-limit
 
+def get_engine(name=None):
+    name = name or TTS_ENGINE
+    if name not in _engines:
+        _engines[name] = TTS_ENGINES[name]()
+    return _engines[name]
+
+
+# ---------- CONTENT-ADDRESSED CACHE ----------
+def voice_key(text, lang_code, engine_name):
+    return hashlib.sha256(
+        f"{engine_name}\0{lang_code}\0{text}".encode("utf-8")
+    ).hexdigest()[:32]
+
+
+def voice_file(text, lang_code, engine):
+    key = voice_key(text, lang_code, engine.name)
+    return os.path.join(VOICE_DIR, key + engine.extension)
+
+
+def synthesize_cached(text, lang_code, engine):
+    filename = voice_file(text, lang_code, engine)
+    if os.path.exists(filename):
+        return filename, False
+
+    os.makedirs(VOICE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=VOICE_DIR, suffix=engine.extension + ".tmp"
+    )
+    os.close(fd)
+    try:
+        engine.synthesize(text, lang_code, tmp_path)
+        os.replace(tmp_path, filename)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return filename, True
+
+
+def generate_voice_summary(result, lang_code="en", engine=None):
+    try:
+        engine = engine or get_engine()
+        text = build_voice_text(result, lang_code)
+        filename, _ = synthesize_cached(text, lang_code, engine)
         return "/" + filename.replace("\\", "/")
 
     except gTTSError as e:
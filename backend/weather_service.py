@@ -0,0 +1,287 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# ---------- CONFIG ----------
+WEATHER_API_URL = os.getenv(
+    "WEATHER_API_URL", "https://api.openweathermap.org/data/2.5"
+)
+WEATHER_TTL = float(os.getenv("WEATHER_TTL", 600))
+WEATHER_FORECAST_TTL = float(os.getenv("WEATHER_FORECAST_TTL", 1800))
+WEATHER_STALE_TTL = float(os.getenv("WEATHER_STALE_TTL", 3600))
+WEATHER_NEGATIVE_TTL = float(os.getenv("WEATHER_NEGATIVE_TTL", 3600))
+WEATHER_TIMEOUT = float(os.getenv("WEATHER_TIMEOUT", 3))
+WEATHER_BREAKER_THRESHOLD = int(os.getenv("WEATHER_BREAKER_THRESHOLD", 5))
+WEATHER_BREAKER_COOLDOWN = float(os.getenv("WEATHER_BREAKER_COOLDOWN", 60))
+WEATHER_POOL_SIZE = int(os.getenv("WEATHER_POOL_SIZE", 16))
+# Cities kept in the cache; the least recently used are evicted first
+WEATHER_CACHE_SIZE = int(os.getenv("WEATHER_CACHE_SIZE", 4096))
+
+
+class CityNotFound(Exception):
+    pass
+
+
+def normalize_city(city):
+    return " ".join(str(city).split()).casefold() if city else ""
+
+
+# =====================================================
+# 🔌 PROVIDERS
+# =====================================================
+# A provider turns a normalized city into the weather dict used across the
+# app, raises CityNotFound for unknown cities and any other exception for
+# transient failures. fetch_forecast returns parallel series:
+#   {"times": [unix seconds], "temperature": [...], "humidity": [...]}
+class WeatherProvider:
+    name = "base"
+
+    def fetch(self, city):
+        raise NotImplementedError
+
+    def fetch_forecast(self, city):
+        raise NotImplementedError
+
+
+class OpenWeatherProvider(WeatherProvider):
+    name = "openweather"
+
+    def __init__(self, api_key, base_url=WEATHER_API_URL, timeout=WEATHER_TIMEOUT,
+                 pool_size=WEATHER_POOL_SIZE):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def fetch(self, city):
+        response = self.session.get(
+            f"{self.base_url}/weather",
+            params={"q": city, "appid": self.api_key, "units": "metric"},
+            timeout=self.timeout
+        )
+        if response.status_code == 404:
+            raise CityNotFound(city)
+        response.raise_for_status()
+        data = response.json()
+
+        return {
+            "temperature": data["main"]["temp"],
+            "humidity": data["main"]["humidity"],
+            "weather": data["weather"][0]["description"],
+            "wind_speed": data["wind"]["speed"]
+        }
+
+    # 5-day forecast in 3-hour steps
+    def fetch_forecast(self, city):
+        response = self.session.get(
+            f"{self.base_url}/forecast",
+            params={"q": city, "appid": self.api_key, "units": "metric"},
+            timeout=self.timeout
+        )
+        if response.status_code == 404:
+            raise CityNotFound(city)
+        response.raise_for_status()
+        steps = response.json()["list"]
+
+        return {
+            "times": [step["dt"] for step in steps],
+            "temperature": [step["main"]["temp"] for step in steps],
+            "humidity": [step["main"]["humidity"] for step in steps]
+        }
+
+
+# Serves a provider's forecasts through fetch(), so a WeatherClient can
+# cache them with the same TTLs, single-flight fetches and breaker
+class ForecastProvider(WeatherProvider):
+    name = "forecast"
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.timeout = getattr(provider, "timeout", WEATHER_TIMEOUT)
+
+    def fetch(self, city):
+        return self.provider.fetch_forecast(city)
+
+
+# =====================================================
+# 🌦 CACHED CLIENT
+# =====================================================
+# Bounded LRU TTL cache with stale-while-revalidate, negative caching of
+# unknown cities, single-flight fetches per city and a circuit breaker
+# around the provider.
+class WeatherClient:
+    def __init__(self, provider, ttl=WEATHER_TTL, stale_ttl=WEATHER_STALE_TTL,
+                 negative_ttl=WEATHER_NEGATIVE_TTL,
+                 breaker_threshold=WEATHER_BREAKER_THRESHOLD,
+                 breaker_cooldown=WEATHER_BREAKER_COOLDOWN,
+                 max_entries=WEATHER_CACHE_SIZE):
+        self.provider = provider
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.max_entries = max(1, max_entries)
+
+        # key -> (stored_at, value, ttl), least recently used first
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+        self._failures = 0
+        self._opened_at = None
+        self._trial_inflight = False
+
+        self.counters = {
+            "hits": 0, "stale_hits": 0, "negative_hits": 0, "misses": 0,
+            "fetches": 0, "errors": 0, "short_circuited": 0, "evictions": 0
+        }
+
+    # ---------- CACHE ----------
+    # Entries are useless once past ttl (+ stale_ttl for real values)
+    def _expired(self, entry, now):
+        stored_at, value, ttl = entry
+        return now - stored_at >= ttl + (self.stale_ttl if value is not None else 0)
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry, time.monotonic()):
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return entry
+
+    def _store(self, key, value, ttl):
+        now = time.monotonic()
+        with self._lock:
+            self._cache[key] = (now, value, ttl)
+            self._cache.move_to_end(key)
+            while self._cache:
+                oldest_key, oldest = next(iter(self._cache.items()))
+                if len(self._cache) <= self.max_entries and not self._expired(oldest, now):
+                    break
+                del self._cache[oldest_key]
+                self.counters["evictions"] += 1
+
+    # ---------- CIRCUIT BREAKER ----------
+    # closed -> open after breaker_threshold consecutive failures; once the
+    # cooldown has passed, exactly one caller gets a trial fetch (half-open)
+    # and everyone else is still short-circuited until it reports back.
+    def _breaker_state(self):
+        if self._opened_at is None:
+            return "closed"
+        if self._trial_inflight or (
+                time.monotonic() - self._opened_at >= self.breaker_cooldown):
+            return "half_open"
+        return "open"
+
+    def _breaker_open(self):
+        with self._lock:
+            state = self._breaker_state()
+            if state == "closed":
+                return False
+            if state == "half_open" and not self._trial_inflight:
+                self._trial_inflight = True
+                return False
+            return True
+
+    def _record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_inflight = False
+
+    def _record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_inflight or self._failures >= self.breaker_threshold:
+                # A failed trial re-opens the breaker for another cooldown
+                self._opened_at = time.monotonic()
+            self._trial_inflight = False
+
+    # ---------- FETCH ----------
+    def _fetch(self, key):
+        try:
+            if self._breaker_open():
+                self.counters["short_circuited"] += 1
+                return
+            self.counters["fetches"] += 1
+            try:
+                value = self.provider.fetch(key)
+            except CityNotFound:
+                self._store(key, None, self.negative_ttl)
+                self._record_success()
+                return
+            except Exception:
+                self.counters["errors"] += 1
+                self._record_failure()
+                return
+
+            self._store(key, value, self.ttl)
+            self._record_success()
+        finally:
+            with self._lock:
+                event = self._inflight.pop(key, None)
+            if event:
+                event.set()
+
+    def _start_fetch(self, key, background):
+        with self._lock:
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self._inflight[key] = threading.Event()
+
+        if leader:
+            if background:
+                threading.Thread(target=self._fetch, args=(key,), daemon=True).start()
+            else:
+                self._fetch(key)
+        return event
+
+    def get(self, city):
+        key = normalize_city(city)
+        if not key:
+            return None
+
+        entry = self._lookup(key)
+        if entry is not None:
+            stored_at, value, ttl = entry
+            age = time.monotonic() - stored_at
+            if age < ttl:
+                self.counters["negative_hits" if value is None else "hits"] += 1
+                return value
+            if value is not None:
+                self.counters["stale_hits"] += 1
+                self._start_fetch(key, background=True)
+                return value
+
+        self.counters["misses"] += 1
+        event = self._start_fetch(key, background=False)
+        event.wait(self.provider_timeout())
+
+        entry = self._lookup(key)
+        return entry[1] if entry else None
+
+    def provider_timeout(self):
+        return getattr(self.provider, "timeout", WEATHER_TIMEOUT) * 2
+
+    def stats(self):
+        return dict(
+            self.counters,
+            entries=len(self._cache),
+            max_entries=self.max_entries,
+            breaker_state=self._breaker_state(),
+            breaker_open=self._breaker_state() != "closed",
+            consecutive_failures=self._failures
+        )
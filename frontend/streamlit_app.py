@@ -1,15 +1,10 @@
 import streamlit as st
 import requests
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-import qrcode
+from requests.adapters import HTTPAdapter
 import os
-import io
-import json
-import socket
-from datetime import datetime
+import logging
+import sys
+import time
 
 # ======================================================
 # ================ BACKEND CONFIG ======================
@@ -18,33 +13,140 @@ BACKEND_URL = os.getenv(
     "BACKEND_URL",
     "https://cropguard-ai-disease-detection-system.onrender.com"
 )
+WEATHER_CACHE_TTL = int(os.getenv("WEATHER_CACHE_TTL", 600))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 8))
+# Send the full-resolution original after the analysis when the server keeps uploads
+UPLOAD_ORIGINALS = os.getenv("UPLOAD_ORIGINALS", "1").lower() in ("1", "true", "yes")
+
+# ======================================================
+# ================ CACHED RESOURCES ====================
+# ======================================================
+# Streamlit reruns this script on every widget change; anything costly is
+# built once per process (cache_resource) or memoized (cache_data).
+@st.cache_resource(show_spinner=False)
+def http_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# None (city unknown / no data) is cached too; network errors are not
+@st.cache_data(ttl=WEATHER_CACHE_TTL, show_spinner=False)
+def fetch_weather(city):
+    response = http_session().get(
+        f"{BACKEND_URL}/weather", params={"city": city}, timeout=5
+    )
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return response.json()
+
+
+# Model input size, upload bound and retention flag advertised by the server
+@st.cache_data(ttl=3600, show_spinner=False)
+def upload_config():
+    return fetch_upload_config(BACKEND_URL, http_session())
+
+
+# Phone photos are shrunk to the server's bound before they leave the device
+def compress_for_upload(image_file):
+    try:
+        config = upload_config()
+    except requests.RequestException:
+        config = DEFAULT_UPLOAD_CONFIG
+
+    data, content_type = downscale_for_upload(
+        image_file.getvalue(), target_side(config), config["jpeg_quality"]
+    )
+    name = image_file.name
+    if content_type == "image/jpeg":
+        name = os.path.splitext(name)[0] + ".jpg"
+    return (name, data, content_type), config
+
+
+@st.cache_data(show_spinner=False)
+def load_css(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return f.read()
 
 
 # ======================================================
 # ================ OFFLINE HELPERS =====================
 # ======================================================
-OFFLINE_QUEUE_FILE = "offline_results.json"
+# The offline journal and sync client are shared with backend/offline_sync.py
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "backend"
+))
+from offline_sync import save_offline_result, start_connectivity_monitor
+from ai_engine import analyze_with_image, analyze_without_image
+from image_upload import (
+    DEFAULT_UPLOAD_CONFIG, downscale_for_upload, fetch_upload_config,
+    target_side, upload_original
+)
+from report_pdf import build_report_pdf
 
-def is_online(host="8.8.8.8", port=53, timeout=3):
-    try:
-        socket.setdefaulttimeout(timeout)
-        socket.socket(socket.AF_INET, socket.SOCK_STREAM).connect((host, port))
-        return True
-    except:
-        return False
+# Probes BACKEND_URL in the background and syncs the offline journal when
+# it comes back; reruns only read the cached state
+@st.cache_resource(show_spinner=False)
+def connectivity_monitor():
+    return start_connectivity_monitor(BACKEND_URL)
+
+
+def is_online():
+    return connectivity_monitor().online
 
-def save_offline_result(result):
-    result["saved_at"] = datetime.utcnow().isoformat()
-    queue = []
 
-    if os.path.exists(OFFLINE_QUEUE_FILE):
-        with open(OFFLINE_QUEUE_FILE, "r") as f:
-            queue = json.load(f)
+# Start probing on page load so the first Analyze click has a state ready
+connectivity_monitor()
 
-    queue.append(result)
+# One TFLite interpreter per process, reused across reruns and sessions;
+# EDGE_NUM_THREADS sets its thread count
+@st.cache_resource(show_spinner=False)
+def load_edge_model():
+    from edge_inference import EdgeModel
+    return EdgeModel()
+
+
+# None when the TFLite runtime, OpenCV or the model file is missing
+def edge_model_or_none():
+    try:
+        return load_edge_model()
+    except (ImportError, OSError, ValueError):
+        return None
+
+
+# Same knowledge-base mapping as the backend's /analyze
+def analyze_offline(image_file, crop, humidity, temperature):
+    edge_model = edge_model_or_none() if image_file else None
+    if image_file and edge_model is None:
+        st.warning("📴 Offline model unavailable – using the selected crop and weather instead")
+
+    if edge_model is not None:
+        features = edge_model.predict_bytes(image_file.getvalue())
+        result = analyze_with_image(features)
+        result.update(
+            inference_mode="TFLITE_EDGE",
+            model_source="tflite",
+            crop_disease_label=features["disease"]
+        )
+        result["reasoning_clues"].append("Offline Edge AI (TFLite) inference used")
+    else:
+        result = analyze_without_image(
+            crop_type=crop,
+            environment={"humidity": humidity, "temperature": temperature}
+        )
 
-    with open(OFFLINE_QUEUE_FILE, "w") as f:
-        json.dump(queue, f, indent=2)
+    try:
+        result["confidence"] = float(str(result["confidence"]).rstrip("%"))
+    except ValueError:
+        pass
+    result["offline_mode"] = True
+    result["reasoning_clues"].append("Result will sync when internet returns")
+    return result
 
 # ================= LANGUAGE DICTIONARY =================
 LANG = {
@@ -148,11 +250,10 @@ st.set_page_config(page_title="CropGuard AI", layout="wide", page_icon="🌱")
 
 # ================= LOAD CSS =================
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-css_path = os.path.join(BASE_DIR, "styles.css")
+css = load_css(os.path.join(BASE_DIR, "styles.css"))
 
-if os.path.exists(css_path):
-    with open(css_path) as f:
-        st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+if css is not None:
+    st.markdown(f"<style>{css}</style>", unsafe_allow_html=True)
 else:
     st.warning("styles.css not found")
 
@@ -206,19 +307,17 @@ st.sidebar.markdown("### 🌦 Live Weather")
 
 city = st.sidebar.text_input("City", "Pune")
 
+# Served from the cache on reruns; offline reruns skip the request entirely
 try:
-    weather_res = requests.get(
-        f"{BACKEND_URL}/weather",
-        params={"city": city},
-        timeout=10
-    ).json()
-
+    weather_res = fetch_weather(city) if city and is_online() else None
+except requests.RequestException:
+    weather_res = None
 
+if weather_res:
     st.sidebar.metric("🌡 Temperature (°C)", weather_res["temperature"])
     st.sidebar.metric("💧 Humidity (%)", weather_res["humidity"])
     st.sidebar.caption(f"Condition: {weather_res['condition']}")
-
-except:
+else:
     st.sidebar.warning("Weather data unavailable")
 
 humidity = st.sidebar.slider(t("humidity"), 30, 100, 70)
@@ -242,71 +341,45 @@ with left:
     else:
         st.info(t("no_image"))
 
-# ================= PDF =================
-def generate_pdf(result, t):
-    buffer = io.BytesIO()
+# ================= DEFERRED ARTIFACTS =================
+ARTIFACT_FIELDS = {
+    "voice": "voice_summary",
+    "gradcam": "explainability_image",
+    "pdf": "pdf_report"
+}
 
-    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-    font_path = os.path.join(BASE_DIR, "fonts", "NotoSansDevanagari-Regular.ttf")
 
-    if os.path.exists(font_path):
-        pdfmetrics.registerFont(TTFont("Deva", font_path))
-    
-    qr_text = f"""
-Crop: {result.get('crop_type')}
-Disease: {result.get('disease_detected')}
-Severity: {result.get('severity')}
-Confidence: {result.get('confidence')}%
-"""
+def wait_for_artifacts(result, timeout=60):
+    status_url = result.get("artifacts", {}).get("status_url")
+    deadline = time.time() + timeout
 
-    qr = qrcode.make(qr_text)
-    qr_path = os.path.join(BASE_DIR, "temp_qr.png")
-    qr.save(qr_path)
+    while status_url and time.time() < deadline:
+        try:
+            status = http_session().get(status_url, timeout=5).json()
+        except Exception:
+            break
 
-    c = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
+        for kind, item in status.get("artifacts", {}).items():
+            if item.get("url") and kind in ARTIFACT_FIELDS:
+                result[ARTIFACT_FIELDS[kind]] = item["url"]
+        if status.get("complete"):
+            break
+        time.sleep(1)
 
-    try:
-        c.setFont("Deva", 16)
-    except:
-        c.setFont("Helvetica-Bold", 16)
-        
-    c.drawString(50, height - 50, f"{t('title')} – Report")
+    return result
 
-    try:
-        c.setFont("Deva", 12)
-    except:
-        c.setFont("Helvetica", 12)
-        
-    y = height - 100
-
-    c.drawString(50, y, f"{t('crop_detected')}: {result.get('crop_type')}")
-    y -= 25
-    c.drawString(50, y, f"{t('disease')}: {result.get('disease_detected')}")
-    y -= 25
-    c.drawString(50, y, f"{t('severity')}: {result.get('severity')}")
-    y -= 25
-    c.drawString(50, y, f"{t('confidence')}: {result.get('confidence')}")
-    y -= 40
-
-    treatment = result.get("advisory", {}).get("treatment", {})
-    c.drawString(50, y, f"{t('chemical')}: {treatment.get('chemical', 'N/A')}")
-    y -= 25
-    c.drawString(50, y, f"{t('organic')}: {treatment.get('organic', 'N/A')}")
-    y -= 25
-    c.drawString(50, y, f"{t('prevention')}: {treatment.get('prevention', 'N/A')}")
-
-    c.drawImage(qr_path, width - 160, 60, 100, 100)
-    c.setFont("Helvetica", 9)
-    c.drawString(width - 170, 45, "Scan QR for summary")
-
-    c.showPage()
-    c.save()
-    buffer.seek(0)
-
-    if os.path.exists(qr_path):
-        os.remove(qr_path)
-    return buffer
+
+# The server's PDF artifact when there is one; offline results are rendered
+# locally by the same builder (backend/report_pdf.py)
+def report_pdf(result, lang_code):
+    if result.get("pdf_report"):
+        try:
+            response = http_session().get(result["pdf_report"], timeout=10)
+            response.raise_for_status()
+            return response.content
+        except Exception:
+            pass
+    return build_report_pdf(result, lang_code)
 
 # ================= ANALYZE =================
 st.markdown("---")
@@ -317,38 +390,47 @@ if st.button(f"🔍 {t('analyze')}", use_container_width=True):
 
     with st.spinner("AI Processing..."):
 
+        result = None
+        upload_config_used = None
         if online:
-                response = requests.post(
+            upload = None
+            if image_file:
+                progress = st.progress(0.1, text="Compressing image...")
+                upload, upload_config_used = compress_for_upload(image_file)
+                progress.progress(0.3, text=(
+                    f"Uploading {len(upload[1]) / 1024:.0f} KB "
+                    f"(original {len(image_file.getvalue()) / 1024:.0f} KB)..."
+                ))
+            try:
+                response = http_session().post(
                     f"{BACKEND_URL}/analyze",
                     data={
                         "crop": crop,
                         "humidity": humidity,
                         "temperature": temperature,
                         "language": T["lang_code"],
+                        "artifacts": "deferred",
                         **({"city": city} if is_camera or image_file is None else {})
                     },
-                    files={"image": image_file} if image_file else None,
+                    files={"image": upload} if upload else None,
+                    params={"timing": "1"},
                     timeout=180
                 )
-
+            except (requests.ConnectionError, requests.Timeout):
+                # The monitor had not noticed yet; fall back to edge inference
+                connectivity_monitor().report_failure()
+            else:
+                if upload:
+                    progress.progress(1.0, text="Analysis received")
                 result = response.json()
+                logging.debug("Server timing (ms): %s", result.pop("server_timing", None))
                 result["offline_mode"] = False
 
                 st.toast("🌐 Cloud AI inference completed")
 
-        else:
+        if result is None:
                 # ================= OFFLINE MODE =================
-                result = {
-                    "offline_mode": True,
-                    "crop_type": crop,
-                    "disease_detected": "Predicted Offline",
-                    "severity": "Medium",
-                    "confidence": 55,
-                    "reasoning_clues": [
-                        "Offline Edge AI inference used",
-                        "Result will sync when internet returns"
-                    ]
-                }
+                result = analyze_offline(image_file, crop, humidity, temperature)
 
                 save_offline_result(result)
 
@@ -488,11 +570,19 @@ if st.button(f"🔍 {t('analyze')}", use_container_width=True):
         st.progress(risk_score)
         st.caption(f"Overall Risk Score: {risk_score}%")
 
+        # ====== VOICE / GRAD-CAM / PDF ARRIVE AFTER THE DIAGNOSIS ======
+        if result.get("artifacts", {}).get("pending"):
+            with st.spinner("Preparing voice summary, heatmap and PDF..."):
+                wait_for_artifacts(result)
+
         # ================= 🔊 VOICE SUMMARY =================
         voice_file = result.get("voice_summary")
         if voice_file:
             st.markdown("### 🔊 Voice Summary")
-            st.audio(voice_file, format="audio/mp3")
+            st.audio(
+                voice_file,
+                format="audio/wav" if voice_file.endswith(".wav") else "audio/mp3"
+            )
 
         # ================= EXPLAINABLE AI =================
         reasoning = result.get("reasoning_clues", [])
@@ -520,7 +610,7 @@ if st.button(f"🔍 {t('analyze')}", use_container_width=True):
         st.markdown(f"[📥 Share Report on WhatsApp]({whatsapp_url})")
 
         # ================= DOWNLOAD PDF =================
-        pdf = generate_pdf(result, t)
+        pdf = report_pdf(result, T["lang_code"])
         st.download_button(
             t("download"),
             pdf,
@@ -530,6 +620,23 @@ if st.button(f"🔍 {t('analyze')}", use_container_width=True):
 
         st.caption("⚙️ Powered by CNN + Explainable AI + Environmental Context")
 
+        # ====== FULL-RESOLUTION ORIGINAL (only when the server retains uploads) ======
+        original = image_file.getvalue() if image_file else None
+        if (upload_config_used and upload_config_used["retain_uploads"]
+                and UPLOAD_ORIGINALS and not result.get("offline_mode")
+                and len(original) > len(upload[1])):
+            bar = st.progress(0.0, text="Uploading full-resolution original...")
+            try:
+                upload_original(
+                    BACKEND_URL, original, image_file.name, result.get("report_id"),
+                    session=http_session(),
+                    progress=lambda done: bar.progress(
+                        done, text=f"Uploading full-resolution original... {done:.0%}"
+                    )
+                )
+            except requests.RequestException:
+                st.caption("📶 Original upload paused; it resumes the next time this image is analyzed")
+
 # ================= FEEDBACK =================
 st.markdown("---")
 st.markdown("### 📝 Farmer Feedback")
@@ -544,25 +651,27 @@ else:
     with col1:
         if st.button("👍 Correct"):
             feedback_payload = {
+                "report_id": result_data.get("report_id"),
                 "crop": result_data.get("crop_type"),
                 "disease": result_data.get("disease_detected"),
                 "confidence": result_data.get("confidence"),
                 "correct": True,
                 "comment": "Prediction is correct"
             }
-            requests.post(f"{BACKEND_URL}/feedback", json=feedback_payload)
+            http_session().post(f"{BACKEND_URL}/feedback", json=feedback_payload, timeout=10)
             st.toast("✅ Feedback recorded. Thank you!")
 
     with col2:
         if st.button("👎 Incorrect"):
             feedback_payload = {
+                "report_id": result_data.get("report_id"),
                 "crop": result_data.get("crop_type"),
                 "disease": result_data.get("disease_detected"),
                 "confidence": result_data.get("confidence"),
                 "correct": False,
                 "comment": "Prediction is incorrect"
             }
-            requests.post(f"{BACKEND_URL}/feedback", json=feedback_payload)
+            http_session().post(f"{BACKEND_URL}/feedback", json=feedback_payload, timeout=10)
             st.toast("❌ Marked as incorrect. Thanks for helping us improve!")
 
     with col3:
@@ -572,13 +681,14 @@ else:
                 st.toast("⚠️ Please enter your query")
             else:
                 feedback_payload = {
+                    "report_id": result_data.get("report_id"),
                     "crop": result_data.get("crop_type"),
                     "disease": result_data.get("disease_detected"),
                     "confidence": result_data.get("confidence"),
                     "correct": None,
                     "comment": other_comment
                 }
-                requests.post(f"{BACKEND_URL}/feedback", json=feedback_payload)
+                http_session().post(f"{BACKEND_URL}/feedback", json=feedback_payload, timeout=10)
                 st.toast("📩 Query submitted successfully")
 
     st.markdown("## 📋 Post-Treatment Feedback")
@@ -598,6 +708,7 @@ else:
 
     if st.button("📨 Submit Outcome Feedback"):
         feedback_payload = {
+            "report_id": result_data.get("report_id"),
             "crop": result_data.get("crop_type"),
             "disease": result_data.get("disease_detected"),
             "confidence": result_data.get("confidence"),
@@ -607,7 +718,7 @@ else:
             "days_after_treatment": days,
             "comment": comment
         }
-        requests.post(f"{BACKEND_URL}/feedback", json=feedback_payload)
+        http_session().post(f"{BACKEND_URL}/feedback", json=feedback_payload, timeout=10)
         st.toast("✅ Thank you! Your feedback helps improve the AI.")
 
 st.markdown("### 🌐 Connect with Civora Nexus")